@@ -8,7 +8,8 @@ from typing import Dict, Any
 from quart import Quart, request, jsonify
 from aiogram.utils.markdown import link
 import db
-from main import webhook_send
+import metrics
+from main import close_outbound, open_outbound, webhook_send
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -19,6 +20,25 @@ logging.basicConfig(
 app = Quart(__name__)
 
 
+@app.before_serving
+async def startup() -> None:
+    """Подключиться к БД в фоне, запустить фоновые задачи и отправить сообщения из очереди."""
+    await db.connect()
+    db.start_snapshot_refresher()
+    db.start_routing_watcher()
+    db.start_known_webhooks_refresher()
+    db.start_delivery_history_writer()
+    db.start_webhook_stats_flusher()
+    await open_outbound("http")
+
+
+@app.after_serving
+async def shutdown() -> None:
+    """Отправить накопленные сообщения и закрыть пул соединений БД."""
+    await close_outbound()
+    await db.close()
+
+
 @app.route('/github-webhook', methods=['POST'])
 async def webhook_handler() -> tuple[Dict[str, Any], int]:
     """
@@ -50,10 +70,11 @@ async def webhook_handler() -> tuple[Dict[str, Any], int]:
             logger.warning("Отсутствует поле 'Id' в request")
             return {"error": "Missing 'Id' field"}, 400
 
-        message_settings = db.get_message_settings(webhook_url)
+        message_settings = await db.get_message_settings(webhook_url)
         if message_settings is None:
             logger.warning(f"Неизвестный webhook URL: {webhook_url}")
             return {"error": "Unknown webhook ID"}, 404
+        db.record_received(webhook_url)
 
         # Форматировать сообщение
         commit_author = json_data.get("author", "Unknown")
@@ -65,12 +86,14 @@ async def webhook_handler() -> tuple[Dict[str, Any], int]:
         
         response_text = f"{commit_author_link}\n{message}\n{comment}"
 
-        # Отправить сообщение в Telegram
+        # Поставить сообщение в очередь отправки в Telegram
         await webhook_send(
             message=response_text,
             channel_id=message_settings['channel_id'],
             thread_id=message_settings['thread_id'],
-            web_preview=False
+            web_preview=False,
+            webhook_id=webhook_url,
+            event=json_data.get("event"),
         )
 
         logger.info(f"Webhook обработан успешно для URL {webhook_url}")
@@ -87,6 +110,20 @@ async def webhook_handler() -> tuple[Dict[str, Any], int]:
         return {"error": "Internal server error"}, 500
 
 
+@app.route('/metrics', methods=['GET'])
+async def metrics_handler() -> tuple[Dict[str, Any], int]:
+    """Отдать метрики сервиса в формате JSON."""
+    return metrics.collect(), 200
+
+
+@app.route('/ready', methods=['GET'])
+async def ready_handler() -> tuple[Dict[str, Any], int]:
+    """Проверка готовности: доступна ли MongoDB."""
+    if db.is_ready():
+        return {"status": "ready"}, 200
+    return {"status": "database unavailable"}, 503
+
+
 @app.errorhandler(404)
 async def not_found(error: Any) -> tuple[Dict[str, Any], int]:
     """Обработчик ошибки 404."""
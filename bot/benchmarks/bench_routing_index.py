@@ -0,0 +1,104 @@
+"""
+Бенчмарк индекса маршрутизации.
+
+Сравнивает RoutingIndex и RoutingTable (индекс вместе с _id документов,
+как при синхронизации через change streams) со словарем словарей (то,
+что возвращает find_one) по занимаемой памяти и времени поиска, а также
+время поиска по _id документа (изменение и удаление по change stream).
+
+Запуск:
+    python benchmarks/bench_routing_index.py --count 1000000
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from string import ascii_letters
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+
+from routing_index import RoutingIndex
+from routing_sync import RoutingTable
+
+
+def generate_ids(count: int) -> list[str]:
+    """Сгенерировать id webhooks как в create_webhook.generate_webhook_url."""
+    rng = random.Random(42)
+    return [''.join(rng.choices(ascii_letters, k=20)) for _ in range(count)]
+
+
+def build_dict(ids: list[str]) -> dict:
+    """Построить словарь словарей (ключи — отдельные строки, как из БД)."""
+    return {
+        webhook_id.encode().decode(): {"channel_id": -1000000000000 - i, "thread_id": i % 100 or None}
+        for i, webhook_id in enumerate(ids)
+    }
+
+
+def build_index(ids: list[str]) -> RoutingIndex:
+    """Построить компактный индекс."""
+    index = RoutingIndex(capacity=int(len(ids) / RoutingIndex.MAX_LOAD) + 1)
+    for i, webhook_id in enumerate(ids):
+        index.set(webhook_id, -1000000000000 - i, i % 100 or None)
+    return index
+
+
+def build_table(ids: list[str]) -> RoutingTable:
+    """Построить таблицу маршрутизации из документов с ObjectId."""
+    table = RoutingTable()
+    for i, webhook_id in enumerate(ids):
+        table.load({"_id": ObjectId(), "url": webhook_id, "channel_id": -1000000000000 - i, "thread_id": i % 100 or None})
+    return table
+
+
+def measure_memory(build, ids: list[str]) -> tuple[object, int]:
+    """Измерить память, выделенную при построении структуры."""
+    gc.collect()
+    tracemalloc.start()
+    structure = build(ids)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return structure, size
+
+
+def measure_lookup(get, ids: list[str], lookups: int) -> float:
+    """Измерить среднее время поиска в микросекундах."""
+    rng = random.Random(7)
+    sample = [rng.choice(ids) for _ in range(lookups)]
+    started = time.perf_counter()
+    for webhook_id in sample:
+        get(webhook_id)
+    return (time.perf_counter() - started) / lookups * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк индекса маршрутизации")
+    parser.add_argument("--count", type=int, default=200000, help="количество webhooks")
+    parser.add_argument("--lookups", type=int, default=200000, help="количество поисков")
+    args = parser.parse_args()
+
+    ids = generate_ids(args.count)
+    results = []
+    for name, build in (("dict", build_dict), ("RoutingIndex", build_index), ("RoutingTable", build_table)):
+        structure, size = measure_memory(build, ids)
+        latency = measure_lookup(structure.get, ids, args.lookups)
+        results.append((name, size, latency))
+        del structure
+
+    table = build_table(ids)
+    doc_ids = [doc_id for _, _, _, doc_id in table._routes.items()]
+    doc_latency = measure_lookup(table._routes.find_doc, doc_ids, args.lookups)
+
+    print(f"webhooks: {args.count}, поисков: {args.lookups}")
+    for name, size, latency in results:
+        print(f"{name:>14}: {size / 2**20:8.1f} MiB, {size / args.count:6.1f} байт/запись, {latency:6.2f} мкс/поиск")
+    print(f"{'find_doc':>14}: {doc_latency:6.2f} мкс/поиск по _id")
+
+
+if __name__ == "__main__":
+    main()
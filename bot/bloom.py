@@ -0,0 +1,51 @@
+"""
+Фильтр Блума.
+
+Вероятностное множество фиксированного размера: проверка может дать
+ложноположительный ответ с заданной вероятностью, но никогда не дает
+ложноотрицательного.
+"""
+import hashlib
+import math
+
+
+class BloomFilter:
+    """Фильтр Блума на bytearray с двойным хэшированием."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        """
+        Инициализация фильтра.
+
+        Args:
+            capacity: Ожидаемое количество элементов
+            error_rate: Допустимая доля ложноположительных ответов
+        """
+        capacity = max(capacity, 1)
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        """Позиции битов элемента."""
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str) -> None:
+        """Добавить элемент."""
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def nbytes(self) -> int:
+        """Размер битового массива в байтах."""
+        return len(self._bits)
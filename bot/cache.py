@@ -0,0 +1,102 @@
+"""
+Кэши в памяти процесса.
+
+Содержит ограниченный LRU кэш с временем жизни записей и счетчиками
+попаданий, промахов и вытеснений.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    LRU кэш с ограничением размера и временем жизни записей.
+
+    При переполнении вытесняется запись, к которой дольше всего не
+    обращались. Просроченные записи удаляются при обращении к ним.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        ttl: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Инициализация кэша.
+
+        Args:
+            maxsize: Максимальное количество записей
+            ttl: Время жизни записи в секундах
+            clock: Источник времени (для тестов)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        item = self._data.get(key)
+        return item is not None and item[0] > self._clock()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """
+        Получить значение из кэша.
+
+        Args:
+            key: Ключ
+            default: Значение, возвращаемое при промахе
+
+        Returns:
+            Сохраненное значение или default
+        """
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = item
+        if expires_at <= self._clock():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Сохранить значение в кэше."""
+        self._data[key] = (self._clock() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Удалить запись из кэша, если она есть."""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Очистить кэш."""
+        self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Вернуть счетчики кэша."""
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,76 @@
+"""
+Тесты для кэшей в памяти процесса.
+
+Тестирует вытеснение LRU, истечение TTL и счетчики TTLCache.
+"""
+import unittest
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cache import TTLCache
+
+
+class FakeClock:
+    """Управляемый источник времени."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+    """Тесты для TTLCache."""
+
+    def setUp(self):
+        """Подготовка перед каждым тестом."""
+        self.clock = FakeClock()
+        self.cache = TTLCache(maxsize=2, ttl=10, clock=self.clock)
+
+    def test_get_set(self):
+        """Тест сохранения и получения значения."""
+        self.cache.set("a", 1)
+
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_ttl_expiration(self):
+        """Тест истечения времени жизни записи."""
+        self.cache.set("a", 1)
+        self.clock.now = 10
+
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.expirations, 1)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_lru_eviction(self):
+        """Тест вытеснения давно не использованной записи."""
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.get("a")
+        self.cache.set("c", 3)
+
+        self.assertIn("a", self.cache)
+        self.assertNotIn("b", self.cache)
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_invalidate_and_clear(self):
+        """Тест удаления записей."""
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.invalidate("a")
+        self.cache.invalidate("missing")
+
+        self.assertNotIn("a", self.cache)
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
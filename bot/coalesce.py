@@ -0,0 +1,142 @@
+"""
+Объединение всплесков сообщений в один чат.
+
+Force-push или серия слияний дает десятки событий в один чат за секунды.
+Сообщения, пришедшие в одно назначение в течение окна, склеиваются в одно
+и отправляются одним вызовом API, пока укладываются в лимит длины
+сообщения Telegram. Каждое сообщение получает future с результатом (или
+ошибкой) отправки своей пачки.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Максимальная длина текста сообщения Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+SendBatch = Callable[[Hashable, str, List[Any]], Awaitable[None]]
+
+
+class _Batch:
+    """Накапливаемая пачка сообщений одного назначения."""
+
+    def __init__(self):
+        self.texts: List[str] = []
+        self.items: List[Any] = []
+        self.length = 0
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class Coalescer:
+    """Окно объединения сообщений по назначению."""
+
+    def __init__(
+        self,
+        send: SendBatch,
+        window: float,
+        max_length: int = TELEGRAM_MESSAGE_LIMIT,
+        separator: str = "\n\n",
+    ):
+        """
+        Инициализация.
+
+        Args:
+            send: Корутина отправки (назначение, склеенный текст, данные сообщений)
+            window: Окно объединения в секундах; 0 — отправлять сразу
+            max_length: Максимальная длина склеенного текста
+            separator: Разделитель сообщений в склеенном тексте
+        """
+        self._send = send
+        self.window = window
+        self.max_length = max_length
+        self.separator = separator
+        self._batches: Dict[Hashable, _Batch] = {}
+        self._sending: Set[asyncio.Task] = set()
+        self.submitted = 0
+        self.sent = 0
+
+    def add(self, destination: Hashable, text: str, item: Any = None) -> asyncio.Future:
+        """
+        Добавить сообщение в пачку назначения, не дожидаясь отправки.
+
+        Args:
+            destination: Ключ назначения, например (chat_id, thread_id)
+            text: Текст сообщения
+            item: Данные сообщения, передаются в send
+
+        Returns:
+            Future с результатом отправки пачки
+        """
+        self.submitted += 1
+        batch = self._batches.get(destination)
+        if batch is not None and batch.length + len(self.separator) + len(text) > self.max_length:
+            # Сообщение не помещается — текущая пачка уходит сразу
+            self._flush(destination)
+            batch = None
+        if batch is None:
+            batch = self._batches[destination] = _Batch()
+            if self.window > 0:
+                batch.timer = asyncio.get_running_loop().call_later(self.window, self._flush, destination)
+        else:
+            batch.length += len(self.separator)
+        batch.texts.append(text)
+        batch.items.append(item)
+        batch.length += len(text)
+        future = batch.future
+        if self.window <= 0 or batch.length >= self.max_length:
+            self._flush(destination)
+        return future
+
+    async def submit(self, destination: Hashable, text: str, item: Any = None) -> None:
+        """
+        Добавить сообщение и дождаться отправки его пачки.
+
+        Raises:
+            Exception: Ошибка отправки пачки
+        """
+        # Отмена одного вызывающего не отменяет отправку пачки для остальных
+        await asyncio.shield(self.add(destination, text, item))
+
+    def _flush(self, destination: Hashable) -> None:
+        """Запустить отправку пачки назначения."""
+        batch = self._batches.pop(destination, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = asyncio.create_task(self._send_batch(destination, batch))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send_batch(self, destination: Hashable, batch: _Batch) -> None:
+        """Отправить пачку и передать результат ожидающим."""
+        self.sent += 1
+        try:
+            await self._send(destination, self.separator.join(batch.texts), batch.items)
+        except Exception as e:
+            batch.future.set_exception(e)
+            # Ошибку получат ожидающие; если их нет, asyncio не должен считать ее необработанной
+            batch.future.exception()
+        else:
+            batch.future.set_result(None)
+
+    async def close(self) -> None:
+        """Отправить все накопленные пачки и дождаться отправки."""
+        for destination in list(self._batches):
+            self._flush(destination)
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Вернуть счетчики объединения."""
+        return {
+            "window_s": self.window,
+            "pending_destinations": len(self._batches),
+            "sending": len(self._sending),
+            "submitted": self.submitted,
+            "sent": self.sent,
+            "coalesced": self.submitted - self.sent - sum(len(b.items) for b in self._batches.values()),
+        }
@@ -0,0 +1,106 @@
+"""
+Тесты для объединения сообщений в одно назначение.
+
+Тестирует склейку в окне, раздельные назначения, лимит длины,
+передачу ошибки отправки и отправку накопленного при закрытии.
+"""
+import asyncio
+import unittest
+from unittest.mock import AsyncMock
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from coalesce import Coalescer
+
+
+class TestCoalescer(unittest.IsolatedAsyncioTestCase):
+    """Тесты для Coalescer."""
+
+    def setUp(self):
+        """Создать мок отправки."""
+        self.send = AsyncMock()
+
+    async def test_merges_within_window(self):
+        """Тест склейки сообщений одного назначения в одно."""
+        coalescer = Coalescer(self.send, window=0.01)
+
+        await asyncio.gather(
+            coalescer.submit((-1, None), "first", {'event': 'push'}),
+            coalescer.submit((-1, None), "second", {'event': 'push'}),
+            coalescer.submit((-2, 5), "other"),
+        )
+
+        self.assertEqual(self.send.await_count, 2)
+        calls = {c.args[0]: c.args[1:] for c in self.send.await_args_list}
+        self.assertEqual(calls[(-1, None)], ("first\n\nsecond", [{'event': 'push'}, {'event': 'push'}]))
+        self.assertEqual(calls[(-2, 5)], ("other", [None]))
+        self.assertEqual(coalescer.stats()["coalesced"], 1)
+
+    async def test_zero_window_sends_immediately(self):
+        """Тест отправки без объединения при нулевом окне."""
+        coalescer = Coalescer(self.send, window=0)
+
+        await coalescer.submit((-1, None), "text", 1)
+
+        self.send.assert_awaited_once_with((-1, None), "text", [1])
+
+    async def test_length_limit(self):
+        """Тест что склеенный текст не превышает лимит длины."""
+        coalescer = Coalescer(self.send, window=0.01, max_length=10, separator="|")
+
+        await asyncio.gather(*(coalescer.submit("chat", text) for text in ["aaaa", "bbbb", "cccc"]))
+
+        texts = [c.args[1] for c in self.send.await_args_list]
+        self.assertEqual(texts, ["aaaa|bbbb", "cccc"])
+
+    async def test_full_batch_sent_without_waiting_window(self):
+        """Тест отправки заполненной пачки не дожидаясь окна."""
+        coalescer = Coalescer(self.send, window=60, max_length=4)
+
+        await asyncio.wait_for(coalescer.submit("chat", "full"), timeout=1)
+
+        self.send.assert_awaited_once()
+
+    async def test_error_reaches_all_callers(self):
+        """Тест что ошибку отправки получают все сообщения пачки."""
+        self.send.side_effect = RuntimeError("429")
+        coalescer = Coalescer(self.send, window=0.01)
+
+        results = await asyncio.gather(
+            coalescer.submit("chat", "a"),
+            coalescer.submit("chat", "b"),
+            return_exceptions=True,
+        )
+
+        self.assertEqual(self.send.await_count, 1)
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+    async def test_add_does_not_wait(self):
+        """Тест что add ставит сообщение в пачку и сразу возвращает future."""
+        coalescer = Coalescer(self.send, window=60)
+
+        future = coalescer.add("chat", "text")
+
+        self.assertFalse(future.done())
+        self.send.assert_not_awaited()
+        await coalescer.close()
+        self.assertTrue(future.done())
+
+    async def test_close_flushes_pending(self):
+        """Тест отправки накопленных пачек при закрытии."""
+        coalescer = Coalescer(self.send, window=60)
+        task = asyncio.create_task(coalescer.submit("chat", "pending"))
+        await asyncio.sleep(0)
+
+        await coalescer.close()
+        await task
+
+        self.send.assert_awaited_once_with("chat", "pending", [None])
+        self.assertEqual(coalescer.stats()["pending_destinations"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,66 +1,631 @@
-import pymongo 
+import asyncio
 import os
 import logging
+import secrets
+from typing import NamedTuple
 from dotenv import load_dotenv
+from pymongo import AsyncMongoClient
+from pymongo.errors import PyMongoError, ServerSelectionTimeoutError
+import metrics
+from db_monitoring import PoolMetrics, QueryMetrics, TopologyState, current_operation
+from cache import TTLCache
+from delivery_history import DeliveryHistory
+from delivery_stats import DeliveryCounters, format_stats
+from export import DATASETS, export_async, projection, user_query
+from known_webhooks import KnownWebhooks
+from singleflight import SingleFlight
+from routing_snapshot import RoutingSnapshot, run_snapshot_refresher
+from routing_sync import RoutingTable, RoutingWatcher
+from storage import DatabaseUnavailable, MongoStorage, PostgresStorage, WebhookIdCollision, is_postgres_url
+from storage.mongo import TOMBSTONES_COLLECTION
 
 logger = logging.getLogger(__name__)
 load_dotenv()
+
+# Настройки пула соединений MongoDB
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "0")) or None
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0")) or None
+
+pool_metrics = PoolMetrics()
+metrics.register("mongo_pool", pool_metrics.stats)
+
+# Порог, после которого запрос записывается в лог как медленный
+MONGO_SLOW_QUERY_MS = float(os.getenv("MONGO_SLOW_QUERY_MS", "100"))
+query_metrics = QueryMetrics(slow_query_ms=MONGO_SLOW_QUERY_MS)
+metrics.register("mongo_queries", query_metrics.stats)
+
+topology_state = TopologyState()
+
+# Настройки пула соединений PostgreSQL (DB_URL вида postgresql://)
+POSTGRES_MIN_POOL_SIZE = int(os.getenv("POSTGRES_MIN_POOL_SIZE", "1"))
+POSTGRES_MAX_POOL_SIZE = int(os.getenv("POSTGRES_MAX_POOL_SIZE", "10"))
+
+
 # Инициализация подключения к база данных
 def init_db():
-    """Инициализирует подключение к MongoDB с обработкой ошибок."""
+    """
+    Создает асинхронный клиент MongoDB.
+
+    Клиент не выполняет сетевых операций при создании: пул соединений
+    открывается при первом запросе. Один клиент (и один пул) используется
+    всеми модулями процесса — ботом, Quart приложением и gRPC сервером.
+    """
     db_url = os.getenv("DB_URL")
-    
+
     if not db_url:
         logger.error("Ошибка: переменная окружения DB_URL не установлена")
         raise ValueError("DB_URL environment variable is not set")
-    
-    try:
-        client = pymongo.MongoClient(db_url, serverSelectionTimeoutMS=5000)
-        # Проверка подключения
-        client.admin.command('ping')
-        logger.info("Успешное подключение к MongoDB")
-    except pymongo.errors.ServerSelectionTimeoutError:
-        logger.error(f"Ошибка: не удалось подключиться к MongoDB по адресу {db_url}")
-        raise ConnectionError(f"Failed to connect to MongoDB at {db_url}")
-    except pymongo.errors.PyMongoError as e:
-        logger.error(f"Ошибка MongoDB: {str(e)}")
-        raise
-    except Exception as e:
-        logger.error(f"Неожиданная ошибка при подключении к БД: {str(e)}")
-        raise
-    
+
+    client = AsyncMongoClient(
+        db_url,
+        serverSelectionTimeoutMS=5000,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        event_listeners=[pool_metrics, query_metrics, topology_state],
+    )
     git_db = client["GitHook-db"]
     coll_webhooks = git_db["Webhooks"]
-    
+
     return client, git_db, coll_webhooks
 
-# Инициализация БД с обработкой ошибок
+# Клиент создается в connect() после запуска event loop
 client = None
 Git = None
 coll_webhooks = None
 
-try:
-    client, Git, coll_webhooks = init_db()
-except (ValueError, ConnectionError) as e:
-    logger.warning(f"Ошибка инициализации БД при импорте: {str(e)}")
-    # Продолжаем работу, БД будет инициализирована позже или будет доступна при тестировании мокированная версия
-except Exception as e:
-    logger.warning(f"Ошибка при подключении к БД: {str(e)}")
-    # Продолжаем работу
+# Хранилище webhooks; по умолчанию коллекция MongoDB
+backend = MongoStorage(lambda: _webhooks())
+
+# id webhook: 15 случайных байт — 20 символов base64url
+WEBHOOK_ID_BYTES = 15
+# Попыток создать webhook при совпадении сгенерированного id с существующим
+WEBHOOK_ID_ATTEMPTS = 5
+
+# Количество webhooks на странице списка в меню бота
+WEBHOOKS_PAGE_SIZE = int(os.getenv("WEBHOOKS_PAGE_SIZE", "10"))
+
+# Кэш меню бота по пользователю: страницы списка и карточки webhooks.
+# Сбрасывается при записи webhooks пользователя; TTL — страховка от записей
+# из других процессов
+USER_MENU_CACHE_SIZE = int(os.getenv("USER_MENU_CACHE_SIZE", "10000"))
+USER_MENU_CACHE_TTL = float(os.getenv("USER_MENU_CACHE_TTL", "300"))
+user_menu_cache = TTLCache(maxsize=USER_MENU_CACHE_SIZE, ttl=USER_MENU_CACHE_TTL)
+metrics.register("user_menu_cache", user_menu_cache.stats)
+
+# Кэш маршрутизации url -> {'channel_id', 'thread_id'} для входящих событий
+ROUTING_CACHE_SIZE = int(os.getenv("ROUTING_CACHE_SIZE", "10000"))
+ROUTING_CACHE_TTL = float(os.getenv("ROUTING_CACHE_TTL", "60"))
+routing_cache = TTLCache(maxsize=ROUTING_CACHE_SIZE, ttl=ROUTING_CACHE_TTL)
+metrics.register("routing_cache", routing_cache.stats)
+
+# Одновременные запросы маршрута одного webhook выполняются одним запросом к БД
+settings_lookups = SingleFlight()
+metrics.register("routing_lookups", settings_lookups.stats)
+
+# Отсев запросов к неизвестным id: фильтр Блума и негативный кэш
+KNOWN_WEBHOOKS_CAPACITY = int(os.getenv("KNOWN_WEBHOOKS_CAPACITY", "1000000"))
+KNOWN_WEBHOOKS_ERROR_RATE = float(os.getenv("KNOWN_WEBHOOKS_ERROR_RATE", "0.01"))
+KNOWN_WEBHOOKS_REFRESH_INTERVAL = float(os.getenv("KNOWN_WEBHOOKS_REFRESH_INTERVAL", "5"))
+KNOWN_WEBHOOKS_REBUILD_INTERVAL = float(os.getenv("KNOWN_WEBHOOKS_REBUILD_INTERVAL", "3600"))
+NEGATIVE_CACHE_TTL = float(os.getenv("NEGATIVE_CACHE_TTL", "30"))
+# Дозагрузка при промахе фильтра не чаще раза в этот интервал, с
+KNOWN_WEBHOOKS_CATCH_UP_INTERVAL = float(os.getenv("KNOWN_WEBHOOKS_CATCH_UP_INTERVAL", "1"))
+known_webhooks = KnownWebhooks(
+    capacity=KNOWN_WEBHOOKS_CAPACITY,
+    error_rate=KNOWN_WEBHOOKS_ERROR_RATE,
+    negative_ttl=NEGATIVE_CACHE_TTL,
+    catch_up_interval=KNOWN_WEBHOOKS_CATCH_UP_INTERVAL,
+    # Удаления и замены делает бот, а события принимает другой процесс
+    on_removed=routing_cache.invalidate,
+)
+metrics.register("unknown_webhooks", known_webhooks.stats)
+
+# Снимок маршрутизации на диске: используется, пока MongoDB недоступна
+ROUTING_SNAPSHOT_PATH = os.getenv("ROUTING_SNAPSHOT_PATH", "routing.snapshot")
+ROUTING_SNAPSHOT_INTERVAL = float(os.getenv("ROUTING_SNAPSHOT_INTERVAL", "60"))
+routing_snapshot = None
+if ROUTING_SNAPSHOT_PATH:
+    routing_snapshot = RoutingSnapshot(ROUTING_SNAPSHOT_PATH)
+    try:
+        routing_snapshot.reload()
+    except Exception as e:
+        logger.warning(f"Не удалось загрузить снимок маршрутизации: {str(e)}")
+    metrics.register("routing_snapshot", routing_snapshot.stats)
+
+# Таблица маршрутизации, синхронизируемая через change streams (нужен replica set)
+ROUTING_WATCH = os.getenv("ROUTING_WATCH", "0") == "1"
+ROUTING_WATCH_STATE_PATH = os.getenv("ROUTING_WATCH_STATE_PATH", "routing.state")
+ROUTING_WATCH_CHECKPOINT_INTERVAL = float(os.getenv("ROUTING_WATCH_CHECKPOINT_INTERVAL", "60"))
+routing_table = RoutingTable()
+
+
+# История доставки событий: time-series коллекция с записью пачками в фоне
+DELIVERY_HISTORY = os.getenv("DELIVERY_HISTORY", "1") == "1"
+DELIVERY_HISTORY_TTL_DAYS = float(os.getenv("DELIVERY_HISTORY_TTL_DAYS", "14"))
+DELIVERY_HISTORY_BATCH_SIZE = int(os.getenv("DELIVERY_HISTORY_BATCH_SIZE", "500"))
+DELIVERY_HISTORY_FLUSH_INTERVAL = float(os.getenv("DELIVERY_HISTORY_FLUSH_INTERVAL", "2"))
+DELIVERY_HISTORY_MAX_BUFFER = int(os.getenv("DELIVERY_HISTORY_MAX_BUFFER", "10000"))
+delivery_history = DeliveryHistory(
+    ttl=DELIVERY_HISTORY_TTL_DAYS * 24 * 3600,
+    batch_size=DELIVERY_HISTORY_BATCH_SIZE,
+    flush_interval=DELIVERY_HISTORY_FLUSH_INTERVAL,
+    max_buffer=DELIVERY_HISTORY_MAX_BUFFER,
+)
+metrics.register("delivery_history", delivery_history.stats)
+
+# Счетчики событий по webhooks: в памяти, сброс $inc upsert раз в интервал
+WEBHOOK_STATS_FLUSH_INTERVAL = float(os.getenv("WEBHOOK_STATS_FLUSH_INTERVAL", "10"))
+WEBHOOK_STATS_CACHE_TTL = float(os.getenv("WEBHOOK_STATS_CACHE_TTL", "10"))
+delivery_counters = DeliveryCounters()
+metrics.register("webhook_stats", delivery_counters.stats)
+webhook_stats_cache = TTLCache(maxsize=USER_MENU_CACHE_SIZE, ttl=WEBHOOK_STATS_CACHE_TTL)
+
+# Выгрузка данных пользователя: размер пачки курсора
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+
+async def connect():
+    """
+    Создает клиент БД, не дожидаясь подключения.
+
+    Подключение и проверка выполняются в фоне; состояние доступно через
+    is_ready(). Вызывается при запуске бота и Quart приложения.
+    Если DB_URL указывает на PostgreSQL, используется PostgresStorage.
+    """
+    global client, Git, coll_webhooks, backend
+
+    db_url = os.getenv("DB_URL", "")
+    if is_postgres_url(db_url):
+        if not isinstance(backend, PostgresStorage):
+            backend = PostgresStorage(db_url, min_size=POSTGRES_MIN_POOL_SIZE, max_size=POSTGRES_MAX_POOL_SIZE)
+        _start_background("connect", _connect_backend_in_background())
+        return
+
+    if client is None:
+        try:
+            # Разбор mongodb+srv:// адреса делает DNS запрос
+            client, Git, coll_webhooks = await asyncio.to_thread(init_db)
+        except ValueError as e:
+            logger.warning(f"Ошибка инициализации БД: {str(e)}")
+            return
+        except Exception as e:
+            logger.warning(f"Ошибка при создании клиента БД: {str(e)}")
+            return
+
+    _start_background("connect", _check_connection_in_background())
+
+
+async def _check_connection_in_background():
+    try:
+        await check_connection()
+    except Exception as e:
+        logger.warning(f"БД недоступна при запуске: {e}")
+
+
+async def _connect_backend_in_background():
+    try:
+        await backend.connect()
+    except Exception as e:
+        logger.warning(f"БД недоступна при запуске: {e}")
+
+
+def is_ready():
+    """Подключено ли хранилище; для MongoDB — есть ли доступный primary."""
+    if not isinstance(backend, MongoStorage):
+        return backend.is_ready()
+    return coll_webhooks is not None and topology_state.available is True
+
+
+def _webhooks():
+    """
+    Возвращает коллекцию Webhooks или сразу отклоняет запрос.
+
+    Raises:
+        DatabaseUnavailable: Клиент не создан или мониторинг драйвера
+            сообщает, что сервер недоступен
+    """
+    if coll_webhooks is None:
+        raise DatabaseUnavailable("MongoDB is not connected")
+    if topology_state.available is False:
+        raise DatabaseUnavailable("MongoDB is unavailable")
+    return coll_webhooks
+
+
+metrics.register("mongo", lambda: {"ready": is_ready(), **topology_state.stats()})
+metrics.register("storage", lambda: {"backend": backend.name, "ready": is_ready()})
+
+
+async def check_connection():
+    """Проверяет подключение к MongoDB командой ping."""
+    if client is None:
+        raise ConnectionError("MongoDB client is not initialized")
+
+    try:
+        await client.admin.command('ping')
+        logger.info("Успешное подключение к MongoDB")
+    except ServerSelectionTimeoutError:
+        logger.error("Ошибка: не удалось подключиться к MongoDB")
+        raise ConnectionError("Failed to connect to MongoDB")
+    except PyMongoError as e:
+        logger.error(f"Ошибка MongoDB: {str(e)}")
+        raise
+
 
+async def close():
+    """Записывает остаток истории и счетчиков доставки и закрывает пул соединений БД."""
+    if Git is not None and DELIVERY_HISTORY:
+        try:
+            await delivery_history.flush(Git[delivery_history.collection_name])
+        except Exception as e:
+            logger.warning(f"Не удалось записать историю доставки при остановке: {e}")
+    if Git is not None:
+        try:
+            await delivery_counters.flush(Git["WebhookStats"])
+        except Exception as e:
+            logger.warning(f"Не удалось записать счетчики доставки при остановке: {e}")
+    if client is not None:
+        await client.close()
+    await backend.close()
+
+
+def _start_background(name, coro):
+    """Запустить фоновую задачу, подписав ее запросы к БД в метриках."""
+    token = current_operation.set(name)
+    try:
+        return asyncio.create_task(coro)
+    finally:
+        current_operation.reset(token)
+
+
+def start_snapshot_refresher(write=False):
+    """
+    Запустить периодическое обновление снимка маршрутизации.
+
+    Args:
+        write: Выгружать ли снимок из хранилища в этом процессе
+
+    Returns:
+        Задача asyncio или None, если снимок отключен
+    """
+    if routing_snapshot is None:
+        return None
+    source = backend if write else None
+    return _start_background(
+        "routing_snapshot", run_snapshot_refresher(routing_snapshot, ROUTING_SNAPSHOT_INTERVAL, source)
+    )
+
+
+def start_routing_watcher():
+    """
+    Запустить синхронизацию таблицы маршрутизации через change streams.
+
+    Returns:
+        Задача asyncio или None, если синхронизация отключена
+    """
+    if not ROUTING_WATCH or coll_webhooks is None:
+        return None
+    watcher = RoutingWatcher(
+        coll_webhooks,
+        routing_table,
+        state_path=ROUTING_WATCH_STATE_PATH,
+        checkpoint_interval=ROUTING_WATCH_CHECKPOINT_INTERVAL,
+    )
+    metrics.register("routing_watcher", watcher.stats)
+    return _start_background("routing_watcher", watcher.run())
+
+
+def start_known_webhooks_refresher():
+    """
+    Запустить построение и обновление фильтра известных webhooks.
+
+    Returns:
+        Задача asyncio или None, если БД не инициализирована
+    """
+    if coll_webhooks is None:
+        return None
+    return _start_background("known_webhooks", known_webhooks.run_refresher(
+        coll_webhooks,
+        KNOWN_WEBHOOKS_REFRESH_INTERVAL,
+        KNOWN_WEBHOOKS_REBUILD_INTERVAL,
+        coll_tombstones=Git[TOMBSTONES_COLLECTION],
+    ))
+
+
+def start_delivery_history_writer():
+    """
+    Запустить фоновую запись истории доставки.
+
+    Returns:
+        Задача asyncio или None, если история отключена или MongoDB не используется
+    """
+    if not DELIVERY_HISTORY or Git is None:
+        return None
+    return _start_background("delivery_history", delivery_history.run(Git))
+
+
+def start_webhook_stats_flusher():
+    """
+    Запустить периодический сброс счетчиков доставки.
+
+    Returns:
+        Задача asyncio или None, если MongoDB не используется
+    """
+    if Git is None:
+        return None
+    return _start_background("webhook_stats", delivery_counters.run(Git["WebhookStats"], WEBHOOK_STATS_FLUSH_INTERVAL))
+
+
+def record_received(webhook_id):
+    """Учесть входящее событие webhook без обращения к БД."""
+    delivery_counters.incr(webhook_id, "received")
+
+
+def record_delivery(chat_id, status, duration_ms, **details):
+    """
+    Записать доставку события в историю и счетчики без обращения к БД.
+
+    Args:
+        chat_id: ID чата назначения
+        status: "ok" или "error"
+        duration_ms: Длительность отправки в миллисекундах
+        details: webhook_id, thread_id, event, error
+    """
+    if details.get('webhook_id') is not None:
+        delivery_counters.incr(details['webhook_id'], "delivered" if status == "ok" else "failed")
+    if DELIVERY_HISTORY:
+        delivery_history.record(chat_id, status, duration_ms, **details)
+
+
+def _route_from_snapshot(url, error):
+    """Найти маршрут в снимке, если БД недоступна, иначе пробросить ошибку."""
+    settings = routing_snapshot.lookup(url) if routing_snapshot is not None else None
+    if settings is None:
+        raise error
+    logger.warning(f"БД недоступна, маршрут {url} взят из снимка: {error}")
+    return settings
+
+
+@query_metrics.operation
 async def add(name, url, author_id,channel_id, thread_id, secret = None):
-    coll_webhooks.insert_one({'webhook_name':name,'url':url, 'author_id':author_id,'channel_id': channel_id, 'thread_id':thread_id, 'secret':secret})
+    await backend.add(name, url, author_id, channel_id, thread_id, secret)
+    user_menu_cache.invalidate(author_id)
+    routing_cache.invalidate(url)
+    known_webhooks.add(url)
+
+def _user_menu(user_id):
+    """
+    Вернуть кэш меню пользователя, создав его при необходимости.
+
+    Словарь берется до запроса к БД: если во время запроса кэш сбросили,
+    результат запишется в уже отброшенный словарь.
+    """
+    menu = user_menu_cache.get(user_id)
+    if menu is None:
+        menu = {'pages': {}, 'cards': {}, 'names': {}}
+        user_menu_cache.set(user_id, menu)
+    return menu
 
+def generate_webhook_id():
+    """Сгенерировать id webhook криптографически стойким генератором."""
+    return secrets.token_urlsafe(WEBHOOK_ID_BYTES)
+
+@query_metrics.operation
+async def upsert_webhook(name, author_id, channel_id, thread_id, secret = None):
+    """
+    Создать webhook или заменить webhook пользователя с тем же названием.
+
+    Выполняется одним атомарным запросом; совпадение нового id с
+    существующим ловит уникальный индекс по url, и id генерируется заново.
+
+    Returns:
+        id созданного webhook
+    """
+    for attempt in range(WEBHOOK_ID_ATTEMPTS):
+        url = generate_webhook_id()
+        try:
+            previous = await backend.upsert(name, url, author_id, channel_id, thread_id, secret)
+        except WebhookIdCollision:
+            logger.warning(f"id webhook уже занят, попытка {attempt + 1} из {WEBHOOK_ID_ATTEMPTS}")
+            continue
+        user_menu_cache.invalidate(author_id)
+        if previous is not None:
+            routing_cache.invalidate(previous)
+        routing_cache.invalidate(url)
+        known_webhooks.add(url)
+        return url
+    raise WebhookIdCollision(f"Failed to allocate a unique webhook id in {WEBHOOK_ID_ATTEMPTS} attempts")
+
+@query_metrics.operation
 async def get_message_settings(url):
-    return coll_webhooks.find_one({'url':url},{'channel_id': 1,'thread_id': 1, '_id': 0})
+    if routing_table.ready:
+        return routing_table.get(url)
+    settings = routing_cache.get(url)
+    if settings is not None:
+        return settings
+    try:
+        if await known_webhooks.is_unknown(url, _webhooks):
+            return None
+        return await settings_lookups.do(url, lambda: _load_message_settings(url))
+    except PyMongoError as e:
+        return _route_from_snapshot(url, e)
+
+async def _load_message_settings(url):
+    settings = await backend.get_message_settings(url)
+    if settings is not None:
+        routing_cache.set(url, settings)
+    else:
+        known_webhooks.mark_missing(url)
+    return settings
 
+@query_metrics.operation
 async def get_user_webhooks(user_id):
-    return list(coll_webhooks.find({'author_id':user_id},{'webhook_name': 1, '_id': 0}))
+    return await backend.get_user_webhooks(user_id)
+
+
+class WebhooksPage(NamedTuple):
+    """Страница списка webhooks пользователя."""
+    webhooks: list
+    has_prev: bool
+    has_next: bool
+
+
+@query_metrics.operation
+async def get_user_webhooks_page(user_id, after=None, before=None, page_size=WEBHOOKS_PAGE_SIZE):
+    """
+    Получить страницу webhooks пользователя.
+
+    Запрашивается на один webhook больше размера страницы, чтобы узнать,
+    есть ли следующая (или предыдущая при before) страница.
+
+    Args:
+        user_id: ID пользователя
+        after: Название последнего webhook предыдущей страницы
+        before: Название первого webhook следующей страницы
+        page_size: Размер страницы
+
+    Returns:
+        WebhooksPage
+    """
+    menu = _user_menu(user_id)
+    pages = menu['pages']
+    key = (after, before, page_size)
+    page = pages.get(key)
+    if page is not None:
+        return page
+
+    webhooks = await backend.get_user_webhooks(user_id, after=after, before=before, limit=page_size + 1)
+    menu['names'].update((webhook['id'], webhook['webhook_name']) for webhook in webhooks)
+    more = len(webhooks) > page_size
+    if before is not None:
+        page = WebhooksPage(webhooks[-page_size:] if more else webhooks, more, True)
+    else:
+        page = WebhooksPage(webhooks[:page_size], after is not None, more)
+    pages[key] = page
+    return page
+
+@query_metrics.operation
+async def get_webhook_name(webhook_id, user_id):
+    """
+    Получить название webhook пользователя по id.
+
+    Названия webhooks из показанных страниц списка берутся из кэша меню.
+
+    Returns:
+        Название webhook или None, если он не найден
+    """
+    names = _user_menu(user_id)['names']
+    name = names.get(webhook_id)
+    if name is None:
+        webhook_data = await backend.get_webhook_by_id(webhook_id, user_id)
+        if webhook_data is None:
+            return None
+        name = names[webhook_id] = webhook_data['webhook_name']
+    return name
+
+def _format_webhook_info(webhook_data):
+    """Сформировать карточку webhook."""
+    return f"Название вебхука: {webhook_data['webhook_name']}\nUrl вебхука: {webhook_data['url']}\nId канала: {webhook_data['channel_id']}\nId ветки: {webhook_data['thread_id']}"
+
+@query_metrics.operation
+async def get_webhooks_info(webhook_name, user_id = None):
+    webhook_data = await backend.get_webhook(webhook_name, author_id=user_id)
+    if webhook_data is None:
+        return None
+    return _format_webhook_info(webhook_data)
+
+@query_metrics.operation
+async def get_webhook_card(webhook_id, user_id):
+    """
+    Получить карточку webhook пользователя по id (первичному ключу).
+
+    Настройки webhook берутся из кэша меню, статистика доставки —
+    из документа WebhookStats с коротким TTL кэша.
+
+    Returns:
+        Текст карточки или None, если webhook не найден
+    """
+    cards = _user_menu(user_id)['cards']
+    card = cards.get(webhook_id)
+    if card is None:
+        webhook_data = await backend.get_webhook_by_id(webhook_id, user_id)
+        if webhook_data is None:
+            return None
+        card = cards[webhook_id] = (_format_webhook_info(webhook_data), webhook_data['url'])
+
+    message, url = card
+    stats = await _webhook_stats(url)
+    if stats is None:
+        return message
+    return f"{message}\n\n{stats}"
+
+async def _webhook_stats(url):
+    """Блок статистики доставки webhook или None, если она недоступна."""
+    stats = webhook_stats_cache.get(url)
+    if stats is not None or Git is None:
+        return stats
+    try:
+        doc = await Git["WebhookStats"].find_one({'_id': url})
+    except PyMongoError as e:
+        logger.warning(f"Не удалось получить статистику webhook: {e}")
+        return None
+    stats = format_stats(doc)
+    webhook_stats_cache.set(url, stats)
+    return stats
+
+@query_metrics.operation
+async def delete_webhook(webhook_name, user_id = None):
+    deleted = await backend.delete_webhook(webhook_name, author_id=user_id)
+    if deleted is None:
+        return False
+    routing_cache.invalidate(deleted.get('url'))
+    user_menu_cache.invalidate(deleted.get('author_id', user_id))
+    return True
+
+@query_metrics.operation
+async def delete_webhook_by_id(webhook_id, user_id):
+    """
+    Удалить webhook пользователя по id (первичному ключу).
+
+    Returns:
+        Название удаленного webhook или None, если он не найден
+    """
+    deleted = await backend.delete_webhook_by_id(webhook_id, user_id)
+    if deleted is None:
+        return None
+    routing_cache.invalidate(deleted['url'])
+    user_menu_cache.invalidate(user_id)
+    return deleted['webhook_name']
+
+@query_metrics.operation
+async def export_user_data(user_id, dataset, out, fmt="ndjson"):
+    """
+    Выгрузить webhooks или историю доставки пользователя в файл.
+
+    Документы читаются курсором пачками по EXPORT_BATCH_SIZE, поэтому
+    память не растет с объемом данных. Только для MongoDB.
 
-async def get_webhooks_info(webhook_name):
-    webhook_data = list(coll_webhooks.find({'webhook_name':webhook_name},{'webhook_name': 1, 'url':1, 'author_id':1,'channel_id': 1, 'thread_id':1, '_id': 0}))[0]
-    message = f"Название вебхука: {webhook_data['webhook_name']}\nUrl вебхука: {webhook_data['url']}\nId канала: {webhook_data['channel_id']}\nId ветки: {webhook_data['thread_id']}"
-    return message
+    Args:
+        user_id: ID пользователя
+        dataset: webhooks или history
+        out: Текстовый файл для записи
+        fmt: ndjson или csv
 
-async def delete_webhook(webhook_name):
-    coll_webhooks.delete_one({'webhook_name':webhook_name})
+    Returns:
+        Количество выгруженных документов
+    """
+    webhooks = _webhooks()
+    spec = DATASETS[dataset]
+    urls = []
+    if dataset == "history":
+        urls = [doc['url'] async for doc in webhooks.find({'author_id': user_id}, {'url': 1, '_id': 0})]
+    cursor = Git[spec['collection']].find(
+        user_query(dataset, user_id, urls),
+        projection(spec['fields']),
+        sort=[(spec['sort'], 1)],
+        batch_size=EXPORT_BATCH_SIZE,
+    )
+    return await export_async(cursor, out, fmt, spec['fields'], batch_size=EXPORT_BATCH_SIZE)
@@ -0,0 +1,261 @@
+"""
+Мониторинг клиента MongoDB.
+
+Слушатели событий драйвера, собирающие метрики пула соединений
+и длительность запросов.
+"""
+import contextvars
+import functools
+import logging
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Optional
+
+from pymongo import monitoring
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Метрики пула соединений: размер, ожидание выдачи и оборот соединений."""
+
+    def __init__(self):
+        """Инициализация счетчиков."""
+        self.checkout_wait_ms = Histogram()
+        self.check_out_started = 0
+        self.checked_out = 0
+        self.checked_in = 0
+        self.check_out_failed: Counter = Counter()
+        self.created = 0
+        self.closed: Counter = Counter()
+        self.pool_cleared = 0
+
+    def pool_created(self, event: monitoring.PoolCreatedEvent) -> None:
+        logger.debug(f"Пул соединений создан: {event.address}")
+
+    def pool_ready(self, event: monitoring.PoolReadyEvent) -> None:
+        pass
+
+    def pool_cleared(self, event: monitoring.PoolClearedEvent) -> None:
+        self.pool_cleared += 1
+        logger.warning(f"Пул соединений очищен: {event.address}")
+
+    def pool_closed(self, event: monitoring.PoolClosedEvent) -> None:
+        pass
+
+    def connection_created(self, event: monitoring.ConnectionCreatedEvent) -> None:
+        self.created += 1
+
+    def connection_ready(self, event: monitoring.ConnectionReadyEvent) -> None:
+        pass
+
+    def connection_closed(self, event: monitoring.ConnectionClosedEvent) -> None:
+        self.closed[event.reason] += 1
+
+    def connection_check_out_started(self, event: monitoring.ConnectionCheckOutStartedEvent) -> None:
+        self.check_out_started += 1
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent) -> None:
+        self.check_out_failed[event.reason] += 1
+        if event.duration is not None:
+            self.checkout_wait_ms.observe(event.duration * 1000)
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent) -> None:
+        self.checked_out += 1
+        if event.duration is not None:
+            self.checkout_wait_ms.observe(event.duration * 1000)
+
+    def connection_checked_in(self, event: monitoring.ConnectionCheckedInEvent) -> None:
+        self.checked_in += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Вернуть метрики пула."""
+        closed = sum(self.closed.values())
+        failed = sum(self.check_out_failed.values())
+        return {
+            "open": self.created - closed,
+            "in_use": self.checked_out - self.checked_in,
+            "waiting": self.check_out_started - self.checked_out - failed,
+            "created": self.created,
+            "closed": closed,
+            "closed_by_reason": dict(self.closed),
+            "checkouts": self.checked_out,
+            "checkout_failed": dict(self.check_out_failed),
+            "checkout_wait_ms": self.checkout_wait_ms.snapshot(),
+            "pool_cleared": self.pool_cleared,
+        }
+
+
+class TopologyState(monitoring.TopologyListener):
+    """Доступность MongoDB по данным фонового мониторинга драйвера."""
+
+    def __init__(self):
+        """Инициализация: доступность неизвестна до первого события."""
+        self.available: Optional[bool] = None
+        self.changed_at: Optional[float] = None
+        self.transitions = 0
+
+    def opened(self, event: monitoring.TopologyOpenedEvent) -> None:
+        pass
+
+    def description_changed(self, event: monitoring.TopologyDescriptionChangedEvent) -> None:
+        description = event.new_description
+        if description.has_writable_server():
+            available = True
+        elif any(server.error is not None for server in description.server_descriptions().values()):
+            available = False
+        else:
+            # Серверы еще не проверены
+            return
+
+        if available == self.available:
+            return
+        if available:
+            logger.info("MongoDB доступна")
+        else:
+            logger.warning("MongoDB недоступна")
+        self.available = available
+        self.changed_at = time.time()
+        self.transitions += 1
+
+    def closed(self, event: monitoring.TopologyClosedEvent) -> None:
+        self.available = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Вернуть состояние доступности."""
+        return {
+            "available": self.available,
+            "changed_at": self.changed_at,
+            "transitions": self.transitions,
+        }
+
+
+# Логическая функция слоя БД, выполняющая текущую команду
+current_operation: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "current_operation", default="unknown"
+)
+
+# Поля команд, содержащие условия запроса
+FILTER_FIELDS = ("filter", "query")
+
+
+def filter_shape(value: Any) -> Any:
+    """
+    Заменить значения в условии запроса на заглушки, сохранив структуру.
+
+    Args:
+        value: Условие запроса
+
+    Returns:
+        Условие, в котором значения заменены на "?"
+    """
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [filter_shape(item) for item in value[:1]]
+    return "?"
+
+
+def _command_filter(command: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Найти условие запроса в команде."""
+    for field in FILTER_FIELDS:
+        if field in command:
+            return command[field]
+    for field in ("deletes", "updates"):
+        if command.get(field):
+            return command[field][0].get("q")
+    return None
+
+
+def _documents_returned(reply: Dict[str, Any]) -> int:
+    """Количество документов в ответе сервера."""
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if isinstance(reply.get("value"), dict):
+        return 1
+    return 0
+
+
+class QueryMetrics(monitoring.CommandListener):
+    """Длительность запросов по командам и по функциям слоя БД."""
+
+    def __init__(self, slow_query_ms: float = 100.0):
+        """
+        Инициализация счетчиков.
+
+        Args:
+            slow_query_ms: Порог медленного запроса в миллисекундах
+        """
+        self.slow_query_ms = slow_query_ms
+        self._started: Dict[int, tuple[str, str, Any]] = {}
+        self.commands: Dict[str, Histogram] = defaultdict(Histogram)
+        self.operations: Dict[str, Histogram] = defaultdict(Histogram)
+        self.documents: Counter = Counter()
+        self.failures: Counter = Counter()
+        self.slow_queries = 0
+
+    def operation(self, fn):
+        """
+        Декоратор асинхронной функции слоя БД.
+
+        Учитывает длительность вызова и помечает команды драйвера,
+        выполненные внутри, именем функции.
+        """
+        name = fn.__name__
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            token = current_operation.set(name)
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self.operations[name].observe((time.perf_counter() - started) * 1000)
+                current_operation.reset(token)
+
+        return wrapper
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        self._started[event.request_id] = (
+            event.command_name,
+            current_operation.get(),
+            _command_filter(event.command),
+        )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        started = self._started.pop(event.request_id, None)
+        if started is None:
+            return
+        command_name, operation, query = started
+        duration_ms = event.duration_micros / 1000
+        self.commands[command_name].observe(duration_ms)
+        self.documents[operation] += _documents_returned(event.reply)
+
+        if duration_ms >= self.slow_query_ms:
+            self.slow_queries += 1
+            logger.warning(
+                f"Медленный запрос {command_name} в {operation}: {duration_ms:.1f} мс, "
+                f"условие {filter_shape(query) if query is not None else '-'}"
+            )
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        started = self._started.pop(event.request_id, None)
+        if started is None:
+            return
+        command_name, operation, _ = started
+        self.commands[command_name].observe(event.duration_micros / 1000)
+        self.failures[f"{operation}.{command_name}"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Вернуть метрики запросов."""
+        return {
+            "operations_ms": {name: hist.snapshot() for name, hist in self.operations.items()},
+            "commands_ms": {name: hist.snapshot() for name, hist in self.commands.items()},
+            "documents_returned": dict(self.documents),
+            "failures": dict(self.failures),
+            "slow_queries": self.slow_queries,
+            "slow_query_threshold_ms": self.slow_query_ms,
+        }
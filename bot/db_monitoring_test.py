@@ -0,0 +1,121 @@
+"""
+Тесты для мониторинга клиента MongoDB.
+
+Тестирует сбор метрик пула соединений по событиям драйвера.
+"""
+import unittest
+import datetime
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pymongo import monitoring
+from db_monitoring import PoolMetrics, QueryMetrics, filter_shape
+
+ADDRESS = ("localhost", 27017)
+
+
+class TestPoolMetrics(unittest.TestCase):
+    """Тесты для PoolMetrics."""
+
+    def setUp(self):
+        """Подготовка слушателя."""
+        self.listener = PoolMetrics()
+
+    def test_checkout_cycle(self):
+        """Тест учета выдачи и возврата соединения."""
+        self.listener.connection_created(monitoring.ConnectionCreatedEvent(ADDRESS, 1))
+        self.listener.connection_check_out_started(monitoring.ConnectionCheckOutStartedEvent(ADDRESS))
+        self.listener.connection_checked_out(monitoring.ConnectionCheckedOutEvent(ADDRESS, 1, 0.004))
+
+        stats = self.listener.stats()
+        self.assertEqual(stats["open"], 1)
+        self.assertEqual(stats["in_use"], 1)
+        self.assertEqual(stats["waiting"], 0)
+        self.assertEqual(stats["checkout_wait_ms"]["count"], 1)
+        self.assertEqual(stats["checkout_wait_ms"]["buckets"]["le_5"], 1)
+
+        self.listener.connection_checked_in(monitoring.ConnectionCheckedInEvent(ADDRESS, 1))
+        self.assertEqual(self.listener.stats()["in_use"], 0)
+
+    def test_waiting_and_failures(self):
+        """Тест учета ожидающих и неудачных выдач соединений."""
+        for _ in range(3):
+            self.listener.connection_check_out_started(monitoring.ConnectionCheckOutStartedEvent(ADDRESS))
+        self.listener.connection_check_out_failed(
+            monitoring.ConnectionCheckOutFailedEvent(ADDRESS, "timeout", 1.0)
+        )
+
+        stats = self.listener.stats()
+        self.assertEqual(stats["waiting"], 2)
+        self.assertEqual(stats["checkout_failed"], {"timeout": 1})
+        self.assertEqual(stats["checkout_wait_ms"]["max"], 1000)
+
+    def test_connection_churn(self):
+        """Тест учета закрытых соединений по причинам."""
+        for i in range(2):
+            self.listener.connection_created(monitoring.ConnectionCreatedEvent(ADDRESS, i))
+        self.listener.connection_closed(monitoring.ConnectionClosedEvent(ADDRESS, 0, "idle"))
+
+        stats = self.listener.stats()
+        self.assertEqual(stats["open"], 1)
+        self.assertEqual(stats["closed_by_reason"], {"idle": 1})
+
+
+class TestQueryMetrics(unittest.IsolatedAsyncioTestCase):
+    """Тесты для QueryMetrics."""
+
+    def setUp(self):
+        """Подготовка слушателя."""
+        self.listener = QueryMetrics(slow_query_ms=50)
+
+    def _run_command(self, request_id, command, reply, duration_micros):
+        """Сымитировать выполнение команды драйвером."""
+        self.listener.started(monitoring.CommandStartedEvent(command, "GitHook-db", request_id, ADDRESS, request_id))
+        self.listener.succeeded(monitoring.CommandSucceededEvent(
+            datetime.timedelta(microseconds=duration_micros), reply, next(iter(command)), request_id, ADDRESS, request_id
+        ))
+
+    def test_filter_shape(self):
+        """Тест скрытия значений в условии запроса."""
+        self.assertEqual(
+            filter_shape({"author_id": 1, "webhook_name": {"$gt": "a"}, "$or": [{"url": "x"}, {"url": "y"}]}),
+            {"author_id": "?", "webhook_name": {"$gt": "?"}, "$or": [{"url": "?"}]},
+        )
+
+    async def test_commands_attributed_to_operation(self):
+        """Тест привязки команд к функции слоя БД."""
+        async def get_user_webhooks():
+            self._run_command(1, {"find": "Webhooks", "filter": {"author_id": 1}},
+                              {"cursor": {"firstBatch": [{}, {}, {}]}, "ok": 1}, 2000)
+
+        await self.listener.operation(get_user_webhooks)()
+
+        stats = self.listener.stats()
+        self.assertEqual(stats["commands_ms"]["find"]["count"], 1)
+        self.assertEqual(stats["operations_ms"]["get_user_webhooks"]["count"], 1)
+        self.assertEqual(stats["documents_returned"], {"get_user_webhooks": 3})
+        self.assertEqual(stats["slow_queries"], 0)
+
+    def test_slow_query_logged(self):
+        """Тест пометки медленного запроса."""
+        with self.assertLogs("db_monitoring", level="WARNING") as logs:
+            self._run_command(2, {"find": "Webhooks", "filter": {"url": "secret_id"}},
+                              {"cursor": {"firstBatch": []}, "ok": 1}, 120000)
+
+        self.assertEqual(self.listener.slow_queries, 1)
+        self.assertIn("{'url': '?'}", logs.output[0])
+        self.assertNotIn("secret_id", logs.output[0])
+
+    def test_failed_command(self):
+        """Тест учета неудачных команд."""
+        self.listener.started(monitoring.CommandStartedEvent({"find": "Webhooks"}, "GitHook-db", 3, ADDRESS, 3))
+        self.listener.failed(monitoring.CommandFailedEvent(datetime.timedelta(microseconds=500), {"ok": 0}, "find", 3, ADDRESS, 3))
+
+        self.assertEqual(self.listener.stats()["failures"], {"unknown.find": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
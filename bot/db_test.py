@@ -8,17 +8,44 @@ import unittest
 from unittest.mock import Mock, MagicMock, patch, AsyncMock
 import sys
 import os
+from bson import ObjectId
 from dotenv import load_dotenv
 load_dotenv()
 # Добавляем путь к модулям
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 try:
+    import db
     from db import add, get_message_settings, get_user_webhooks, get_webhooks_info, delete_webhook
 except ImportError:
     # Если импорт не удается, все тесты будут пропущены
     add = None
 
 
+HOOK_ID = ObjectId()
+
+
+def _reset_caches():
+    """Очистить кэши маршрутизации между тестами."""
+    if add is not None:
+        db.routing_cache.clear()
+        db.known_webhooks.negative.clear()
+        db.user_menu_cache.clear()
+
+
+def _tombstones(mock_collection):
+    """Настроить мок коллекции удаленных url и вернуть ее insert_one."""
+    insert_one = AsyncMock()
+    mock_collection.database.__getitem__.return_value.insert_one = insert_one
+    return insert_one
+
+
+def _cursor(docs):
+    """Создать мок асинхронного курсора MongoDB."""
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=docs)
+    return cursor
+
+
 class TestAddWebhook(unittest.IsolatedAsyncioTestCase):
     """Тесты для функции add."""
 
@@ -28,7 +55,7 @@ class TestAddWebhook(unittest.IsolatedAsyncioTestCase):
         if add is None:
             self.skipTest("db module not available")
 
-        mock_collection.insert_one = MagicMock(return_value=MagicMock(inserted_id="webhook_id_123"))
+        mock_collection.insert_one = AsyncMock(return_value=MagicMock(inserted_id="webhook_id_123"))
 
         await add(
             name="test_webhook",
@@ -55,7 +82,7 @@ class TestAddWebhook(unittest.IsolatedAsyncioTestCase):
 
         for name, url, author_id, channel_id, thread_id, secret in test_cases:
             mock_collection.reset_mock()
-            mock_collection.insert_one = MagicMock(return_value=MagicMock(inserted_id=f"id_{name}"))
+            mock_collection.insert_one = AsyncMock(return_value=MagicMock(inserted_id=f"id_{name}"))
 
             await add(name, url, author_id, channel_id, thread_id, secret)
 
@@ -65,13 +92,17 @@ class TestAddWebhook(unittest.IsolatedAsyncioTestCase):
 class TestGetMessageSettings(unittest.IsolatedAsyncioTestCase):
     """Тесты для функции get_message_settings."""
 
+    def setUp(self):
+        """Очистить кэш маршрутизации перед каждым тестом."""
+        _reset_caches()
+
     @patch('db.coll_webhooks')
     async def test_get_message_settings_existing(self, mock_collection):
         """Тест получения существующих настроек сообщения."""
         if add is None:
             self.skipTest("db module not available")
 
-        mock_collection.find_one = MagicMock(return_value={
+        mock_collection.find_one = AsyncMock(return_value={
             "_id": "id123",
             "webhook_name": "test",
             "url": "https://example.com",
@@ -92,7 +123,7 @@ class TestGetMessageSettings(unittest.IsolatedAsyncioTestCase):
         if add is None:
             self.skipTest("db module not available")
 
-        mock_collection.find_one = MagicMock(return_value=None)
+        mock_collection.find_one = AsyncMock(return_value=None)
 
         result = await get_message_settings("https://nonexistent.com")
 
@@ -104,7 +135,7 @@ class TestGetMessageSettings(unittest.IsolatedAsyncioTestCase):
         if add is None:
             self.skipTest("db module not available")
 
-        mock_collection.find_one = MagicMock(return_value={
+        mock_collection.find_one = AsyncMock(return_value={
             "webhook_name": "웹훅_тест_🔗",
             "url": "https://例え.jp/webhook"
         })
@@ -124,7 +155,7 @@ class TestGetUserWebhooks(unittest.IsolatedAsyncioTestCase):
         if add is None:
             self.skipTest("db module not available")
 
-        mock_collection.find = MagicMock(return_value=[])
+        mock_collection.find = MagicMock(return_value=_cursor([]))
 
         result = await get_user_webhooks(user_id=12345)
 
@@ -137,11 +168,11 @@ class TestGetUserWebhooks(unittest.IsolatedAsyncioTestCase):
         if add is None:
             self.skipTest("db module not available")
 
-        mock_collection.find = MagicMock(return_value=[
+        mock_collection.find = MagicMock(return_value=_cursor([
             {"webhook_name": "hook1", "url": "https://example.com/1"},
             {"webhook_name": "hook2", "url": "https://example.com/2"},
             {"webhook_name": "hook3", "url": "https://example.com/3"},
-        ])
+        ]))
 
         result = await get_user_webhooks(user_id=12345)
 
@@ -162,15 +193,73 @@ class TestGetUserWebhooks(unittest.IsolatedAsyncioTestCase):
 
         for user_id, expected_count in test_cases:
             mock_collection.reset_mock()
-            mock_collection.find = MagicMock(return_value=[
+            mock_collection.find = MagicMock(return_value=_cursor([
                 {"webhook_name": f"hook_{i}", "author_id": user_id}
                 for i in range(expected_count)
-            ])
+            ]))
 
             result = await get_user_webhooks(user_id=user_id)
             self.assertEqual(len(result), expected_count)
 
 
+class TestGetUserWebhooksPage(unittest.IsolatedAsyncioTestCase):
+    """Тесты для функции get_user_webhooks_page."""
+
+    def setUp(self):
+        """Очистить кэши перед каждым тестом."""
+        _reset_caches()
+
+    @patch('db.coll_webhooks')
+    async def test_first_page(self, mock_collection):
+        """Тест первой страницы: запрашивается на один webhook больше."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        mock_collection.find = MagicMock(return_value=_cursor([
+            {"_id": ObjectId(), "webhook_name": f"hook{i}"} for i in range(4)
+        ]))
+
+        page = await db.get_user_webhooks_page(1, page_size=3)
+
+        self.assertEqual([w["webhook_name"] for w in page.webhooks], ["hook0", "hook1", "hook2"])
+        self.assertFalse(page.has_prev)
+        self.assertTrue(page.has_next)
+        call = mock_collection.find.call_args
+        self.assertEqual(call.args[0], {'author_id': 1})
+        self.assertEqual(call.kwargs['limit'], 4)
+
+    @patch('db.coll_webhooks')
+    async def test_next_page(self, mock_collection):
+        """Тест следующей страницы по ключу webhook_name."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        mock_collection.find = MagicMock(return_value=_cursor([{"_id": ObjectId(), "webhook_name": "hook3"}]))
+
+        page = await db.get_user_webhooks_page(1, after="hook2", page_size=3)
+
+        self.assertEqual(mock_collection.find.call_args.args[0], {'author_id': 1, 'webhook_name': {'$gt': "hook2"}})
+        self.assertTrue(page.has_prev)
+        self.assertFalse(page.has_next)
+
+    @patch('db.coll_webhooks')
+    async def test_prev_page(self, mock_collection):
+        """Тест предыдущей страницы: обратный порядок разворачивается."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        mock_collection.find = MagicMock(return_value=_cursor([
+            {"_id": ObjectId(), "webhook_name": f"hook{i}"} for i in (2, 1, 0)
+        ]))
+
+        page = await db.get_user_webhooks_page(1, before="hook3", page_size=3)
+
+        self.assertEqual([w["webhook_name"] for w in page.webhooks], ["hook0", "hook1", "hook2"])
+        self.assertFalse(page.has_prev)
+        self.assertTrue(page.has_next)
+        self.assertEqual(mock_collection.find.call_args.kwargs['sort'], [('webhook_name', -1)])
+
+
 class TestGetWebhookInfo(unittest.IsolatedAsyncioTestCase):
     """Тесты для функции get_webhooks_info."""
 
@@ -189,7 +278,7 @@ class TestGetWebhookInfo(unittest.IsolatedAsyncioTestCase):
                 "thread_id": 0,
             }
         ]
-        mock_collection.find = MagicMock(return_value=mock_cursor)
+        mock_collection.find_one = AsyncMock(return_value=mock_cursor[0])
 
         result = await get_webhooks_info("test_hook")
 
@@ -211,7 +300,7 @@ class TestGetWebhookInfo(unittest.IsolatedAsyncioTestCase):
                 "thread_id": 789,
             }
         ]
-        mock_collection.find = MagicMock(return_value=mock_cursor)
+        mock_collection.find_one = AsyncMock(return_value=mock_cursor[0])
 
         result = await get_webhooks_info("my_hook")
 
@@ -225,17 +314,24 @@ class TestGetWebhookInfo(unittest.IsolatedAsyncioTestCase):
 class TestDeleteWebhook(unittest.IsolatedAsyncioTestCase):
     """Тесты для функции delete_webhook."""
 
+    def setUp(self):
+        """Очистить кэш маршрутизации перед каждым тестом."""
+        _reset_caches()
+
     @patch('db.coll_webhooks')
     async def test_delete_webhook_success(self, mock_collection):
         """Тест успешного удаления webhook."""
         if add is None:
             self.skipTest("db module not available")
 
-        mock_collection.delete_one = MagicMock(return_value=MagicMock(deleted_count=1))
+        mock_collection.find_one_and_delete = AsyncMock(return_value={"url": "abc"})
+        tombstones = _tombstones(mock_collection)
 
-        await delete_webhook("test_hook")
+        result = await delete_webhook("test_hook")
 
-        mock_collection.delete_one.assert_called_once()
+        self.assertTrue(result)
+        mock_collection.find_one_and_delete.assert_called_once()
+        self.assertEqual(tombstones.call_args.args[0]["url"], "abc")
 
     @patch('db.coll_webhooks')
     async def test_delete_webhook_not_found(self, mock_collection):
@@ -243,11 +339,12 @@ class TestDeleteWebhook(unittest.IsolatedAsyncioTestCase):
         if add is None:
             self.skipTest("db module not available")
 
-        mock_collection.delete_one = MagicMock(return_value=MagicMock(deleted_count=0))
+        mock_collection.find_one_and_delete = AsyncMock(return_value=None)
 
-        await delete_webhook("nonexistent")
+        result = await delete_webhook("nonexistent")
 
-        mock_collection.delete_one.assert_called_once()
+        self.assertFalse(result)
+        mock_collection.find_one_and_delete.assert_called_once()
 
     @patch('db.coll_webhooks')
     async def test_delete_webhook_multiple_scenarios(self, mock_collection):
@@ -263,17 +360,23 @@ class TestDeleteWebhook(unittest.IsolatedAsyncioTestCase):
 
         for hook_name, should_succeed in scenarios:
             mock_collection.reset_mock()
-            mock_collection.delete_one = MagicMock(
-                return_value=MagicMock(deleted_count=1 if should_succeed else 0)
+            mock_collection.find_one_and_delete = AsyncMock(
+                return_value={"url": hook_name} if should_succeed else None
             )
+            _tombstones(mock_collection)
 
-            await delete_webhook(hook_name)
-            mock_collection.delete_one.assert_called_once()
+            result = await delete_webhook(hook_name)
+            self.assertEqual(result, should_succeed)
+            mock_collection.find_one_and_delete.assert_called_once()
 
 
 class TestDatabaseErrorHandling(unittest.IsolatedAsyncioTestCase):
     """Тесты обработки ошибок БД."""
 
+    def setUp(self):
+        """Очистить кэш маршрутизации перед каждым тестом."""
+        _reset_caches()
+
     @patch('db.coll_webhooks')
     async def test_add_webhook_duplicate_url(self, mock_collection):
         """Тест добавления webhook с одинаковым URL."""
@@ -282,7 +385,7 @@ class TestDatabaseErrorHandling(unittest.IsolatedAsyncioTestCase):
 
         from pymongo.errors import DuplicateKeyError
 
-        mock_collection.insert_one = MagicMock(side_effect=DuplicateKeyError("Duplicate key"))
+        mock_collection.insert_one = AsyncMock(side_effect=DuplicateKeyError("Duplicate key"))
 
         # Функция должна обработать ошибку
         with self.assertRaises(DuplicateKeyError):
@@ -303,11 +406,28 @@ class TestDatabaseErrorHandling(unittest.IsolatedAsyncioTestCase):
 
         from pymongo.errors import ConnectionFailure
 
-        mock_collection.find_one = MagicMock(side_effect=ConnectionFailure("Connection failed"))
+        mock_collection.find_one = AsyncMock(side_effect=ConnectionFailure("Connection failed"))
 
         with self.assertRaises(ConnectionFailure):
             await get_message_settings("https://example.com")
 
+    @patch('db.routing_snapshot')
+    @patch('db.coll_webhooks')
+    async def test_get_settings_falls_back_to_snapshot(self, mock_collection, mock_snapshot):
+        """Тест маршрутизации по снимку при недоступной БД."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        from pymongo.errors import ConnectionFailure
+
+        mock_collection.find_one = AsyncMock(side_effect=ConnectionFailure("Connection failed"))
+        mock_snapshot.lookup = MagicMock(return_value={"channel_id": 1, "thread_id": None})
+
+        result = await get_message_settings("hook_id")
+
+        self.assertEqual(result["channel_id"], 1)
+        mock_snapshot.lookup.assert_called_once_with("hook_id")
+
 
 class TestDatabaseEdgeCases(unittest.IsolatedAsyncioTestCase):
     """Тесты граничных случаев БД."""
@@ -318,7 +438,7 @@ class TestDatabaseEdgeCases(unittest.IsolatedAsyncioTestCase):
         if add is None:
             self.skipTest("db module not available")
 
-        mock_collection.insert_one = MagicMock(return_value=MagicMock(inserted_id="id123"))
+        mock_collection.insert_one = AsyncMock(return_value=MagicMock(inserted_id="id123"))
 
         await add(
             name="",
@@ -337,7 +457,7 @@ class TestDatabaseEdgeCases(unittest.IsolatedAsyncioTestCase):
         if add is None:
             self.skipTest("db module not available")
 
-        mock_collection.insert_one = MagicMock(return_value=MagicMock(inserted_id="id123"))
+        mock_collection.insert_one = AsyncMock(return_value=MagicMock(inserted_id="id123"))
 
         long_string = "x" * 100000
         await add(
@@ -357,7 +477,7 @@ class TestDatabaseEdgeCases(unittest.IsolatedAsyncioTestCase):
         if add is None:
             self.skipTest("db module not available")
 
-        mock_collection.insert_one = MagicMock(return_value=MagicMock(inserted_id="id123"))
+        mock_collection.insert_one = AsyncMock(return_value=MagicMock(inserted_id="id123"))
 
         await add(
             name="웹훅_тест_🔗",
@@ -371,5 +491,341 @@ class TestDatabaseEdgeCases(unittest.IsolatedAsyncioTestCase):
         mock_collection.insert_one.assert_called_once()
 
 
+class TestRoutingCache(unittest.IsolatedAsyncioTestCase):
+    """Тесты кэша маршрутизации в get_message_settings."""
+
+    def setUp(self):
+        """Очистить кэш маршрутизации перед каждым тестом."""
+        _reset_caches()
+
+    @patch('db.coll_webhooks')
+    async def test_repeated_lookup_hits_cache(self, mock_collection):
+        """Тест что повторный запрос не обращается к БД."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        mock_collection.find_one = AsyncMock(return_value={"channel_id": 1, "thread_id": "None"})
+
+        for _ in range(5):
+            result = await get_message_settings("hook_id")
+
+        self.assertEqual(result["channel_id"], 1)
+        mock_collection.find_one.assert_called_once()
+
+    @patch('db.coll_webhooks')
+    async def test_unknown_webhook_negative_cached(self, mock_collection):
+        """Тест что отсутствующий webhook попадает в негативный кэш."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        mock_collection.find_one = AsyncMock(return_value=None)
+
+        self.assertIsNone(await get_message_settings("missing"))
+        self.assertIsNone(await get_message_settings("missing"))
+
+        mock_collection.find_one.assert_called_once()
+
+    @patch('db.coll_webhooks')
+    async def test_add_clears_negative_cache(self, mock_collection):
+        """Тест что созданный webhook перестает отсеиваться."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        mock_collection.find_one = AsyncMock(return_value=None)
+        mock_collection.insert_one = AsyncMock()
+        await get_message_settings("new_hook")
+
+        await add("hook", "new_hook", 1, 2, "None")
+        mock_collection.find_one = AsyncMock(return_value={"channel_id": 2, "thread_id": "None"})
+
+        self.assertEqual((await get_message_settings("new_hook"))["channel_id"], 2)
+
+    @patch('db.coll_webhooks')
+    async def test_concurrent_lookups_coalesced(self, mock_collection):
+        """Тест что одновременные запросы одного webhook объединяются."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        import asyncio
+
+        async def slow_find_one(*args, **kwargs):
+            await asyncio.sleep(0.01)
+            return {"channel_id": 1, "thread_id": "None"}
+
+        mock_collection.find_one = AsyncMock(side_effect=slow_find_one)
+        coalesced_before = db.settings_lookups.coalesced
+
+        results = await asyncio.gather(*(get_message_settings("burst") for _ in range(5)))
+
+        self.assertTrue(all(result["channel_id"] == 1 for result in results))
+        mock_collection.find_one.assert_called_once()
+        self.assertEqual(db.settings_lookups.coalesced - coalesced_before, 4)
+
+    @patch('db.coll_webhooks')
+    async def test_delete_invalidates_cache(self, mock_collection):
+        """Тест что удаление webhook сбрасывает запись кэша."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        mock_collection.find_one = AsyncMock(return_value={"channel_id": 1, "thread_id": "None"})
+        mock_collection.find_one_and_delete = AsyncMock(return_value={"url": "hook_id"})
+        _tombstones(mock_collection)
+
+        await get_message_settings("hook_id")
+        await delete_webhook("hook")
+        await get_message_settings("hook_id")
+
+        self.assertEqual(mock_collection.find_one.call_count, 2)
+
+    @patch('db.coll_webhooks')
+    async def test_add_invalidates_cache(self, mock_collection):
+        """Тест что добавление webhook сбрасывает запись кэша."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        mock_collection.find_one = AsyncMock(return_value={"channel_id": 1, "thread_id": "None"})
+        mock_collection.insert_one = AsyncMock()
+
+        await get_message_settings("hook_id")
+        await add("hook", "hook_id", 1, 2, "None")
+        await get_message_settings("hook_id")
+
+        self.assertEqual(mock_collection.find_one.call_count, 2)
+
+
+class TestUpsertWebhook(unittest.IsolatedAsyncioTestCase):
+    """Тесты для функции upsert_webhook."""
+
+    def setUp(self):
+        """Очистить кэши маршрутизации перед каждым тестом."""
+        _reset_caches()
+
+    @patch('db.coll_webhooks')
+    async def test_upsert_keyed_by_author_and_name(self, mock_collection):
+        """Тест что webhook создается одним запросом по (author_id, webhook_name)."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        mock_collection.find_one_and_update = AsyncMock(return_value=None)
+
+        webhook_id = await db.upsert_webhook("hook", author_id=1, channel_id=2, thread_id="None")
+
+        mock_collection.find_one_and_update.assert_called_once()
+        call = mock_collection.find_one_and_update.call_args
+        self.assertEqual(call.args[0], {'author_id': 1, 'webhook_name': "hook"})
+        self.assertEqual(call.args[1]['$set']['url'], webhook_id)
+        self.assertTrue(call.kwargs['upsert'])
+        self.assertEqual(len(webhook_id), 20)
+
+    @patch('db.coll_webhooks')
+    async def test_upsert_retries_on_id_collision(self, mock_collection):
+        """Тест повторной генерации id при нарушении уникального индекса."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        from pymongo.errors import DuplicateKeyError
+
+        mock_collection.find_one_and_update = AsyncMock(side_effect=[DuplicateKeyError("E11000"), None])
+
+        webhook_id = await db.upsert_webhook("hook", author_id=1, channel_id=2, thread_id="None")
+
+        self.assertEqual(mock_collection.find_one_and_update.call_count, 2)
+        first, second = mock_collection.find_one_and_update.call_args_list
+        self.assertNotEqual(first.args[1]['$set']['url'], second.args[1]['$set']['url'])
+        self.assertEqual(second.args[1]['$set']['url'], webhook_id)
+
+    @patch('db.coll_webhooks')
+    async def test_upsert_gives_up_after_attempts(self, mock_collection):
+        """Тест отказа после исчерпания попыток."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        from pymongo.errors import DuplicateKeyError
+
+        mock_collection.find_one_and_update = AsyncMock(side_effect=DuplicateKeyError("E11000"))
+
+        with self.assertRaises(db.WebhookIdCollision):
+            await db.upsert_webhook("hook", author_id=1, channel_id=2, thread_id="None")
+        self.assertEqual(mock_collection.find_one_and_update.call_count, db.WEBHOOK_ID_ATTEMPTS)
+
+    @patch('db.coll_webhooks')
+    async def test_upsert_invalidates_replaced_route(self, mock_collection):
+        """Тест что маршрут замененного webhook удаляется из кэша."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        mock_collection.find_one = AsyncMock(return_value={'channel_id': 1, 'thread_id': None})
+        await get_message_settings("old_id")
+        mock_collection.find_one_and_update = AsyncMock(return_value={'url': "old_id"})
+        tombstones = _tombstones(mock_collection)
+
+        await db.upsert_webhook("hook", author_id=1, channel_id=2, thread_id="None")
+
+        self.assertIsNone(db.routing_cache.get("old_id"))
+        self.assertEqual(tombstones.call_args.args[0]["url"], "old_id")
+
+
+class TestUserMenuCache(unittest.IsolatedAsyncioTestCase):
+    """Тесты кэша меню пользователя."""
+
+    def setUp(self):
+        """Очистить кэши перед каждым тестом."""
+        _reset_caches()
+
+    @patch('db.coll_webhooks')
+    async def test_navigation_served_from_cache(self, mock_collection):
+        """Тест что повторный просмотр списка и карточки не обращается к БД."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        mock_collection.find = MagicMock(return_value=_cursor([{"_id": HOOK_ID, "webhook_name": "hook"}]))
+        mock_collection.find_one = AsyncMock(return_value={
+            "webhook_name": "hook", "url": "hook_id", "author_id": 1, "channel_id": 2, "thread_id": None,
+        })
+
+        for _ in range(3):
+            page = await db.get_user_webhooks_page(1)
+            webhook_id = page.webhooks[0]['id']
+            await db.get_webhook_card(webhook_id, 1)
+            await db.get_webhook_name(webhook_id, 1)
+
+        mock_collection.find.assert_called_once()
+        mock_collection.find_one.assert_called_once()
+        self.assertEqual(mock_collection.find_one.call_args.args[0], {'_id': HOOK_ID, 'author_id': 1})
+
+    @patch('db.Git')
+    @patch('db.coll_webhooks')
+    async def test_card_includes_delivery_stats(self, mock_collection, mock_git):
+        """Тест что карточка показывает счетчики из документа WebhookStats."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        db.webhook_stats_cache.clear()
+        mock_collection.find_one = AsyncMock(return_value={
+            "webhook_name": "hook", "url": "hook_id", "author_id": 1, "channel_id": 2, "thread_id": None,
+        })
+        stats_collection = MagicMock()
+        stats_collection.find_one = AsyncMock(return_value={'received': 7, 'delivered': 6, 'failed': 1})
+        mock_git.__getitem__.return_value = stats_collection
+
+        card = await db.get_webhook_card(str(HOOK_ID), 1)
+        await db.get_webhook_card(str(HOOK_ID), 1)
+
+        self.assertIn("Событий получено: 7", card)
+        stats_collection.find_one.assert_called_once_with({'_id': "hook_id"})
+
+    @patch('db.coll_webhooks')
+    async def test_writes_invalidate_user_cache(self, mock_collection):
+        """Тест сброса кэша пользователя при создании и удалении webhook."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        mock_collection.find = MagicMock(return_value=_cursor([{"_id": HOOK_ID, "webhook_name": "hook"}]))
+        mock_collection.insert_one = AsyncMock()
+        mock_collection.find_one_and_delete = AsyncMock(return_value={"url": "hook_id", "author_id": 1})
+        _tombstones(mock_collection)
+
+        await db.get_user_webhooks_page(1)
+        await add("hook2", "hook2_id", 1, 2, "None")
+        await db.get_user_webhooks_page(1)
+        await delete_webhook("hook", user_id=1)
+        await db.get_user_webhooks_page(1)
+
+        self.assertEqual(mock_collection.find.call_count, 3)
+
+    @patch('db.coll_webhooks')
+    async def test_delete_by_id_scoped_to_owner(self, mock_collection):
+        """Тест удаления по первичному ключу только среди webhooks владельца."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        mock_collection.find_one_and_delete = AsyncMock(
+            return_value={"webhook_name": "hook", "url": "hook_id", "author_id": 1}
+        )
+        _tombstones(mock_collection)
+
+        name = await db.delete_webhook_by_id(str(HOOK_ID), 1)
+
+        self.assertEqual(name, "hook")
+        self.assertEqual(mock_collection.find_one_and_delete.call_args.args[0], {'_id': HOOK_ID, 'author_id': 1})
+
+    @patch('db.coll_webhooks')
+    async def test_invalid_id_not_queried(self, mock_collection):
+        """Тест что некорректный id не приводит к запросу."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        mock_collection.find_one = AsyncMock()
+
+        self.assertIsNone(await db.get_webhook_card("not-an-id", 1))
+        mock_collection.find_one.assert_not_called()
+
+    @patch('db.coll_webhooks')
+    async def test_other_users_not_invalidated(self, mock_collection):
+        """Тест что запись одного пользователя не сбрасывает кэш другого."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        mock_collection.find = MagicMock(return_value=_cursor([{"_id": HOOK_ID, "webhook_name": "hook"}]))
+        mock_collection.insert_one = AsyncMock()
+
+        await db.get_user_webhooks_page(1)
+        await add("hook2", "hook2_id", 2, 2, "None")
+        await db.get_user_webhooks_page(1)
+
+        mock_collection.find.assert_called_once()
+
+
+class TestLazyConnection(unittest.IsolatedAsyncioTestCase):
+    """Тесты ленивого подключения и быстрого отказа."""
+
+    def setUp(self):
+        """Очистить кэши маршрутизации перед каждым тестом."""
+        _reset_caches()
+
+    @patch('db.coll_webhooks', None)
+    async def test_not_connected_fails_fast(self):
+        """Тест отказа до создания клиента."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        with self.assertRaises(db.DatabaseUnavailable):
+            await get_user_webhooks(user_id=1)
+        self.assertFalse(db.is_ready())
+
+    @patch('db.coll_webhooks')
+    async def test_unavailable_server_fails_fast(self, mock_collection):
+        """Тест отказа без обращения к драйверу, когда сервер недоступен."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        mock_collection.find_one = AsyncMock()
+        with patch.object(db.topology_state, 'available', False):
+            with self.assertRaises(db.DatabaseUnavailable):
+                await get_message_settings("hook_id")
+
+        mock_collection.find_one.assert_not_called()
+
+    @patch('db.coll_webhooks')
+    async def test_ready_when_server_available(self, mock_collection):
+        """Тест готовности при доступном сервере."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        with patch.object(db.topology_state, 'available', True):
+            self.assertTrue(db.is_ready())
+
+    @patch('db.client', None)
+    async def test_connect_without_url_does_not_raise(self):
+        """Тест что отсутствие DB_URL не прерывает запуск."""
+        if add is None:
+            self.skipTest("db module not available")
+
+        with patch.dict(os.environ, {"DB_URL": ""}):
+            await db.connect()
+
+        self.assertIsNone(db.client)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,195 @@
+"""
+История доставки событий в Telegram.
+
+Записи копятся в памяти и пишутся в time-series коллекцию MongoDB
+пачками в фоне, поэтому отправка сообщения не ждет записи в БД.
+Старые записи удаляет сам сервер по expireAfterSeconds.
+"""
+import asyncio
+import datetime
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError, CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+# Ошибки записи документа, которые не исправит повтор: дубликат ключа, валидация
+PERMANENT_WRITE_ERRORS = {11000, 121}
+
+
+class DeliveryHistory:
+    """Буфер записей о доставке с пакетной записью в MongoDB."""
+
+    def __init__(
+        self,
+        collection_name: str = "DeliveryHistory",
+        ttl: float = 14 * 24 * 3600,
+        batch_size: int = 500,
+        flush_interval: float = 2.0,
+        max_buffer: int = 10000,
+    ):
+        """
+        Инициализация буфера.
+
+        Args:
+            collection_name: Имя time-series коллекции
+            ttl: Время хранения записей в секундах
+            batch_size: Размер пачки; полная пачка записывается не дожидаясь интервала
+            flush_interval: Максимальная задержка записи в секундах
+            max_buffer: Максимум записей в памяти; при переполнении теряются старые
+        """
+        self.collection_name = collection_name
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: deque = deque(maxlen=max_buffer)
+        self._batch_ready = asyncio.Event()
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.flush_failures = 0
+
+    def record(
+        self,
+        chat_id: int,
+        status: str,
+        duration_ms: float,
+        webhook_id: Optional[str] = None,
+        thread_id: Optional[int] = None,
+        event: Optional[str] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """
+        Добавить запись о доставке. Не обращается к БД.
+
+        Args:
+            chat_id: ID чата назначения
+            status: "ok" или "error"
+            duration_ms: Длительность отправки в миллисекундах
+            webhook_id: id webhook, если событие пришло через HTTP
+            thread_id: ID ветки форума
+            event: Тип события
+            error: Текст ошибки
+        """
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append({
+            'ts': datetime.datetime.now(datetime.timezone.utc),
+            'meta': {'chat_id': chat_id, 'webhook_id': webhook_id},
+            'thread_id': thread_id,
+            'event': event,
+            'status': status,
+            'duration_ms': duration_ms,
+            'error': error,
+        })
+        self.recorded += 1
+        if len(self._buffer) >= self.batch_size:
+            self._batch_ready.set()
+
+    async def ensure_collection(self, database) -> None:
+        """
+        Создать time-series коллекцию или обновить срок хранения.
+
+        Args:
+            database: База данных MongoDB (нужна версия 5.0+)
+        """
+        try:
+            await database.create_collection(
+                self.collection_name,
+                timeseries={'timeField': 'ts', 'metaField': 'meta', 'granularity': 'seconds'},
+                expireAfterSeconds=int(self.ttl),
+            )
+            logger.info(f"Создана коллекция истории доставки {self.collection_name}")
+        except CollectionInvalid:
+            await database.command('collMod', self.collection_name, expireAfterSeconds=int(self.ttl))
+
+    async def flush(self, collection) -> int:
+        """
+        Записать накопленные записи пачками.
+
+        При ошибке записи в буфер возвращаются только незаписанные записи:
+        при частичной ошибке — те, что сервер отклонил временной ошибкой,
+        при ошибке соединения — вся пачка.
+
+        Returns:
+            Количество записанных записей
+        """
+        written = 0
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            try:
+                await collection.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                self.flush_failures += 1
+                inserted = e.details.get('nInserted', 0)
+                written += inserted
+                self.written += inserted
+                self._requeue(self._failed(batch, e.details.get('writeErrors', [])))
+                raise
+            except Exception:
+                self.flush_failures += 1
+                self._requeue(batch)
+                raise
+            written += len(batch)
+            self.written += len(batch)
+        return written
+
+    def _failed(self, batch: List[Dict[str, Any]], write_errors: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Записи пачки, отклоненные временной ошибкой; остальные отклоненные теряются."""
+        failed = []
+        for error in write_errors:
+            if error.get('code') in PERMANENT_WRITE_ERRORS:
+                self.dropped += 1
+                logger.warning(f"Запись истории доставки отклонена: {error.get('errmsg')}")
+            else:
+                failed.append(batch[error['index']])
+        return failed
+
+    def _requeue(self, records: List[Dict[str, Any]]) -> None:
+        """
+        Вернуть записи в начало буфера.
+
+        Пока шла запись, буфер мог заполниться новыми записями; тогда
+        теряются самые старые из возвращаемых, и они учитываются в dropped.
+        """
+        room = self._buffer.maxlen - len(self._buffer)
+        if len(records) > room:
+            self.dropped += len(records) - room
+            records = records[len(records) - room:] if room > 0 else []
+        self._buffer.extendleft(reversed(records))
+
+    async def run(self, database) -> None:
+        """
+        Записывать историю в фоне: по заполнении пачки или по интервалу.
+
+        Args:
+            database: База данных MongoDB
+        """
+        try:
+            await self.ensure_collection(database)
+        except Exception as e:
+            logger.warning(f"Не удалось подготовить коллекцию истории доставки: {e}")
+        collection = database[self.collection_name]
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            try:
+                await self.flush(collection)
+            except Exception as e:
+                logger.warning(f"Не удалось записать историю доставки: {e}")
+                await asyncio.sleep(self.flush_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        """Вернуть счетчики буфера."""
+        return {
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flush_failures": self.flush_failures,
+        }
@@ -0,0 +1,138 @@
+"""
+Тесты для истории доставки.
+
+Тестирует буферизацию, запись пачками, возврат незаписанных записей
+в буфер при ошибке и создание time-series коллекции.
+"""
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pymongo.errors import AutoReconnect, BulkWriteError, CollectionInvalid
+from delivery_history import DeliveryHistory
+
+
+class TestDeliveryHistory(unittest.IsolatedAsyncioTestCase):
+    """Тесты для DeliveryHistory."""
+
+    def setUp(self):
+        """Создать историю с маленькими пачками."""
+        self.history = DeliveryHistory(batch_size=2, flush_interval=0.05, max_buffer=5)
+        self.collection = MagicMock()
+        self.collection.insert_many = AsyncMock()
+
+    async def test_flush_in_batches(self):
+        """Тест записи накопленных записей пачками."""
+        for chat_id in range(3):
+            self.history.record(chat_id, "ok", 1.5, webhook_id="hook")
+
+        written = await self.history.flush(self.collection)
+
+        self.assertEqual(written, 3)
+        self.assertEqual(self.collection.insert_many.call_count, 2)
+        doc = self.collection.insert_many.call_args_list[0].args[0][0]
+        self.assertEqual(doc['meta'], {'chat_id': 0, 'webhook_id': "hook"})
+        self.assertEqual(doc['status'], "ok")
+
+    async def test_failed_batch_returned_to_buffer(self):
+        """Тест что при ошибке записи пачка остается в буфере."""
+        self.history.record(1, "ok", 1.0)
+        self.collection.insert_many = AsyncMock(side_effect=AutoReconnect("down"))
+
+        with self.assertRaises(AutoReconnect):
+            await self.history.flush(self.collection)
+
+        self.assertEqual(self.history.stats()["buffered"], 1)
+        self.assertEqual(self.history.stats()["flush_failures"], 1)
+
+    async def test_partial_failure_requeues_failed_only(self):
+        """Тест что после частичной ошибки в буфер возвращаются только незаписанные записи."""
+        self.history.record(1, "ok", 1.0)
+        self.history.record(2, "ok", 1.0)
+        self.collection.insert_many = AsyncMock(side_effect=BulkWriteError({
+            'nInserted': 1,
+            'writeErrors': [{'index': 1, 'code': 91, 'errmsg': "shutting down"}],
+        }))
+
+        with self.assertRaises(BulkWriteError):
+            await self.history.flush(self.collection)
+
+        self.assertEqual([r['meta']['chat_id'] for r in self.history._buffer], [2])
+        self.assertEqual(self.history.stats()["written"], 1)
+
+    async def test_permanent_error_dropped(self):
+        """Тест что запись, отклоненная валидацией, не возвращается в буфер и считается потерянной."""
+        self.history.record(1, "ok", 1.0)
+        self.collection.insert_many = AsyncMock(side_effect=BulkWriteError({
+            'nInserted': 0,
+            'writeErrors': [{'index': 0, 'code': 121, 'errmsg': "validation failed"}],
+        }))
+
+        with self.assertRaises(BulkWriteError):
+            await self.history.flush(self.collection)
+
+        self.assertEqual(self.history.stats()["buffered"], 0)
+        self.assertEqual(self.history.stats()["dropped"], 1)
+
+    async def test_requeue_into_full_buffer_counts_drops(self):
+        """Тест что записи, не поместившиеся обратно в буфер, учитываются в dropped."""
+        self.history.record(1, "ok", 1.0)
+        self.history.record(2, "ok", 1.0)
+
+        async def insert_many(batch, ordered):
+            # Пока идет запись, буфер заполняется новыми записями
+            for chat_id in range(10, 14):
+                self.history.record(chat_id, "ok", 1.0)
+            raise AutoReconnect("down")
+
+        self.collection.insert_many = insert_many
+        with self.assertRaises(AutoReconnect):
+            await self.history.flush(self.collection)
+
+        self.assertEqual([r['meta']['chat_id'] for r in self.history._buffer], [2, 10, 11, 12, 13])
+        self.assertEqual(self.history.stats()["dropped"], 1)
+
+    def test_buffer_bounded(self):
+        """Тест что буфер ограничен и считает потерянные записи."""
+        for chat_id in range(7):
+            self.history.record(chat_id, "ok", 1.0)
+
+        self.assertEqual(self.history.stats()["buffered"], 5)
+        self.assertEqual(self.history.stats()["dropped"], 2)
+
+    async def test_full_batch_flushed_before_interval(self):
+        """Тест что полная пачка записывается не дожидаясь интервала."""
+        self.history.flush_interval = 60
+        database = MagicMock()
+        database.create_collection = AsyncMock()
+        database.__getitem__.return_value = self.collection
+
+        task = asyncio.create_task(self.history.run(database))
+        await asyncio.sleep(0)
+        self.history.record(1, "ok", 1.0)
+        self.history.record(2, "error", 1.0, error="Forbidden")
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+        self.collection.insert_many.assert_called_once()
+
+    async def test_existing_collection_ttl_updated(self):
+        """Тест обновления срока хранения существующей коллекции."""
+        database = MagicMock()
+        database.create_collection = AsyncMock(side_effect=CollectionInvalid("exists"))
+        database.command = AsyncMock()
+
+        await self.history.ensure_collection(database)
+
+        database.command.assert_called_once_with(
+            'collMod', "DeliveryHistory", expireAfterSeconds=int(self.history.ttl)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
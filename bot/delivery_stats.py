@@ -0,0 +1,130 @@
+"""
+Счетчики доставки по webhooks.
+
+События считаются в памяти процесса и периодически сбрасываются в
+коллекцию WebhookStats одним bulk_write из $inc upsert по документу на
+webhook, поэтому подсчет не добавляет запросов к БД на каждое событие.
+"""
+import asyncio
+import datetime
+import logging
+from collections import Counter, defaultdict
+from typing import Any, Dict, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Счетчики документа WebhookStats
+FIELDS = ("received", "delivered", "failed")
+
+
+class DeliveryCounters:
+    """Несброшенные счетчики событий по id webhook."""
+
+    def __init__(self):
+        """Инициализация пустых счетчиков."""
+        self._counts: Dict[str, Counter] = defaultdict(Counter)
+        self._last_event: Dict[str, datetime.datetime] = {}
+        self.flushes = 0
+        self.flush_failures = 0
+
+    def incr(self, webhook_id: str, field: str) -> None:
+        """
+        Увеличить счетчик webhook.
+
+        Args:
+            webhook_id: id webhook
+            field: received, delivered или failed
+        """
+        self._counts[webhook_id][field] += 1
+        if field == "received":
+            self._last_event[webhook_id] = datetime.datetime.now(datetime.timezone.utc)
+
+    def _take(self):
+        """Забрать накопленные счетчики, оставив пустые."""
+        counts, last_event = self._counts, self._last_event
+        self._counts, self._last_event = defaultdict(Counter), {}
+        return counts, last_event
+
+    def _restore(self, counts, last_event) -> None:
+        """Вернуть несброшенные счетчики после ошибки записи."""
+        for webhook_id, counter in counts.items():
+            self._counts[webhook_id].update(counter)
+        for webhook_id, at in last_event.items():
+            self._last_event[webhook_id] = max(at, self._last_event.get(webhook_id, at))
+
+    async def flush(self, collection) -> int:
+        """
+        Сбросить счетчики в коллекцию одним bulk_write.
+
+        При ошибке записи счетчики возвращаются в память.
+
+        Returns:
+            Количество обновленных webhooks
+        """
+        counts, last_event = self._take()
+        if not counts:
+            return 0
+
+        requests = []
+        for webhook_id, counter in counts.items():
+            update: Dict[str, Any] = {'$inc': dict(counter)}
+            if webhook_id in last_event:
+                update['$max'] = {'last_event_at': last_event[webhook_id]}
+            requests.append(UpdateOne({'_id': webhook_id}, update, upsert=True))
+
+        try:
+            await collection.bulk_write(requests, ordered=False)
+        except Exception:
+            self.flush_failures += 1
+            self._restore(counts, last_event)
+            raise
+        self.flushes += 1
+        return len(requests)
+
+    async def run(self, collection, interval: float) -> None:
+        """
+        Периодически сбрасывать счетчики.
+
+        Args:
+            collection: Коллекция WebhookStats
+            interval: Период сброса в секундах
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush(collection)
+            except Exception as e:
+                logger.warning(f"Не удалось записать счетчики доставки: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Вернуть состояние счетчиков."""
+        return {
+            "pending_webhooks": len(self._counts),
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+        }
+
+
+def format_stats(doc: Optional[Dict[str, Any]]) -> str:
+    """
+    Сформировать блок статистики для карточки webhook.
+
+    Args:
+        doc: Документ WebhookStats или None
+
+    Returns:
+        Текст блока статистики
+    """
+    if doc is None:
+        return "Событий еще не было"
+    lines = [
+        f"Событий получено: {doc.get('received', 0)}",
+        f"Доставлено: {doc.get('delivered', 0)}",
+        f"Ошибок доставки: {doc.get('failed', 0)}",
+    ]
+    last_event = doc.get('last_event_at')
+    if last_event is not None:
+        lines.append(f"Последнее событие: {last_event:%Y-%m-%d %H:%M:%S} UTC")
+    return "\n".join(lines)
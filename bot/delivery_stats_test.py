@@ -0,0 +1,78 @@
+"""
+Тесты для счетчиков доставки по webhooks.
+
+Тестирует подсчет в памяти, сброс одним bulk_write и возврат
+счетчиков при ошибке записи.
+"""
+import datetime
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pymongo.errors import AutoReconnect
+from delivery_stats import DeliveryCounters, format_stats
+
+
+class TestDeliveryCounters(unittest.IsolatedAsyncioTestCase):
+    """Тесты для DeliveryCounters."""
+
+    def setUp(self):
+        """Создать счетчики и мок коллекции."""
+        self.counters = DeliveryCounters()
+        self.collection = MagicMock()
+        self.collection.bulk_write = AsyncMock()
+
+    async def test_flush_single_bulk_write(self):
+        """Тест сброса всех webhooks одним bulk_write с $inc upsert."""
+        for _ in range(3):
+            self.counters.incr("hook1", "received")
+            self.counters.incr("hook1", "delivered")
+        self.counters.incr("hook2", "failed")
+
+        updated = await self.counters.flush(self.collection)
+
+        self.assertEqual(updated, 2)
+        self.collection.bulk_write.assert_called_once()
+        requests = {r._filter['_id']: r for r in self.collection.bulk_write.call_args.args[0]}
+        self.assertEqual(requests["hook1"]._doc['$inc'], {'received': 3, 'delivered': 3})
+        self.assertIn('$max', requests["hook1"]._doc)
+        self.assertEqual(requests["hook2"]._doc, {'$inc': {'failed': 1}})
+        self.assertTrue(requests["hook1"]._upsert)
+
+    async def test_nothing_to_flush(self):
+        """Тест что без событий запросов нет."""
+        self.assertEqual(await self.counters.flush(self.collection), 0)
+        self.collection.bulk_write.assert_not_called()
+
+    async def test_counts_restored_on_failure(self):
+        """Тест что при ошибке записи счетчики не теряются."""
+        self.counters.incr("hook", "received")
+        self.collection.bulk_write = AsyncMock(side_effect=AutoReconnect("down"))
+        with self.assertRaises(AutoReconnect):
+            await self.counters.flush(self.collection)
+
+        self.counters.incr("hook", "received")
+        self.collection.bulk_write = AsyncMock()
+        await self.counters.flush(self.collection)
+
+        request = self.collection.bulk_write.call_args.args[0][0]
+        self.assertEqual(request._doc['$inc'], {'received': 2})
+
+    def test_format_stats(self):
+        """Тест блока статистики карточки."""
+        text = format_stats({
+            'received': 5, 'delivered': 4, 'failed': 1,
+            'last_event_at': datetime.datetime(2024, 1, 2, 3, 4, 5),
+        })
+
+        self.assertIn("Событий получено: 5", text)
+        self.assertIn("2024-01-02 03:04:05", text)
+        self.assertEqual(format_stats(None), "Событий еще не было")
+
+
+if __name__ == "__main__":
+    unittest.main()
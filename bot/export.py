@@ -0,0 +1,251 @@
+"""
+Потоковая выгрузка webhooks и истории доставки в NDJSON или CSV.
+
+Документы читаются курсором пачками по batch_size и проходят через
+генераторы сериализации, поэтому в памяти одновременно находится не
+больше одной пачки, независимо от размера коллекции.
+
+Запуск:
+    python export.py webhooks --format csv --output webhooks.csv
+    python export.py history --format ndjson --gzip --output history.ndjson.gz
+    python export.py history --author-id 12345 > history.ndjson
+"""
+import argparse
+import asyncio
+import csv
+import datetime
+import gzip
+import io
+import json
+import logging
+import sys
+from typing import Any, AsyncIterable, Dict, Iterable, Iterator, List, Optional
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+FORMATS = ("ndjson", "csv")
+
+# Наборы данных: коллекция и поля в порядке столбцов CSV
+DATASETS = {
+    "webhooks": {
+        "collection": "Webhooks",
+        "fields": ["webhook_name", "url", "author_id", "channel_id", "thread_id", "schema_version"],
+        "sort": "_id",
+    },
+    "history": {
+        "collection": "DeliveryHistory",
+        "fields": ["ts", "meta.webhook_id", "meta.chat_id", "thread_id", "event", "status", "duration_ms", "error"],
+        "sort": "ts",
+    },
+}
+
+
+def _json_default(value: Any) -> Any:
+    """Сериализация типов BSON для json.dumps."""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def projection(fields: List[str]) -> Dict[str, int]:
+    """Проекция запроса по полям набора данных."""
+    projection = {field: 1 for field in fields}
+    projection["_id"] = 0
+    return projection
+
+
+def _field(doc: Dict[str, Any], path: str) -> Any:
+    """Значение вложенного поля по пути через точку."""
+    for key in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(key)
+    return doc
+
+
+def ndjson_lines(docs: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Строки NDJSON: по одному JSON документу на строку."""
+    for doc in docs:
+        yield json.dumps(doc, ensure_ascii=False, default=_json_default) + "\n"
+
+
+def csv_lines(docs: Iterable[Dict[str, Any]], fields: List[str], header: bool = True) -> Iterator[str]:
+    """Строки CSV с заголовком; вложенные поля задаются путем через точку."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take() -> str:
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    if header:
+        writer.writerow(fields)
+        yield take()
+    for doc in docs:
+        row = []
+        for field in fields:
+            value = _field(doc, field)
+            row.append(value.isoformat() if isinstance(value, datetime.datetime) else value)
+        writer.writerow(row)
+        yield take()
+
+
+def format_lines(docs: Iterable[Dict[str, Any]], fmt: str, fields: List[str], header: bool = True) -> Iterator[str]:
+    """Строки выгрузки в формате fmt."""
+    if fmt == "csv":
+        return csv_lines(docs, fields, header=header)
+    return ndjson_lines(docs)
+
+
+class _StdoutWriter(io.TextIOWrapper):
+    """Текстовая обертка над stdout: закрытие отсоединяет ее, не закрывая stdout."""
+
+    _released = False
+
+    def close(self) -> None:
+        """Дописать данные (и концовку gzip) и отсоединиться от stdout."""
+        if self._released:
+            return
+        self._released = True
+        self.flush()
+        raw = self.detach()
+        if isinstance(raw, gzip.GzipFile):
+            # GzipFile поверх переданного файла не закрывает сам файл
+            raw.close()
+        sys.stdout.buffer.flush()
+
+
+def open_output(path: Optional[str], compress: bool = False):
+    """
+    Открыть файл выгрузки для записи текста.
+
+    Args:
+        path: Путь к файлу; None или "-" — stdout (остается открытым
+            после закрытия выгрузки)
+        compress: Сжимать ли gzip
+    """
+    if path in (None, "-"):
+        if compress:
+            return _StdoutWriter(gzip.GzipFile(fileobj=sys.stdout.buffer, mode="wb"), encoding="utf-8", newline="")
+        return _StdoutWriter(sys.stdout.buffer, encoding="utf-8", newline="", write_through=True)
+    if compress:
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def user_query(dataset: str, author_id: int, urls: List[str]) -> Dict[str, Any]:
+    """
+    Условие выборки данных одного пользователя.
+
+    Args:
+        dataset: webhooks или history
+        author_id: ID пользователя
+        urls: id webhooks пользователя; история выбирается по ним
+    """
+    if dataset == "webhooks":
+        return {"author_id": author_id}
+    return {"meta.webhook_id": {"$in": urls}}
+
+
+def dataset_query(database, dataset: str, author_id: Optional[int] = None) -> Dict[str, Any]:
+    """Условие выборки набора данных для синхронного клиента."""
+    if author_id is None:
+        return {}
+    urls = []
+    if dataset == "history":
+        urls = [doc["url"] for doc in database["Webhooks"].find({"author_id": author_id}, {"url": 1, "_id": 0})]
+    return user_query(dataset, author_id, urls)
+
+
+def export_dataset(database, dataset: str, out, fmt: str = "ndjson",
+                   author_id: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Выгрузить набор данных синхронным курсором.
+
+    Args:
+        database: База данных (pymongo)
+        dataset: webhooks или history
+        out: Текстовый файл для записи
+        fmt: ndjson или csv
+        author_id: Выгрузить только данные этого пользователя
+        batch_size: Размер пачки курсора
+
+    Returns:
+        Количество выгруженных документов
+    """
+    spec = DATASETS[dataset]
+    cursor = database[spec["collection"]].find(
+        dataset_query(database, dataset, author_id),
+        projection(spec["fields"]),
+        batch_size=batch_size,
+    ).sort(spec["sort"], 1)
+
+    count = 0
+
+    def counted(docs):
+        nonlocal count
+        for doc in docs:
+            count += 1
+            yield doc
+
+    for line in format_lines(counted(cursor), fmt, spec["fields"]):
+        out.write(line)
+    return count
+
+
+async def export_async(cursor: AsyncIterable[Dict[str, Any]], out, fmt: str, fields: List[str],
+                       batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Выгрузить документы асинхронного курсора.
+
+    Документы сериализуются пачками по batch_size; запись пачки в файл
+    выполняется в потоке, чтобы не блокировать event loop.
+
+    Returns:
+        Количество выгруженных документов
+    """
+    count = 0
+    batch: List[Dict[str, Any]] = []
+    header = True
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await asyncio.to_thread(out.writelines, list(format_lines(batch, fmt, fields, header=header)))
+            count += len(batch)
+            batch.clear()
+            header = False
+    if batch or header:
+        await asyncio.to_thread(out.writelines, list(format_lines(batch, fmt, fields, header=header)))
+        count += len(batch)
+    return count
+
+
+if __name__ == "__main__":
+    from init_db import connect
+
+    parser = argparse.ArgumentParser(description="Выгрузка webhooks и истории доставки")
+    parser.add_argument("dataset", choices=sorted(DATASETS), help="набор данных")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson", help="формат выгрузки")
+    parser.add_argument("--gzip", action="store_true", help="сжать выгрузку gzip")
+    parser.add_argument("--output", default="-", help="файл выгрузки (по умолчанию stdout)")
+    parser.add_argument("--author-id", type=int, help="выгрузить данные одного пользователя")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="размер пачки курсора")
+    args = parser.parse_args()
+
+    client = connect()
+    try:
+        with open_output(args.output, compress=args.gzip) as out:
+            exported = export_dataset(
+                client["GitHook-db"], args.dataset, out,
+                fmt=args.format, author_id=args.author_id, batch_size=args.batch_size,
+            )
+        logger.info(f"Выгружено документов: {exported}")
+    finally:
+        client.close()
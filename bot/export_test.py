@@ -0,0 +1,166 @@
+"""
+Тесты для потоковой выгрузки webhooks и истории доставки.
+
+Тестирует сериализацию NDJSON/CSV, запись пачками из асинхронного
+курсора, сжатие gzip и условия выборки данных пользователя.
+"""
+import datetime
+import gzip
+import io
+import json
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bson import ObjectId
+from export import DATASETS, csv_lines, export_async, export_dataset, ndjson_lines, open_output, user_query
+
+TS = datetime.datetime(2026, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)
+
+
+class AsyncCursor:
+    """Асинхронный курсор по списку документов с подсчетом прочитанных."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.read = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.read >= len(self.docs):
+            raise StopAsyncIteration
+        self.read += 1
+        return self.docs[self.read - 1]
+
+
+class RecordingFile(io.StringIO):
+    """Файл, запоминающий размер каждой записанной пачки."""
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def writelines(self, lines):
+        self.batches.append(len(lines))
+        super().writelines(lines)
+
+
+class TestSerialization(unittest.TestCase):
+    """Тесты для генераторов строк."""
+
+    def test_ndjson_bson_types(self):
+        """Тест NDJSON с датами и ObjectId."""
+        oid = ObjectId()
+        line = next(ndjson_lines([{'ts': TS, 'id': oid, 'name': 'хук'}]))
+
+        self.assertTrue(line.endswith("\n"))
+        self.assertEqual(json.loads(line), {'ts': TS.isoformat(), 'id': str(oid), 'name': 'хук'})
+
+    def test_csv_nested_fields(self):
+        """Тест CSV с заголовком, вложенными полями и пустыми значениями."""
+        fields = ["ts", "meta.chat_id", "error"]
+        lines = list(csv_lines([{'ts': TS, 'meta': {'chat_id': -100}}], fields))
+
+        self.assertEqual(lines, ["ts,meta.chat_id,error\r\n", f"{TS.isoformat()},-100,\r\n"])
+
+    def test_user_query(self):
+        """Тест выборки webhooks по автору, а истории — по его webhooks."""
+        self.assertEqual(user_query("webhooks", 1, []), {'author_id': 1})
+        self.assertEqual(user_query("history", 1, ['a', 'b']), {'meta.webhook_id': {'$in': ['a', 'b']}})
+
+
+class TestExportAsync(unittest.IsolatedAsyncioTestCase):
+    """Тесты для export_async."""
+
+    async def test_writes_in_batches(self):
+        """Тест записи пачками: заголовок CSV только в первой пачке."""
+        docs = [{'webhook_name': f'hook{i}', 'url': f'url{i}'} for i in range(5)]
+        out = RecordingFile()
+
+        count = await export_async(AsyncCursor(docs), out, "csv", DATASETS["webhooks"]["fields"], batch_size=2)
+
+        self.assertEqual(count, 5)
+        self.assertEqual(out.batches, [3, 2, 1])
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[0].startswith("webhook_name,url"))
+
+    async def test_empty_cursor(self):
+        """Тест пустой выгрузки: для CSV остается только заголовок."""
+        out = io.StringIO()
+
+        count = await export_async(AsyncCursor([]), out, "csv", ["a", "b"])
+
+        self.assertEqual(count, 0)
+        self.assertEqual(out.getvalue(), "a,b\r\n")
+
+    async def test_gzip_output(self):
+        """Тест сжатой выгрузки NDJSON."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "history.ndjson.gz")
+            with open_output(path, compress=True) as out:
+                await export_async(AsyncCursor([{'status': 'ok'}, {'status': 'error'}]), out, "ndjson", [])
+
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                rows = [json.loads(line) for line in f]
+
+        self.assertEqual(rows, [{'status': 'ok'}, {'status': 'error'}])
+
+
+class TestOpenOutput(unittest.TestCase):
+    """Тесты выгрузки в stdout."""
+
+    def setUp(self):
+        """Подменить stdout буфером в памяти."""
+        self.stdout = MagicMock()
+        self.stdout.buffer = io.BytesIO()
+        patcher = patch('export.sys.stdout', self.stdout)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stdout_left_open(self):
+        """Тест что закрытие выгрузки не закрывает stdout процесса."""
+        with open_output("-") as out:
+            out.write("строка\n")
+
+        self.assertFalse(self.stdout.buffer.closed)
+        self.assertEqual(self.stdout.buffer.getvalue().decode("utf-8"), "строка\n")
+
+    def test_gzip_stdout_left_open(self):
+        """Тест что сжатая выгрузка дописывает концовку gzip и не закрывает stdout."""
+        with open_output(None, compress=True) as out:
+            out.write('{"status": "ok"}\n')
+
+        self.assertFalse(self.stdout.buffer.closed)
+        self.assertEqual(gzip.decompress(self.stdout.buffer.getvalue()), b'{"status": "ok"}\n')
+
+
+class TestExportDataset(unittest.TestCase):
+    """Тесты для синхронной выгрузки из CLI."""
+
+    def test_history_of_user(self):
+        """Тест выгрузки истории пользователя курсором с batch_size."""
+        webhooks, history = MagicMock(), MagicMock()
+        webhooks.find.return_value = [{'url': 'hook1'}]
+        history.find.return_value.sort.return_value = iter([{'ts': TS, 'status': 'ok'}])
+        database = {"Webhooks": webhooks, "DeliveryHistory": history}
+        out = io.StringIO()
+
+        count = export_dataset(database, "history", out, author_id=7, batch_size=50)
+
+        self.assertEqual(count, 1)
+        args, kwargs = history.find.call_args
+        self.assertEqual(args[0], {'meta.webhook_id': {'$in': ['hook1']}})
+        self.assertEqual(kwargs['batch_size'], 50)
+        self.assertEqual(json.loads(out.getvalue()), {'ts': TS.isoformat(), 'status': 'ok'})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -18,6 +18,9 @@ from google.protobuf.empty_pb2 import Empty
 
 logger = logging.getLogger(__name__)
 
+# Сколько ждать начатые вызовы при остановке сервера, с
+STOP_GRACE = 5
+
 
 class SendMessageServicer(hook_pb2_grpc.SendMessageServicer):
     """Сервис для получения сообщений от Go сервера."""
@@ -49,16 +52,17 @@ class SendMessageServicer(hook_pb2_grpc.SendMessageServicer):
 
             logger.info(f"Получено сообщение через gRPC: {request.event} от {request.author}")
 
-            # Отправить сообщение в Telegram
+            # Поставить сообщение в очередь отправки в Telegram
             message_text = f"{request.author}\n{request.comment}\n{request.rep_name}"
             await self.webhook_send_callback(
                 message=message_text,
                 channel_id=request.chat_id,
                 thread_id=request.thread_id,
-                web_preview=False
+                web_preview=False,
+                event=request.event,
             )
 
-            logger.info(f"Сообщение отправлено в Telegram (чат {request.chat_id})")
+            logger.info(f"Сообщение поставлено в очередь отправки (чат {request.chat_id})")
             return Empty()
 
         except Exception as e:
@@ -90,9 +94,10 @@ async def serve(webhook_send_callback: Optional[Callable] = None, port: int = 50
 
     try:
         await server.wait_for_termination()
-    except KeyboardInterrupt:
+    finally:
+        # Новые вызовы отклоняются, начатые успевают поставить сообщение в очередь
+        await server.stop(STOP_GRACE)
         logger.info("gRPC сервер остановлен")
-        await server.stop(0)
 
 
 def start_grpc_server(webhook_send_callback=None, port: int = 50051):
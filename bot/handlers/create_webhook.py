@@ -6,8 +6,6 @@
 import logging
 import os
 from typing import Dict, Any
-from random import choices
-from string import ascii_letters
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 from aiogram import types, F, Router
@@ -27,23 +25,17 @@ class CreateWebhookStates(StatesGroup):
     user_id = State()
 
 
-def generate_webhook_url(name: str, user_id: int) -> str:
+def generate_webhook_url(webhook_id: str) -> str:
     """
-    Сгенерировать URL для webhook.
+    Сформировать URL для webhook.
 
     Args:
-        name: Название webhook
-        user_id: ID пользователя
+        webhook_id: id webhook, выданный db.upsert_webhook
 
     Returns:
         Полный URL webhook
     """
-    random_suffix = ''.join(choices(ascii_letters, k=20))
-    webhook_id = random_suffix
-        
-    full_url = f"{SERVER_URL}/github-webhook/{webhook_id}"
-    logger.info(f"Сгенерирован webhook для пользователя {user_id}: {name}")
-    return full_url
+    return f"{SERVER_URL}/github-webhook/{webhook_id}"
 
 
 @router.callback_query(F.data == "create_webhhok")
@@ -114,21 +106,14 @@ async def process_thread_id(message: types.Message, state: FSMContext) -> None:
     data = await state.get_data()
     
     try:
-        # Обновить информацию webhook в БД
-        await db.delete_webhook(data['name'])
-        webhook_url = generate_webhook_url(
-            name=data['name'],
-            user_id=data['user_id']
-        )
-        
-        # Сохранить webhook с полной информацией
-        await db.add(
+        # Создать webhook или заменить webhook пользователя с тем же названием
+        webhook_id = await db.upsert_webhook(
             name=data['name'],
-            url=webhook_url.split('/')[-1],
             author_id=data['user_id'],
             channel_id=data['channel_id'],
             thread_id=thread_id,
         )
+        webhook_url = generate_webhook_url(webhook_id)
         
         response_message = (
             f"✅ Вебхук создан!\n\n"
@@ -0,0 +1,89 @@
+"""
+Обработчик выгрузки данных пользователя.
+
+Команда /export [webhooks|history] [csv|ndjson] [gz] отправляет документом
+webhooks пользователя или историю доставки его событий.
+"""
+import logging
+import os
+import tempfile
+from typing import Optional, Tuple
+from aiogram import types, Router
+from aiogram.filters import Command, CommandObject
+import db
+from export import DATASETS, FORMATS, open_output
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+# Ограничение Bot API на размер отправляемого файла
+MAX_DOCUMENT_SIZE = 50 * 1024 * 1024
+
+USAGE = "Использование: /export [webhooks|history] [csv|ndjson] [gz]"
+
+
+def parse_export_args(args: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """
+    Разобрать аргументы команды /export.
+
+    Args:
+        args: Текст после команды
+
+    Returns:
+        (набор данных, формат, сжимать ли) или None при неверных аргументах
+    """
+    dataset, fmt, compress = "webhooks", None, False
+    for arg in (args or "").lower().split():
+        if arg in DATASETS:
+            dataset = arg
+        elif arg in FORMATS:
+            fmt = arg
+        elif arg in ("gz", "gzip"):
+            compress = True
+        else:
+            return None
+    # Webhooks удобнее смотреть таблицей, историю — построчным JSON
+    if fmt is None:
+        fmt = "csv" if dataset == "webhooks" else "ndjson"
+    return dataset, fmt, compress
+
+
+@router.message(Command('export'))
+async def export_user_data(message: types.Message, command: CommandObject) -> None:
+    """
+    Обработчик команды /export - выгрузить свои данные файлом.
+
+    Данные пишутся во временный файл потоково и отправляются документом.
+    """
+    parsed = parse_export_args(command.args)
+    if parsed is None:
+        await message.answer(USAGE)
+        return
+    dataset, fmt, compress = parsed
+    user_id = message.chat.id
+    filename = f"{dataset}.{fmt}" + (".gz" if compress else "")
+
+    fd, path = tempfile.mkstemp(suffix=filename)
+    os.close(fd)
+    try:
+        with open_output(path, compress=compress) as out:
+            exported = await db.export_user_data(user_id, dataset, out, fmt=fmt)
+
+        if exported == 0:
+            await message.answer("Нет данных для выгрузки.")
+            return
+        if os.path.getsize(path) > MAX_DOCUMENT_SIZE:
+            await message.answer("❌ Выгрузка больше 50 МБ. Попробуйте со сжатием: добавьте gz.")
+            return
+
+        await message.answer_document(
+            types.FSInputFile(path, filename=filename),
+            caption=f"Выгружено записей: {exported}",
+        )
+        logger.info(f"Пользователь {user_id} выгрузил {dataset}: {exported} записей")
+
+    except Exception as e:
+        logger.error(f"Ошибка при выгрузке данных: {e}")
+        await message.answer("❌ Ошибка при выгрузке данных.")
+    finally:
+        os.unlink(path)
@@ -5,30 +5,75 @@
 смотреть информацию и удалять их.
 """
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from aiogram import types, F, Router
 import db
+from keyboards.callbacks import PageDirection, WebhookAction, WebhookCallback, WebhooksPageCallback
 
 logger = logging.getLogger(__name__)
 router = Router()
 
 
-@router.callback_query(F.data == "view_webhooks")
-async def view_webhooks_list(callback: types.CallbackQuery) -> None:
+def webhooks_page_keyboard(page: "db.WebhooksPage") -> types.InlineKeyboardMarkup:
+    """
+    Создать клавиатуру страницы списка webhooks.
+
+    Args:
+        page: Страница webhooks
+
+    Returns:
+        InlineKeyboardMarkup с кнопками webhooks, навигации и возврата
+    """
+    buttons = []
+    for webhook in page.webhooks:
+        buttons.append([
+            types.InlineKeyboardButton(
+                text=f"📌 {webhook['webhook_name']}",
+                callback_data=WebhookCallback(action=WebhookAction.info, id=webhook['id']).pack()
+            )
+        ])
+
+    navigation = []
+    if page.has_prev:
+        navigation.append(types.InlineKeyboardButton(
+            text='◀️',
+            callback_data=WebhooksPageCallback(direction=PageDirection.prev, id=page.webhooks[0]['id']).pack()
+        ))
+    if page.has_next:
+        navigation.append(types.InlineKeyboardButton(
+            text='▶️',
+            callback_data=WebhooksPageCallback(direction=PageDirection.next, id=page.webhooks[-1]['id']).pack()
+        ))
+    if navigation:
+        buttons.append(navigation)
+
+    # Добавить кнопку возврата
+    buttons.append([
+        types.InlineKeyboardButton(text='⬅️ Назад', callback_data='main_menu')
+    ])
+    return types.InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+async def show_webhooks_page(callback: types.CallbackQuery, after: Optional[str] = None, before: Optional[str] = None) -> None:
     """
-    Показать список webhooks пользователя.
+    Показать страницу списка webhooks пользователя.
 
     Args:
         callback: Callback query от Telegram
+        after: Название последнего webhook предыдущей страницы
+        before: Название первого webhook следующей страницы
     """
     try:
         await callback.answer()
         user_id = callback.message.chat.id
-        
-        # Получить список webhooks
-        webhooks_list = await db.get_user_webhooks(user_id)
-        
-        if not webhooks_list:
+
+        # Получить одну страницу webhooks
+        page = await db.get_user_webhooks_page(user_id, after=after, before=before)
+        if not page.webhooks and (after is not None or before is not None):
+            # Webhooks страницы удалены — вернуться к началу списка
+            page = await db.get_user_webhooks_page(user_id)
+
+        if not page.webhooks:
             await callback.message.edit_text(
                 "У вас нет webhooks. Создайте первый!",
                 reply_markup=types.InlineKeyboardMarkup(
@@ -39,29 +84,13 @@ async def view_webhooks_list(callback: types.CallbackQuery) -> None:
             )
             logger.debug(f"Пользователь {user_id} не имеет webhooks")
             return
-        
-        # Создать кнопки для каждого webhook
-        buttons = []
-        for webhook in webhooks_list:
-            buttons.append([
-                types.InlineKeyboardButton(
-                    text=f"📌 {webhook['webhook_name']}",
-                    callback_data=f"webhook_{webhook['webhook_name']}"
-                )
-            ])
-        
-        # Добавить кнопку возврата
-        buttons.append([
-            types.InlineKeyboardButton(text='⬅️ Назад', callback_data='main_menu')
-        ])
-        
-        keyboard = types.InlineKeyboardMarkup(inline_keyboard=buttons)
+
         await callback.message.edit_text(
-            f"Ваши webhooks ({len(webhooks_list)}):",
-            reply_markup=keyboard
+            "Ваши webhooks:",
+            reply_markup=webhooks_page_keyboard(page)
         )
         logger.info(f"Пользователь {user_id} просмотрел список webhooks")
-        
+
     except Exception as e:
         logger.error(f"Ошибка при получении списка webhooks: {e}")
         await callback.message.edit_text(
@@ -74,20 +103,56 @@ async def view_webhooks_list(callback: types.CallbackQuery) -> None:
         )
 
 
-@router.callback_query(F.data.startswith("webhook_"))
-async def view_webhook_info(callback: types.CallbackQuery) -> None:
+@router.callback_query(F.data == "view_webhooks")
+async def view_webhooks_list(callback: types.CallbackQuery) -> None:
+    """
+    Показать первую страницу списка webhooks пользователя.
+
+    Args:
+        callback: Callback query от Telegram
+    """
+    await show_webhooks_page(callback)
+
+
+@router.callback_query(WebhooksPageCallback.filter())
+async def view_webhooks_page(callback: types.CallbackQuery, callback_data: WebhooksPageCallback) -> None:
+    """
+    Показать соседнюю страницу списка webhooks.
+
+    Args:
+        callback: Callback query от Telegram
+        callback_data: Направление и id крайнего webhook текущей страницы
+    """
+    try:
+        boundary = await db.get_webhook_name(callback_data.id, callback.message.chat.id)
+    except Exception as e:
+        logger.error(f"Ошибка при переходе по страницам webhooks: {e}")
+        boundary = None
+
+    # Крайний webhook удален — показать начало списка
+    if boundary is None:
+        await show_webhooks_page(callback)
+    elif callback_data.direction == PageDirection.next:
+        await show_webhooks_page(callback, after=boundary)
+    else:
+        await show_webhooks_page(callback, before=boundary)
+
+
+@router.callback_query(WebhookCallback.filter(F.action == WebhookAction.info))
+async def view_webhook_info(callback: types.CallbackQuery, callback_data: WebhookCallback) -> None:
     """
     Показать информацию о конкретном webhook.
 
     Args:
         callback: Callback query от Telegram
+        callback_data: id webhook
     """
     try:
         await callback.answer()
-        webhook_name = callback.data.split("_", 1)[1]
-        
-        # Получить информацию о webhook
-        webhook_info =  await db.get_webhooks_info(webhook_name)
+        webhook_id = callback_data.id
+
+        # Получить информацию о webhook по первичному ключу
+        webhook_info = await db.get_webhook_card(webhook_id, callback.message.chat.id)
         
         if webhook_info is None:
             await callback.message.edit_text(
@@ -98,14 +163,14 @@ async def view_webhook_info(callback: types.CallbackQuery) -> None:
                     ]]
                 )
             )
-            logger.warning(f"Webhook '{webhook_name}' не найден")
+            logger.warning(f"Webhook {webhook_id} не найден")
             return
         
         # Создать кнопки управления
         buttons = [[
             types.InlineKeyboardButton(
                 text='🗑️ Удалить webhook', 
-                callback_data=f'webhookdelete_{webhook_name}'
+                callback_data=WebhookCallback(action=WebhookAction.delete, id=webhook_id).pack()
             )
         ], [
             types.InlineKeyboardButton(text='⬅️ Назад', callback_data='view_webhooks')
@@ -117,7 +182,7 @@ async def view_webhook_info(callback: types.CallbackQuery) -> None:
             reply_markup=keyboard,
             parse_mode='MARKDOWN'
         )
-        logger.info(f"Пользователь просмотрел информацию webhook: {webhook_name}")
+        logger.info(f"Пользователь просмотрел информацию webhook: {webhook_id}")
         
     except Exception as e:
         logger.error(f"Ошибка при получении информации о webhook: {e}")
@@ -131,22 +196,23 @@ async def view_webhook_info(callback: types.CallbackQuery) -> None:
         )
 
 
-@router.callback_query(F.data.startswith("webhookdelete_"))
-async def delete_webhook_handler(callback: types.CallbackQuery) -> None:
+@router.callback_query(WebhookCallback.filter(F.action == WebhookAction.delete))
+async def delete_webhook_handler(callback: types.CallbackQuery, callback_data: WebhookCallback) -> None:
     """
     Удалить webhook.
 
     Args:
         callback: Callback query от Telegram
+        callback_data: id webhook
     """
     try:
         await callback.answer()
-        webhook_name = callback.data.split("_", 1)[1]
-        
-        # Удалить webhook
-        success = await db.delete_webhook(webhook_name)
-        
-        if not success:
+        webhook_id = callback_data.id
+
+        # Удалить webhook по первичному ключу
+        webhook_name = await db.delete_webhook_by_id(webhook_id, callback.message.chat.id)
+
+        if webhook_name is None:
             await callback.message.edit_text(
                 "❌ Webhook не найден для удаления.",
                 reply_markup=types.InlineKeyboardMarkup(
@@ -155,7 +221,7 @@ async def delete_webhook_handler(callback: types.CallbackQuery) -> None:
                     ]]
                 )
             )
-            logger.warning(f"Webhook '{webhook_name}' не найден при удалении")
+            logger.warning(f"Webhook {webhook_id} не найден при удалении")
             return
         
         # Показать подтверждение удаления
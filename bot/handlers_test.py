@@ -23,10 +23,10 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
     from handlers.create_webhook import (
-        create_webhook_start,
-        create_webhook_name,
-        create_webhook_channel,
-        create_webhook_thread,
+        start_create_webhook,
+        process_webhook_name,
+        process_channel_id,
+        process_thread_id,
         CreateWebhookStates
     )
     from handlers.view_webhooks import (
@@ -34,11 +34,41 @@ try:
         view_webhook_info,
         delete_webhook_handler
     )
+    from keyboards.callbacks import PageDirection, WebhookAction, WebhookCallback, WebhooksPageCallback
+    import db
     handlers_available = True
 except ImportError as e:
     handlers_available = False
     CreateWebhookStates = None
 
+WEBHOOK_ID = "65f0c0ffee0123456789abcd"
+
+
+def _callback(user_id=12345):
+    """Создать мок callback query из чата пользователя."""
+    callback = AsyncMock()
+    callback.from_user.id = user_id
+    callback.message.chat.id = user_id
+    return callback
+
+
+def _message(text, user_id=12345):
+    """Создать мок сообщения пользователя."""
+    message = AsyncMock()
+    message.text = text
+    message.from_user.id = user_id
+    return message
+
+
+def _page_items(count):
+    """Webhooks страницы в том виде, как их возвращает db.get_user_webhooks_page."""
+    return [{"id": f"{i:024x}", "webhook_name": f"hook{i}"} for i in range(count)]
+
+
+def _buttons(markup):
+    """Все кнопки клавиатуры одним списком."""
+    return [button for row in markup.inline_keyboard for button in row]
+
 
 class TestCreateWebhookFSM(unittest.IsolatedAsyncioTestCase):
     """Тесты для FSM в create_webhook."""
@@ -51,153 +81,116 @@ class TestCreateWebhookFSM(unittest.IsolatedAsyncioTestCase):
         self.assertTrue(hasattr(CreateWebhookStates, 'thread_id'))
 
     @unittest.skipUnless(handlers_available, "handlers modules not available")
-    @patch('handlers.create_webhook.db')
-    async def test_create_webhook_start(self, mock_db):
+    async def test_start_create_webhook(self):
         """Тест начала процесса создания webhook."""
-        message = AsyncMock()
-        message.answer = AsyncMock()
+        callback = _callback()
         state = AsyncMock()
-        state.set_state = AsyncMock()
-
-        # Вызываем обработчик
-        await create_webhook_start(message, state)
 
-        # Проверяем что message.answer был вызван
-        message.answer.assert_called()
+        await start_create_webhook(callback, state)
 
-        # Проверяем что состояние было установлено
-        state.set_state.assert_called_once()
+        callback.answer.assert_called_once()
+        callback.message.answer.assert_called_once()
+        state.set_state.assert_called_once_with(CreateWebhookStates.name)
 
     @unittest.skipUnless(handlers_available, "handlers modules not available")
-    @patch('handlers.create_webhook.db')
-    async def test_create_webhook_name_valid(self, mock_db):
+    async def test_process_webhook_name_valid(self):
         """Тест ввода валидного имени webhook."""
-        message = AsyncMock()
-        message.text = "my_webhook"
-        message.answer = AsyncMock()
+        message = _message("  my_webhook ")
         state = AsyncMock()
-        state.set_state = AsyncMock()
 
-        await create_webhook_name(message, state)
+        await process_webhook_name(message, state)
 
-        message.answer.assert_called()
-        state.set_state.assert_called()
+        state.update_data.assert_called_once_with(name="my_webhook")
+        state.set_state.assert_called_once_with(CreateWebhookStates.channel_id)
+        message.answer.assert_called_once()
 
     @unittest.skipUnless(handlers_available, "handlers modules not available")
-    @patch('handlers.create_webhook.db')
-    async def test_create_webhook_name_invalid_empty(self, mock_db):
+    async def test_process_webhook_name_invalid_empty(self):
         """Тест ввода пустого имени webhook."""
-        message = AsyncMock()
-        message.text = ""
-        message.answer = AsyncMock()
+        message = _message("   ")
         state = AsyncMock()
 
-        # Функция должна вернуть ошибку для пустого имени
-        result = await create_webhook_name(message, state)
+        await process_webhook_name(message, state)
 
-        # Должен быть вызван message.answer с ошибкой
-        message.answer.assert_called()
+        self.assertIn("пустым", message.answer.call_args.args[0])
+        state.set_state.assert_not_called()
 
     @unittest.skipUnless(handlers_available, "handlers modules not available")
-    @patch('handlers.create_webhook.db')
-    async def test_create_webhook_name_invalid_too_long(self, mock_db):
+    async def test_process_webhook_name_invalid_too_long(self):
         """Тест ввода слишком длинного имени webhook."""
-        message = AsyncMock()
-        message.text = "x" * 1000  # Слишком длинное имя
-        message.answer = AsyncMock()
+        message = _message("x" * 1000)
         state = AsyncMock()
 
-        await create_webhook_name(message, state)
+        await process_webhook_name(message, state)
 
-        message.answer.assert_called()
+        self.assertIn("слишком длинное", message.answer.call_args.args[0])
+        state.set_state.assert_not_called()
 
     @unittest.skipUnless(handlers_available, "handlers modules not available")
-    @patch('handlers.create_webhook.db')
-    async def test_create_webhook_channel_id_valid(self, mock_db):
+    async def test_process_channel_id_valid(self):
         """Тест ввода валидного channel_id."""
-        message = AsyncMock()
-        message.text = "123456789"
-        message.answer = AsyncMock()
+        message = _message("-100123456789")
         state = AsyncMock()
-        state.set_state = AsyncMock()
 
-        await create_webhook_channel(message, state)
+        await process_channel_id(message, state)
 
-        message.answer.assert_called()
-        state.set_state.assert_called()
+        state.update_data.assert_called_once_with(channel_id=-100123456789, user_id=12345)
+        state.set_state.assert_called_once_with(CreateWebhookStates.thread_id)
 
     @unittest.skipUnless(handlers_available, "handlers modules not available")
-    @patch('handlers.create_webhook.db')
-    async def test_create_webhook_channel_id_invalid(self, mock_db):
+    async def test_process_channel_id_invalid(self):
         """Тест ввода невалидного channel_id."""
-        message = AsyncMock()
-        message.text = "not_a_number"
-        message.answer = AsyncMock()
-        state = AsyncMock()
-
-        await create_webhook_channel(message, state)
-
-        message.answer.assert_called()
-
-    @unittest.skipUnless(handlers_available, "handlers modules not available")
-    @patch('handlers.create_webhook.db')
-    async def test_create_webhook_channel_id_zero(self, mock_db):
-        """Тест ввода channel_id = 0."""
-        message = AsyncMock()
-        message.text = "0"
-        message.answer = AsyncMock()
+        message = _message("not_a_number")
         state = AsyncMock()
 
-        await create_webhook_channel(message, state)
+        await process_channel_id(message, state)
 
-        message.answer.assert_called()
+        self.assertIn("числом", message.answer.call_args.args[0])
+        state.set_state.assert_not_called()
 
     @unittest.skipUnless(handlers_available, "handlers modules not available")
     @patch('handlers.create_webhook.db')
-    async def test_create_webhook_thread_id_valid(self, mock_db):
-        """Тест ввода валидного thread_id."""
-        message = AsyncMock()
-        message.text = "42"
-        message.answer = AsyncMock()
+    async def test_process_thread_id_valid(self, mock_db):
+        """Тест ввода валидного thread_id и создания webhook."""
+        message = _message("42")
         state = AsyncMock()
-        state.get_data = AsyncMock(return_value={})
-        state.clear = AsyncMock()
+        state.get_data = AsyncMock(return_value={"name": "hook", "user_id": 12345, "channel_id": -100})
+        mock_db.upsert_webhook = AsyncMock(return_value=WEBHOOK_ID)
 
-        mock_db.add_webhook = AsyncMock(return_value=True)
+        await process_thread_id(message, state)
 
-        await create_webhook_thread(message, state)
-
-        message.answer.assert_called()
+        mock_db.upsert_webhook.assert_called_once_with(
+            name="hook", author_id=12345, channel_id=-100, thread_id="42"
+        )
+        self.assertIn(f"/github-webhook/{WEBHOOK_ID}", message.answer.call_args.args[0])
+        state.clear.assert_called_once()
 
     @unittest.skipUnless(handlers_available, "handlers modules not available")
     @patch('handlers.create_webhook.db')
-    async def test_create_webhook_thread_id_zero(self, mock_db):
-        """Тест ввода thread_id = 0."""
-        message = AsyncMock()
-        message.text = "0"
-        message.answer = AsyncMock()
+    async def test_process_thread_id_none(self, mock_db):
+        """Тест создания webhook без ветки форума."""
+        message = _message("None")
         state = AsyncMock()
-        state.get_data = AsyncMock(return_value={})
-        state.clear = AsyncMock()
-
-        mock_db.add_webhook = AsyncMock(return_value=True)
+        state.get_data = AsyncMock(return_value={"name": "hook", "user_id": 12345, "channel_id": -100})
+        mock_db.upsert_webhook = AsyncMock(return_value=WEBHOOK_ID)
 
-        await create_webhook_thread(message, state)
+        await process_thread_id(message, state)
 
-        message.answer.assert_called()
+        self.assertEqual(mock_db.upsert_webhook.call_args.kwargs["thread_id"], "None")
 
     @unittest.skipUnless(handlers_available, "handlers modules not available")
     @patch('handlers.create_webhook.db')
-    async def test_create_webhook_thread_id_invalid(self, mock_db):
+    async def test_process_thread_id_invalid(self, mock_db):
         """Тест ввода невалидного thread_id."""
-        message = AsyncMock()
-        message.text = "invalid_thread"
-        message.answer = AsyncMock()
+        message = _message("invalid_thread")
         state = AsyncMock()
+        mock_db.upsert_webhook = AsyncMock()
 
-        await create_webhook_thread(message, state)
+        await process_thread_id(message, state)
 
-        message.answer.assert_called()
+        message.answer.assert_called_once()
+        mock_db.upsert_webhook.assert_not_called()
+        state.clear.assert_not_called()
 
 
 class TestViewWebhooks(unittest.IsolatedAsyncioTestCase):
@@ -207,171 +200,122 @@ class TestViewWebhooks(unittest.IsolatedAsyncioTestCase):
     @patch('handlers.view_webhooks.db')
     async def test_view_webhooks_list_empty(self, mock_db):
         """Тест просмотра пустого списка webhooks."""
-        message = AsyncMock()
-        message.from_user.id = 12345
-        message.answer = AsyncMock()
-        mock_db.get_user_webhooks = AsyncMock(return_value=[])
+        callback = _callback()
+        mock_db.get_user_webhooks_page = AsyncMock(return_value=db.WebhooksPage([], False, False))
 
-        await view_webhooks_list(message)
+        await view_webhooks_list(callback)
 
-        message.answer.assert_called()
+        self.assertIn("нет webhooks", callback.message.edit_text.call_args.args[0])
 
     @unittest.skipUnless(handlers_available, "handlers modules not available")
     @patch('handlers.view_webhooks.db')
     async def test_view_webhooks_list_with_items(self, mock_db):
-        """Тест просмотра списка webhooks с элементами."""
-        message = AsyncMock()
-        message.from_user.id = 12345
-        message.answer = AsyncMock()
-        mock_db.get_user_webhooks = AsyncMock(
-            return_value=[
-                {"webhook_name": "hook1", "url": "https://example.com/1"},
-                {"webhook_name": "hook2", "url": "https://example.com/2"},
-            ]
+        """Тест что кнопки webhooks передают их id."""
+        callback = _callback()
+        items = _page_items(2)
+        mock_db.get_user_webhooks_page = AsyncMock(return_value=db.WebhooksPage(items, False, False))
+
+        await view_webhooks_list(callback)
+
+        mock_db.get_user_webhooks_page.assert_called_once_with(12345, after=None, before=None)
+        buttons = _buttons(callback.message.edit_text.call_args.kwargs["reply_markup"])
+        self.assertEqual(
+            [button.callback_data for button in buttons[:2]],
+            [WebhookCallback(action=WebhookAction.info, id=item["id"]).pack() for item in items],
         )
 
-        await view_webhooks_list(message)
-
-        message.answer.assert_called()
-
     @unittest.skipUnless(handlers_available, "handlers modules not available")
     @patch('handlers.view_webhooks.db')
     async def test_view_webhook_info(self, mock_db):
         """Тест просмотра информации о webhook."""
-        message = AsyncMock()
-        message.answer = AsyncMock()
-        callback_query = AsyncMock()
-        callback_query.data = "webhook_info:hook1"
-        callback_query.message.edit_text = AsyncMock()
-        mock_db.get_webhook_info = AsyncMock(
-            return_value={
-                "webhook_name": "hook1",
-                "url": "https://example.com/hook1",
-                "channel_id": 123,
-                "thread_id": 0
-            }
-        )
+        callback = _callback()
+        mock_db.get_webhook_card = AsyncMock(return_value="*hook1*")
 
-        await view_webhook_info(callback_query)
+        await view_webhook_info(callback, WebhookCallback(action=WebhookAction.info, id=WEBHOOK_ID))
 
-        callback_query.message.edit_text.assert_called()
+        mock_db.get_webhook_card.assert_called_once_with(WEBHOOK_ID, 12345)
+        self.assertEqual(callback.message.edit_text.call_args.args[0], "*hook1*")
+        buttons = _buttons(callback.message.edit_text.call_args.kwargs["reply_markup"])
+        self.assertEqual(
+            buttons[0].callback_data, WebhookCallback(action=WebhookAction.delete, id=WEBHOOK_ID).pack()
+        )
 
     @unittest.skipUnless(handlers_available, "handlers modules not available")
     @patch('handlers.view_webhooks.db')
     async def test_view_webhook_info_not_found(self, mock_db):
         """Тест просмотра несуществующего webhook."""
-        message = AsyncMock()
-        callback_query = AsyncMock()
-        callback_query.data = "webhook_info:nonexistent"
-        callback_query.message.edit_text = AsyncMock()
-        mock_db.get_webhook_info = AsyncMock(return_value=None)
+        callback = _callback()
+        mock_db.get_webhook_card = AsyncMock(return_value=None)
 
-        await view_webhook_info(callback_query)
+        await view_webhook_info(callback, WebhookCallback(action=WebhookAction.info, id=WEBHOOK_ID))
 
-        callback_query.message.edit_text.assert_called()
+        self.assertIn("не найден", callback.message.edit_text.call_args.args[0])
 
     @unittest.skipUnless(handlers_available, "handlers modules not available")
     @patch('handlers.view_webhooks.db')
     async def test_delete_webhook(self, mock_db):
         """Тест удаления webhook."""
-        callback_query = AsyncMock()
-        callback_query.data = "delete:hook1"
-        callback_query.message.edit_text = AsyncMock()
-        mock_db.delete_webhook = AsyncMock(return_value=True)
+        callback = _callback()
+        mock_db.delete_webhook_by_id = AsyncMock(return_value="hook1")
 
-        await delete_webhook_handler(callback_query)
+        await delete_webhook_handler(callback, WebhookCallback(action=WebhookAction.delete, id=WEBHOOK_ID))
 
-        callback_query.message.edit_text.assert_called()
-        mock_db.delete_webhook.assert_called()
+        mock_db.delete_webhook_by_id.assert_called_once_with(WEBHOOK_ID, 12345)
+        self.assertIn("'hook1' успешно удален", callback.message.edit_text.call_args.args[0])
 
 
 class TestHandlersAsync(unittest.TestCase):
     """Тесты асинхронных функций обработчиков."""
 
     @unittest.skipUnless(handlers_available, "handlers modules not available")
-    def test_create_webhook_start_async(self):
-        """Тест асинхронной работы create_webhook_start."""
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        try:
-            message = AsyncMock()
-            message.answer = AsyncMock()
-            state = AsyncMock()
-            state.set_state = AsyncMock()
-
-            # create_webhook_start должна быть корутиной
-            result = create_webhook_start(message, state)
-            self.assertTrue(asyncio.iscoroutine(result))
-
-        finally:
-            loop.close()
-
-    @unittest.skipUnless(handlers_available, "handlers modules not available")
-    def test_view_webhooks_list_async(self):
-        """Тест асинхронной работы view_webhooks_list."""
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        try:
-            message = AsyncMock()
-            result = view_webhooks_list(message)
-            self.assertTrue(asyncio.iscoroutine(result))
-
-        finally:
-            loop.close()
+    def test_handlers_are_coroutines(self):
+        """Тест что обработчики — корутинные функции."""
+        for handler in (start_create_webhook, process_webhook_name, view_webhooks_list, view_webhook_info):
+            self.assertTrue(asyncio.iscoroutinefunction(handler), handler.__name__)
 
 
 class TestHandlersEdgeCases(unittest.IsolatedAsyncioTestCase):
     """Тесты граничных случаев обработчиков."""
 
     @unittest.skipUnless(handlers_available, "handlers modules not available")
-    @patch('handlers.create_webhook.db')
-    async def test_create_webhook_with_unicode_name(self, mock_db):
+    async def test_create_webhook_with_unicode_name(self):
         """Тест создания webhook с Unicode именем."""
-        message = AsyncMock()
-        message.text = "вебхук_🔗_test"
-        message.answer = AsyncMock()
+        message = _message("вебхук_🔗_test")
         state = AsyncMock()
-        state.set_state = AsyncMock()
 
-        await create_webhook_name(message, state)
+        await process_webhook_name(message, state)
 
-        message.answer.assert_called()
+        state.update_data.assert_called_once_with(name="вебхук_🔗_test")
 
     @unittest.skipUnless(handlers_available, "handlers modules not available")
-    @patch('handlers.create_webhook.db')
-    async def test_create_webhook_with_special_chars(self, mock_db):
+    async def test_create_webhook_with_special_chars(self):
         """Тест создания webhook со специальными символами в имени."""
-        message = AsyncMock()
-        message.text = "webhook-name_123-test"
-        message.answer = AsyncMock()
+        message = _message("webhook-name_123-test")
         state = AsyncMock()
-        state.set_state = AsyncMock()
 
-        await create_webhook_name(message, state)
+        await process_webhook_name(message, state)
 
-        message.answer.assert_called()
+        state.update_data.assert_called_once_with(name="webhook-name_123-test")
 
     @unittest.skipUnless(handlers_available, "handlers modules not available")
     @patch('handlers.view_webhooks.db')
     async def test_view_webhooks_with_many_items(self, mock_db):
-        """Тест просмотра большого количества webhooks."""
-        message = AsyncMock()
-        message.from_user.id = 12345
-        message.answer = AsyncMock()
+        """Тест кнопки следующей страницы, когда webhooks больше страницы."""
+        callback = _callback()
 
-        # Создаем 100 webhooks
-        webhooks = [
-            {"webhook_name": f"hook{i}", "url": f"https://example.com/{i}"}
-            for i in range(100)
-        ]
+        # Первая страница из 10 webhooks, за ней есть следующая
+        webhooks = _page_items(10)
 
-        mock_db.get_user_webhooks = AsyncMock(return_value=webhooks)
+        mock_db.get_user_webhooks_page = AsyncMock(return_value=db.WebhooksPage(webhooks, False, True))
 
-        await view_webhooks_list(message)
+        await view_webhooks_list(callback)
 
-        message.answer.assert_called()
+        buttons = _buttons(callback.message.edit_text.call_args.kwargs["reply_markup"])
+        self.assertEqual(len(buttons), 12)
+        self.assertEqual(
+            buttons[10].callback_data,
+            WebhooksPageCallback(direction=PageDirection.next, id=webhooks[-1]["id"]).pack(),
+        )
 
 
 class TestHandlersErrorHandling(unittest.IsolatedAsyncioTestCase):
@@ -381,42 +325,26 @@ class TestHandlersErrorHandling(unittest.IsolatedAsyncioTestCase):
     @patch('handlers.create_webhook.db')
     async def test_create_webhook_db_error(self, mock_db):
         """Тест обработки ошибки БД при создании webhook."""
-        message = AsyncMock()
-        message.text = "0"
-        message.answer = AsyncMock()
+        message = _message("None")
         state = AsyncMock()
-        state.get_data = AsyncMock(return_value={})
-
-        mock_db.add_webhook = AsyncMock(
-            side_effect=Exception("Database error")
-        )
+        state.get_data = AsyncMock(return_value={"name": "hook", "user_id": 12345, "channel_id": -100})
+        mock_db.upsert_webhook = AsyncMock(side_effect=Exception("Database error"))
 
-        # Функция должна обработать ошибку
-        try:
-            await create_webhook_thread(message, state)
-        except Exception:
-            pass
+        await process_thread_id(message, state)
 
-        message.answer.assert_called()
+        self.assertIn("Ошибка при создании webhook", message.answer.call_args.args[0])
+        state.clear.assert_called_once()
 
     @unittest.skipUnless(handlers_available, "handlers modules not available")
     @patch('handlers.view_webhooks.db')
     async def test_view_webhook_info_db_error(self, mock_db):
         """Тест обработки ошибки БД при получении информации."""
-        callback_query = AsyncMock()
-        callback_query.data = "webhook_info:hook1"
-        callback_query.message.edit_text = AsyncMock()
-
-        mock_db.get_webhook_info = AsyncMock(
-            side_effect=Exception("Database error")
-        )
+        callback = _callback()
+        mock_db.get_webhook_card = AsyncMock(side_effect=Exception("Database error"))
 
-        try:
-            await view_webhook_info(callback_query)
-        except Exception:
-            pass
+        await view_webhook_info(callback, WebhookCallback(action=WebhookAction.info, id=WEBHOOK_ID))
 
-        callback_query.message.edit_text.assert_called()
+        self.assertIn("Ошибка при получении информации", callback.message.edit_text.call_args.args[0])
 
 
 if __name__ == "__main__":
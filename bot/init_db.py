@@ -1,6 +1,12 @@
+import argparse
+import asyncio
 import pymongo
 import os
 import logging
+from pymongo import ASCENDING, IndexModel
+
+from storage import PostgresStorage, is_postgres_url
+from storage.mongo import TOMBSTONES_COLLECTION, TOMBSTONES_TTL_SECONDS
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -8,8 +14,23 @@ logging.basicConfig(
     format='%(filename)s:%(lineno)d #%(levelname)-8s [%(asctime)s] - %(name)s - %(message)s',
 )
 
-def init_and_create_db():
-    """Инициализирует подключение и создает структуру базы данных с обработкой ошибок."""
+# Индексы коллекции Webhooks: url ищется на каждом входящем событии,
+# (author_id, webhook_name) — в меню бота и как ключ upsert при создании,
+# updated_at — при дозагрузке новых webhooks в фильтр известных id
+WEBHOOK_INDEXES = [
+    IndexModel([('url', ASCENDING)], name='url_unique', unique=True, background=True),
+    IndexModel(
+        [('author_id', ASCENDING), ('webhook_name', ASCENDING)],
+        name='author_id_webhook_name',
+        unique=True,
+        background=True,
+    ),
+    IndexModel([('updated_at', ASCENDING)], name='updated_at', background=True),
+]
+
+
+def connect():
+    """Создает синхронный клиент MongoDB и проверяет подключение."""
     db_url = os.getenv("DB_URL")
     
     if not db_url:
@@ -30,14 +51,168 @@ def init_and_create_db():
     except Exception as e:
         logger.error(f"Неожиданная ошибка при подключении к БД: {str(e)}")
         raise
-    
+
+    return client
+
+
+def find_duplicates(coll, keys, limit=5):
+    """
+    Ищет значения ключей, встречающиеся в нескольких документах.
+
+    Args:
+        coll: Коллекция
+        keys: Поля ключа индекса
+        limit: Сколько примеров вернуть
+
+    Returns:
+        Список словарей со значениями ключей и числом документов
+    """
+    pipeline = [
+        {'$group': {'_id': {key: f'${key}' for key in keys}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}},
+        {'$limit': limit},
+    ]
+    return [{**doc['_id'], 'count': doc['count']} for doc in coll.aggregate(pipeline, allowDiskUse=True)]
+
+
+def _rebuild_index(coll_webhooks, model, info):
+    """
+    Пересоздает индекс с другим параметром unique.
+
+    Уникальность проверяется до удаления старого индекса. На время
+    пересоздания запросы обслуживает временный индекс с теми же ведущими
+    полями; если новый индекс создать не удалось, старый возвращается.
+
+    Raises:
+        RuntimeError: Если в коллекции есть документы с одинаковым ключом
+    """
+    spec = model.document
+    name = spec['name']
+    keys = list(spec['key'])
+    if spec.get('unique'):
+        duplicates = find_duplicates(coll_webhooks, keys)
+        if duplicates:
+            raise RuntimeError(
+                f"Index {name} cannot be made unique: duplicate {', '.join(keys)} values, "
+                f"e.g. {duplicates}. Remove or rename the duplicates and run init_db again"
+            )
+
+    logger.info(f"Индекс {name} пересоздается с unique={bool(spec.get('unique'))}")
+    temporary = f"{name}_rebuild"
+    coll_webhooks.create_index(list(spec['key'].items()) + [('_id', ASCENDING)], name=temporary)
+    try:
+        coll_webhooks.drop_index(name)
+        try:
+            coll_webhooks.create_indexes([model])
+        except pymongo.errors.PyMongoError:
+            logger.error(f"Не удалось создать индекс {name}, возвращается прежний")
+            coll_webhooks.create_index(list(info['key']), name=name, unique=bool(info.get('unique')))
+            raise
+    finally:
+        coll_webhooks.drop_index(temporary)
+
+
+def create_indexes(coll_webhooks):
+    """
+    Создает индексы коллекции Webhooks и проверяет, что они существуют.
+
+    Индексы строятся без блокировки коллекции, поэтому функцию можно
+    запускать на работающем сервисе. Повторный запуск ничего не меняет.
+
+    Индекс с тем же именем, но другим параметром unique пересоздается
+    (см. _rebuild_index).
+
+    Raises:
+        RuntimeError: Если индекс отсутствует, имеет другую структуру
+            или не может стать уникальным из-за повторяющихся ключей
+    """
+    existing = coll_webhooks.index_information()
+    for model in WEBHOOK_INDEXES:
+        spec = model.document
+        info = existing.get(spec['name'])
+        if info is not None and bool(info.get('unique')) != bool(spec.get('unique')):
+            _rebuild_index(coll_webhooks, model, info)
+
+    coll_webhooks.create_indexes(WEBHOOK_INDEXES)
+
+    existing = coll_webhooks.index_information()
+    for model in WEBHOOK_INDEXES:
+        spec = model.document
+        info = existing.get(spec['name'])
+        if info is None:
+            raise RuntimeError(f"Index {spec['name']} was not created")
+        if list(info['key']) != list(spec['key'].items()):
+            raise RuntimeError(f"Index {spec['name']} has unexpected keys: {info['key']}")
+        if bool(info.get('unique')) != bool(spec.get('unique')):
+            raise RuntimeError(f"Index {spec['name']} has unexpected unique option")
+        logger.info(f"Индекс {spec['name']} проверен")
+
+
+def create_tombstone_index(coll_tombstones):
+    """Создает TTL индекс коллекции удаленных url webhooks."""
+    coll_tombstones.create_index(
+        [('removed_at', ASCENDING)],
+        name='removed_at_ttl',
+        expireAfterSeconds=TOMBSTONES_TTL_SECONDS,
+        background=True,
+    )
+    logger.info("Индекс removed_at_ttl проверен")
+
+
+def index_stats(coll_webhooks):
+    """
+    Возвращает статистику использования и размер индексов коллекции.
+
+    Returns:
+        Список словарей с полями name, ops, since и size_bytes
+    """
+    sizes = {}
+    for stats in coll_webhooks.aggregate([{'$collStats': {'storageStats': {}}}]):
+        sizes.update(stats['storageStats'].get('indexSizes', {}))
+
+    result = []
+    for stats in coll_webhooks.aggregate([{'$indexStats': {}}]):
+        result.append({
+            'name': stats['name'],
+            'ops': stats['accesses']['ops'],
+            'since': stats['accesses']['since'],
+            'size_bytes': sizes.get(stats['name'], 0),
+        })
+    return result
+
+
+def init_postgres(db_url):
+    """
+    Создает таблицу webhooks в PostgreSQL и переводит ее индексы.
+
+    Raises:
+        RuntimeError: Если индекс не может стать уникальным из-за повторяющихся ключей
+    """
+    try:
+        asyncio.run(PostgresStorage(db_url).migrate())
+        logger.info('База данных успешно создана и инициализирована')
+        print('База успешно создана')
+    except Exception as e:
+        logger.error(f"Ошибка при создании структуры БД: {str(e)}")
+        raise
+
+
+def init_and_create_db():
+    """Инициализирует подключение и создает структуру базы данных с обработкой ошибок."""
+    db_url = os.getenv("DB_URL")
+    if db_url and is_postgres_url(db_url):
+        init_postgres(db_url)
+        return
+
+    client = connect()
+
     try:
         git_db = client["GitHook-db"]
         coll_webhooks = git_db["Webhooks"]
-        
+
         # Инициализация структуры БД
-        coll_webhooks.insert_one({'field': 'value'})
-        coll_webhooks.delete_one({'field': 'value'})
+        create_indexes(coll_webhooks)
+        create_tombstone_index(git_db[TOMBSTONES_COLLECTION])
         logger.info('База данных успешно создана и инициализирована')
         print('База успешно создана')
     except Exception as e:
@@ -46,9 +221,29 @@ def init_and_create_db():
     finally:
         client.close()
 
+def print_index_stats():
+    """Выводит статистику индексов коллекции Webhooks."""
+    client = connect()
+    try:
+        for stats in index_stats(client["GitHook-db"]["Webhooks"]):
+            print(
+                f"{stats['name']}: {stats['ops']} обращений с {stats['since']:%Y-%m-%d %H:%M}, "
+                f"{stats['size_bytes']} байт"
+            )
+    finally:
+        client.close()
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Инициализация базы данных GitHook")
+    parser.add_argument("--stats", action="store_true", help="показать использование и размер индексов")
+    args = parser.parse_args()
+
     try:
-        init_and_create_db()
+        if args.stats:
+            print_index_stats()
+        else:
+            init_and_create_db()
     except (ValueError, ConnectionError) as e:
         logger.critical(f"Критическая ошибка инициализации БД: {str(e)}")
         exit(1)
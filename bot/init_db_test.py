@@ -0,0 +1,96 @@
+"""
+Тесты для создания индексов коллекции Webhooks.
+
+Тестирует пересоздание индекса author_id_webhook_name уникальным:
+проверку повторяющихся ключей, порядок операций и возврат прежнего
+индекса при ошибке.
+"""
+import unittest
+from unittest.mock import MagicMock, call
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pymongo.errors import DuplicateKeyError
+from init_db import WEBHOOK_INDEXES, create_indexes
+
+OLD_KEY = [('author_id', 1), ('webhook_name', 1)]
+
+
+def _index_information(unique):
+    """Описание индексов коллекции; author_id_webhook_name с заданным unique."""
+    info = {'_id_': {'key': [('_id', 1)]}}
+    for model in WEBHOOK_INDEXES:
+        spec = model.document
+        info[spec['name']] = {'key': list(spec['key'].items()), 'unique': spec.get('unique', False)}
+    info['author_id_webhook_name']['unique'] = unique
+    return info
+
+
+def _collection(duplicates=(), unique_after=True):
+    """Создать мок коллекции с неуникальным индексом author_id_webhook_name."""
+    coll = MagicMock()
+    coll.index_information = MagicMock(side_effect=[_index_information(False), _index_information(unique_after)])
+    coll.aggregate = MagicMock(return_value=[
+        {'_id': {'author_id': author_id, 'webhook_name': name}, 'count': 2} for author_id, name in duplicates
+    ])
+    return coll
+
+
+class TestCreateIndexes(unittest.TestCase):
+    """Тесты для create_indexes."""
+
+    def test_duplicates_abort_before_drop(self):
+        """Тест что при повторяющихся ключах индекс не удаляется."""
+        coll = _collection(duplicates=[(1, "ci")])
+
+        with self.assertRaises(RuntimeError) as ctx:
+            create_indexes(coll)
+
+        self.assertIn("'webhook_name': 'ci'", str(ctx.exception))
+        coll.drop_index.assert_not_called()
+        coll.create_index.assert_not_called()
+        coll.create_indexes.assert_not_called()
+
+    def test_rebuild_keeps_temporary_index(self):
+        """Тест что на время пересоздания запросы обслуживает временный индекс."""
+        coll = _collection()
+
+        create_indexes(coll)
+
+        operations = [c for c in coll.mock_calls if c[0] in ('create_index', 'drop_index')]
+        self.assertEqual(operations, [
+            call.create_index(OLD_KEY + [('_id', 1)], name='author_id_webhook_name_rebuild'),
+            call.drop_index('author_id_webhook_name'),
+            call.drop_index('author_id_webhook_name_rebuild'),
+        ])
+        rebuilt = coll.create_indexes.call_args_list[0].args[0]
+        self.assertEqual([model.document['name'] for model in rebuilt], ['author_id_webhook_name'])
+
+    def test_failed_create_restores_old_index(self):
+        """Тест возврата прежнего индекса, если уникальный создать не удалось."""
+        coll = _collection()
+        coll.create_indexes = MagicMock(side_effect=DuplicateKeyError("E11000"))
+
+        with self.assertRaises(DuplicateKeyError):
+            create_indexes(coll)
+
+        coll.create_index.assert_called_with(OLD_KEY, name='author_id_webhook_name', unique=False)
+        coll.drop_index.assert_called_with('author_id_webhook_name_rebuild')
+
+    def test_unique_index_left_alone(self):
+        """Тест что уже уникальный индекс не пересоздается."""
+        coll = MagicMock()
+        coll.index_information = MagicMock(return_value=_index_information(True))
+
+        create_indexes(coll)
+
+        coll.aggregate.assert_not_called()
+        coll.drop_index.assert_not_called()
+        coll.create_indexes.assert_called_once_with(WEBHOOK_INDEXES)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+"""
+Данные callback кнопок меню webhooks.
+
+Telegram ограничивает callback_data 64 байтами, поэтому кнопки передают
+не название webhook (до 100 символов), а его первичный ключ в БД:
+"wh:info:65f0c0ffee0123456789abcd" — 32 байта.
+"""
+from enum import Enum
+
+from aiogram.filters.callback_data import CallbackData
+
+
+class WebhookAction(str, Enum):
+    """Действие над webhook."""
+    info = "info"
+    delete = "delete"
+
+
+class WebhookCallback(CallbackData, prefix="wh"):
+    """Кнопка конкретного webhook пользователя."""
+    action: WebhookAction
+    id: str
+
+
+class PageDirection(str, Enum):
+    """Направление перехода по страницам списка."""
+    next = "next"
+    prev = "prev"
+
+
+class WebhooksPageCallback(CallbackData, prefix="whp"):
+    """Кнопка перехода на соседнюю страницу списка webhooks."""
+    direction: PageDirection
+    id: str
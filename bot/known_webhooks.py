@@ -0,0 +1,257 @@
+"""
+Отсев запросов к неизвестным webhooks.
+
+Фильтр Блума по всем id webhooks и кэш недавних промахов позволяют
+отвечать 404 на запросы к удаленным или случайным id без поиска в БД.
+
+Webhooks создает другой процесс (бот), поэтому промах фильтра проверяется
+дозагрузкой записанных после последнего обновления документов: отказ
+дается, только если фильтр догнал записи, сделанные раньше чем за
+catch_up_interval до прихода запроса. Одновременные промахи ждут одну
+дозагрузку, дозагрузки идут не чаще раза в catch_up_interval, а отклоненный
+id попадает в негативный кэш, так что поток случайных id дает не больше
+одного небольшого запроса к БД за интервал.
+
+Удаленные и замененные url другие процессы узнают из коллекции
+WebhookTombstones при периодической дозагрузке.
+"""
+import asyncio
+import datetime
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+from bson import ObjectId
+
+from bloom import BloomFilter
+from cache import TTLCache
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Время записи (updated_at) ставят процессы приложения: часы разных
+# процессов и порядок коммитов расходятся, поэтому дозагрузка берет запас
+WRITE_TIME_MARGIN = datetime.timedelta(minutes=1)
+
+
+class KnownWebhooks:
+    """Фильтр Блума известных id и негативный кэш неизвестных."""
+
+    PROJECTION = {"url": 1, "updated_at": 1}
+
+    def __init__(
+        self,
+        capacity: int = 1000000,
+        error_rate: float = 0.01,
+        negative_ttl: float = 30.0,
+        negative_size: int = 100000,
+        catch_up_interval: float = 1.0,
+        on_removed: Optional[Callable[[str], None]] = None,
+    ):
+        """
+        Инициализация фильтра.
+
+        Args:
+            capacity: Ожидаемое количество webhooks
+            error_rate: Доля ложноположительных ответов фильтра Блума
+            negative_ttl: Время жизни записи негативного кэша в секундах
+            negative_size: Максимальный размер негативного кэша
+            catch_up_interval: Насколько старой может быть дозагрузка при
+                промахе фильтра, с; webhook, созданный в другом процессе
+                позже, может получить отказ до следующей дозагрузки
+            on_removed: Вызывается с url, удаленным или замененным в другом процессе
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bloom: Optional[BloomFilter] = None
+        self.negative = TTLCache(maxsize=negative_size, ttl=negative_ttl)
+        self.catch_up_interval = catch_up_interval
+        self.on_removed = on_removed
+        self._last_seen: Optional[datetime.datetime] = None
+        self._last_removed: Optional[datetime.datetime] = None
+        self._pending: Optional[list] = None
+        # Время начала последней завершенной дозагрузки (time.monotonic)
+        self._refreshed_from = float("-inf")
+        self._catch_ups = SingleFlight()
+        self.bloom_rejected = 0
+        self.bloom_caught_up = 0
+        self.negative_hits = 0
+        self.removed = 0
+
+    @property
+    def ready(self) -> bool:
+        """Построен ли фильтр Блума."""
+        return self.bloom is not None
+
+    async def is_unknown(self, url: str, get_collection: Optional[Callable[[], Any]] = None) -> bool:
+        """
+        Проверить, что webhook точно не существует.
+
+        При промахе фильтра Блума сначала дозагружаются webhooks, записанные
+        после последнего обновления фильтра, если оно было раньше чем за
+        catch_up_interval. Отклоненный id запоминается в негативном кэше.
+
+        Args:
+            url: Id webhook
+            get_collection: Функция, возвращающая коллекцию Webhooks;
+                без нее промах фильтра принимается как есть
+
+        Returns:
+            True, если запрос можно отклонить без поиска webhook в БД
+
+        Raises:
+            PyMongoError: Дозагрузка не удалась
+        """
+        if url in self.negative:
+            self.negative_hits += 1
+            return True
+        if self.bloom is None or url in self.bloom:
+            return False
+        if get_collection is not None:
+            await self._catch_up(get_collection(), time.monotonic() - self.catch_up_interval)
+            if url in self.bloom:
+                self.bloom_caught_up += 1
+                return False
+            self.mark_missing(url)
+        self.bloom_rejected += 1
+        return True
+
+    async def _catch_up(self, coll_webhooks, since: float) -> None:
+        """Дождаться дозагрузки, начатой не раньше since."""
+        while self._refreshed_from < since:
+            await self._catch_ups.do("refresh", lambda: self.refresh(coll_webhooks))
+
+    def add(self, url: str) -> None:
+        """Отметить webhook как существующий."""
+        self.negative.invalidate(url)
+        if self.bloom is not None:
+            self.bloom.add(url)
+        if self._pending is not None:
+            self._pending.append(url)
+
+    def mark_missing(self, url: str) -> None:
+        """Запомнить, что webhook не найден в БД."""
+        self.negative.set(url, True)
+
+    def remove(self, url: str) -> None:
+        """Отметить webhook, удаленный или замененный в другом процессе."""
+        self.removed += 1
+        self.mark_missing(url)
+        if self.on_removed is not None:
+            self.on_removed(url)
+
+    def _track(self, doc: Dict[str, Any]) -> None:
+        """Запомнить время записи самого нового увиденного документа."""
+        written = doc.get("updated_at")
+        if not isinstance(written, datetime.datetime):
+            # Документы, записанные до появления updated_at
+            if not isinstance(doc.get("_id"), ObjectId):
+                return
+            written = doc["_id"].generation_time
+        if written.tzinfo is None:
+            written = written.replace(tzinfo=datetime.timezone.utc)
+        if self._last_seen is None or written > self._last_seen:
+            self._last_seen = written
+
+    async def rebuild(self, coll_webhooks) -> None:
+        """Перестроить фильтр Блума по всей коллекции."""
+        started = time.monotonic()
+        count = await coll_webhooks.estimated_document_count()
+        bloom = BloomFilter(max(self.capacity, count * 2), self.error_rate)
+        self._pending = []
+        try:
+            async for doc in coll_webhooks.find({}, self.PROJECTION):
+                if "url" in doc:
+                    bloom.add(doc["url"])
+                self._track(doc)
+            # Webhooks, добавленные в этом процессе во время перестройки
+            for url in self._pending:
+                bloom.add(url)
+        finally:
+            self._pending = None
+
+        self.bloom = bloom
+        self._refreshed_from = max(self._refreshed_from, started)
+        logger.info(f"Фильтр известных webhooks построен: {bloom.count} id, {bloom.nbytes()} байт")
+
+    async def refresh(self, coll_webhooks) -> None:
+        """
+        Добавить в фильтр webhooks, записанные после последнего обновления.
+
+        Выбираются документы по updated_at, поэтому в фильтр попадают и
+        новые url webhooks, замененных с сохранением _id.
+        """
+        if self.bloom is None:
+            await self.rebuild(coll_webhooks)
+            return
+
+        started = time.monotonic()
+        query = {}
+        if self._last_seen is not None:
+            query = {"updated_at": {"$gt": self._last_seen - WRITE_TIME_MARGIN}}
+        async for doc in coll_webhooks.find(query, self.PROJECTION):
+            if "url" in doc:
+                self.add(doc["url"])
+            self._track(doc)
+        self._refreshed_from = max(self._refreshed_from, started)
+
+    async def refresh_removed(self, coll_tombstones) -> None:
+        """Применить url, удаленные или замененные после последней проверки."""
+        since = self._last_removed
+        if since is None:
+            # Кэши процесса заполнялись не раньше его запуска
+            since = datetime.datetime.now(datetime.timezone.utc)
+        async for doc in coll_tombstones.find({"removed_at": {"$gt": since - WRITE_TIME_MARGIN}}):
+            self.remove(doc["url"])
+            removed_at = doc["removed_at"]
+            if removed_at.tzinfo is None:
+                removed_at = removed_at.replace(tzinfo=datetime.timezone.utc)
+            since = max(since, removed_at)
+        self._last_removed = since
+
+    async def run_refresher(
+        self,
+        coll_webhooks,
+        refresh_interval: float,
+        rebuild_interval: float,
+        coll_tombstones=None,
+    ) -> None:
+        """
+        Периодически дозагружать новые и удаленные id и перестраивать фильтр.
+
+        Полная перестройка убирает из фильтра удаленные webhooks.
+
+        Args:
+            coll_webhooks: Коллекция Webhooks
+            refresh_interval: Период дозагрузки новых id в секундах
+            rebuild_interval: Период полной перестройки в секундах
+            coll_tombstones: Коллекция удаленных url (WebhookTombstones)
+        """
+        loop = asyncio.get_running_loop()
+        rebuilt_at = loop.time()
+        while True:
+            try:
+                if loop.time() - rebuilt_at >= rebuild_interval:
+                    await self.rebuild(coll_webhooks)
+                    rebuilt_at = loop.time()
+                else:
+                    await self.refresh(coll_webhooks)
+                if coll_tombstones is not None:
+                    await self.refresh_removed(coll_tombstones)
+            except Exception as e:
+                logger.warning(f"Не удалось обновить фильтр известных webhooks: {e}")
+            await asyncio.sleep(refresh_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        """Вернуть счетчики отсеянного трафика."""
+        return {
+            "bloom_ready": self.ready,
+            "bloom_added": self.bloom.count if self.bloom else 0,
+            "bloom_bytes": self.bloom.nbytes() if self.bloom else 0,
+            "bloom_rejected": self.bloom_rejected,
+            "bloom_caught_up": self.bloom_caught_up,
+            "catch_up_refreshes": self._catch_ups.calls,
+            "negative_hits": self.negative_hits,
+            "removed": self.removed,
+            "negative_size": len(self.negative),
+        }
@@ -0,0 +1,198 @@
+"""
+Тесты для отсева запросов к неизвестным webhooks.
+
+Тестирует фильтр Блума, негативный кэш и дозагрузку новых id.
+"""
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+import sys
+import os
+import asyncio
+import datetime
+import random
+from string import ascii_letters
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bson import ObjectId
+from bloom import BloomFilter
+from known_webhooks import KnownWebhooks
+from routing_snapshot_test import AsyncCursor
+from storage import MongoStorage
+
+
+class FakeWebhooks:
+    """Коллекция Webhooks в памяти: только запросы, нужные хранилищу и фильтру."""
+
+    def __init__(self):
+        self.docs = []
+        self.database = {"WebhookTombstones": MagicMock(insert_one=AsyncMock())}
+
+    async def insert_one(self, doc):
+        self.docs.append({"_id": ObjectId(), **doc})
+
+    async def find_one_and_update(self, query, update, projection=None, upsert=False, return_document=None):
+        for doc in self.docs:
+            if all(doc.get(k) == v for k, v in query.items()):
+                before = {"url": doc["url"]}
+                doc.update(update["$set"])
+                return before
+        await self.insert_one({**query, **update["$set"]})
+        return None
+
+    async def estimated_document_count(self):
+        return len(self.docs)
+
+    def find(self, query, projection=None):
+        since = query.get("updated_at", {}).get("$gt")
+        return AsyncCursor([
+            dict(doc) for doc in self.docs
+            if since is None or doc["updated_at"] > since
+        ])
+
+
+class TestBloomFilter(unittest.TestCase):
+    """Тесты для BloomFilter."""
+
+    def test_no_false_negatives(self):
+        """Тест что добавленные элементы всегда найдены."""
+        bloom = BloomFilter(1000, 0.01)
+        keys = [f"hook_{i}" for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+
+        self.assertTrue(all(key in bloom for key in keys))
+
+    def test_false_positive_rate(self):
+        """Тест доли ложноположительных ответов."""
+        rng = random.Random(3)
+        bloom = BloomFilter(5000, 0.01)
+        for _ in range(5000):
+            bloom.add(''.join(rng.choices(ascii_letters, k=20)))
+
+        probes = [''.join(rng.choices(ascii_letters, k=21)) for _ in range(10000)]
+        false_positives = sum(probe in bloom for probe in probes)
+
+        self.assertLess(false_positives / len(probes), 0.03)
+
+
+class TestKnownWebhooks(unittest.IsolatedAsyncioTestCase):
+    """Тесты для KnownWebhooks."""
+
+    def setUp(self):
+        """Подготовка коллекции."""
+        self.coll = MagicMock()
+        self.coll.estimated_document_count = AsyncMock(return_value=2)
+        self.coll.find = MagicMock(return_value=AsyncCursor([
+            {"_id": ObjectId(), "url": "hook1"},
+            {"_id": ObjectId(), "url": "hook2"},
+        ]))
+        self.known = KnownWebhooks(capacity=100)
+
+    async def test_passes_everything_before_rebuild(self):
+        """Тест что до построения фильтра ничего не отсеивается."""
+        self.assertFalse(await self.known.is_unknown("anything"))
+
+    async def test_rejects_unknown_after_rebuild(self):
+        """Тест отсева неизвестных id после построения фильтра."""
+        await self.known.rebuild(self.coll)
+
+        self.assertFalse(await self.known.is_unknown("hook1"))
+        self.assertTrue(await self.known.is_unknown("random_scanner_id"))
+        self.assertEqual(self.known.stats()["bloom_rejected"], 1)
+
+    async def test_miss_catches_up_before_rejecting(self):
+        """Тест что промах фильтра проверяется дозагрузкой, общей для одновременных промахов."""
+        self.known = KnownWebhooks(capacity=100, catch_up_interval=0)
+        await self.known.rebuild(self.coll)
+        self.coll.find = MagicMock(side_effect=lambda *args: AsyncCursor([
+            {"_id": ObjectId(), "url": "created_elsewhere"},
+        ]))
+
+        results = await asyncio.gather(
+            self.known.is_unknown("created_elsewhere", lambda: self.coll),
+            self.known.is_unknown("random_scanner_id", lambda: self.coll),
+            self.known.is_unknown("other_scanner_id", lambda: self.coll),
+        )
+
+        self.assertEqual(results, [False, True, True])
+        self.assertEqual(self.coll.find.call_count, 1)
+        self.assertEqual(self.known.stats()["bloom_caught_up"], 1)
+        self.assertEqual(self.known.stats()["bloom_rejected"], 2)
+
+    async def test_catch_up_rate_limited(self):
+        """Тест что повторные промахи не дозагружают чаще интервала и попадают в негативный кэш."""
+        self.known = KnownWebhooks(capacity=100, catch_up_interval=0)
+        await self.known.rebuild(self.coll)
+        self.coll.find = MagicMock(side_effect=lambda *args: AsyncCursor([]))
+        self.assertTrue(await self.known.is_unknown("random_scanner_id", lambda: self.coll))
+        self.assertEqual(self.coll.find.call_count, 1)
+
+        self.known.catch_up_interval = 60
+        self.assertTrue(await self.known.is_unknown("other_scanner_id", lambda: self.coll))
+        self.assertTrue(await self.known.is_unknown("random_scanner_id", lambda: self.coll))
+
+        self.assertEqual(self.coll.find.call_count, 1)
+        self.assertEqual(self.known.stats()["negative_hits"], 1)
+        self.assertEqual(self.known.stats()["negative_size"], 2)
+
+    async def test_removed_urls(self):
+        """Тест применения url, удаленных в другом процессе."""
+        removed = []
+        known = KnownWebhooks(capacity=100, on_removed=removed.append)
+        tombstones = MagicMock()
+        tombstones.find = MagicMock(return_value=AsyncCursor([
+            {"url": "hook1", "removed_at": datetime.datetime.now(datetime.timezone.utc)},
+        ]))
+
+        await known.refresh_removed(tombstones)
+
+        self.assertEqual(removed, ["hook1"])
+        self.assertTrue(await known.is_unknown("hook1"))
+        self.assertIn("$gt", tombstones.find.call_args.args[0]["removed_at"])
+
+    async def test_negative_cache(self):
+        """Тест негативного кэша и его сброса при добавлении."""
+        self.known.mark_missing("deleted")
+
+        self.assertTrue(await self.known.is_unknown("deleted"))
+        self.known.add("deleted")
+        self.assertFalse(await self.known.is_unknown("deleted"))
+        self.assertEqual(self.known.negative_hits, 1)
+
+    async def test_refresh_adds_new_ids(self):
+        """Тест дозагрузки webhooks, созданных другими процессами."""
+        await self.known.rebuild(self.coll)
+        self.coll.find = MagicMock(return_value=AsyncCursor([
+            {"_id": ObjectId(), "url": "hook3"},
+        ]))
+
+        await self.known.refresh(self.coll)
+
+        self.assertFalse(await self.known.is_unknown("hook3"))
+        query = self.coll.find.call_args.args[0]
+        self.assertIn("$gt", query["updated_at"])
+
+    async def test_refresh_sees_replaced_webhook(self):
+        """Тест что новый url webhook, замененного в другом процессе, попадает в фильтр."""
+        coll = FakeWebhooks()
+        storage = MongoStorage(lambda: coll)
+        await storage.add("ci", "old_url", 1, -100, None)
+        # Webhook создан час назад
+        created = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=1)
+        coll.docs[0].update(_id=ObjectId.from_datetime(created), updated_at=created)
+        other_process = KnownWebhooks(capacity=100)
+        await other_process.rebuild(coll)
+
+        await storage.upsert("ci", "new_url", 1, -100, None)
+        self.assertEqual(len(coll.docs), 1)
+        self.assertTrue(await other_process.is_unknown("new_url"))
+
+        await other_process.refresh(coll)
+
+        self.assertFalse(await other_process.is_unknown("new_url"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,15 +7,23 @@ Telegram Bot для управления GitHub webhooks.
 import asyncio
 import logging
 import os
-from typing import Optional
+import time
+from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher, types
 from aiogram.filters import CommandStart, Command
 from aiogram.fsm.context import FSMContext
 from aiogram import F
-from handlers import create_webhook, view_webhooks
+from handlers import create_webhook, export_data, view_webhooks
 from keyboards import menu
 from grpc_server import start_grpc_server
+from coalesce import Coalescer
+from rate_limit import OutboundScheduler
+from outbox import Outbox
+from retry import RetryEngine, is_transient
+from sender_pool import OrderedSender
+import db
+import metrics
 
 load_dotenv()
 # Конфигурация логирования
@@ -33,6 +41,54 @@ if not TOKEN:
 bot = Bot(token=TOKEN)
 dp = Dispatcher()
 
+# Лимиты отправки Telegram: общий поток и поток в один чат, на весь бот.
+# С одним токеном отправляют несколько процессов (бот и Quart приложение,
+# см. Dockerfile), а лимиты считаются в каждом отдельно, поэтому каждому
+# достается доля OUTBOUND_PROCESSES
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+OUTBOUND_GLOBAL_BURST = float(os.getenv("OUTBOUND_GLOBAL_BURST", "10"))
+OUTBOUND_GROUP_RATE_PER_MIN = float(os.getenv("OUTBOUND_GROUP_RATE_PER_MIN", "20"))
+OUTBOUND_PRIVATE_RATE = float(os.getenv("OUTBOUND_PRIVATE_RATE", "1"))
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", "3"))
+OUTBOUND_PROCESSES = max(1, int(os.getenv("OUTBOUND_PROCESSES", "2")))
+scheduler = OutboundScheduler(
+    global_rate=OUTBOUND_GLOBAL_RATE / OUTBOUND_PROCESSES,
+    global_burst=max(1.0, OUTBOUND_GLOBAL_BURST / OUTBOUND_PROCESSES),
+    group_rate=OUTBOUND_GROUP_RATE_PER_MIN / 60 / OUTBOUND_PROCESSES,
+    private_rate=OUTBOUND_PRIVATE_RATE / OUTBOUND_PROCESSES,
+    chat_burst=max(1.0, OUTBOUND_CHAT_BURST / OUTBOUND_PROCESSES),
+)
+metrics.register("outbound", scheduler.stats)
+
+# Окно объединения сообщений в одно назначение, с; 0 — без объединения
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", "2"))
+
+# Повторы после 429 и временных ошибок: число попыток и общее время, с
+OUTBOUND_RETRY_ATTEMPTS = int(os.getenv("OUTBOUND_RETRY_ATTEMPTS", "5"))
+OUTBOUND_RETRY_MAX_ELAPSED = float(os.getenv("OUTBOUND_RETRY_MAX_ELAPSED", "300"))
+retry_engine = RetryEngine(max_attempts=OUTBOUND_RETRY_ATTEMPTS, max_elapsed=OUTBOUND_RETRY_MAX_ELAPSED)
+metrics.register("retry", retry_engine.stats)
+
+# Сколько чатов обслуживается параллельно; внутри чата порядок сохраняется
+SENDER_CONCURRENCY = int(os.getenv("SENDER_CONCURRENCY", "32"))
+sender_pool = OrderedSender(concurrency=SENDER_CONCURRENCY)
+metrics.register("sender_pool", sender_pool.stats)
+
+# Сколько ждать недоставленные сообщения при остановке, с
+OUTBOUND_DRAIN_TIMEOUT = float(os.getenv("OUTBOUND_DRAIN_TIMEOUT", "10"))
+
+# Каталог файлов очереди исходящих сообщений (по файлу на процесс); пусто — без очереди
+OUTBOX_DIR = os.getenv("OUTBOX_DIR", "outbox")
+OUTBOX_COMMIT_INTERVAL_MS = float(os.getenv("OUTBOX_COMMIT_INTERVAL_MS", "5"))
+# Сколько файлов очереди на одно имя процесса (не меньше числа воркеров)
+OUTBOX_SLOTS = int(os.getenv("OUTBOX_SLOTS", "16"))
+
+# Период записи метрик процесса бота в лог, с; 0 — не писать.
+# /metrics отдает только HTTP процесс со своими счетчиками
+METRICS_LOG_INTERVAL = float(os.getenv("METRICS_LOG_INTERVAL", "60"))
+outbox: Optional[Outbox] = None
+metrics.register("outbox", lambda: outbox.stats() if outbox is not None else {"open": False})
+
 
 @dp.message(CommandStart())
 async def cmd_start(message: types.Message, state: FSMContext) -> None:
@@ -66,45 +122,197 @@ async def get_thread_id(message: types.Message) -> None:
 
 
 async def webhook_send(
-    message: str, channel_id: int, thread_id: Optional[str] = None, web_preview: bool = False
+    message: str,
+    channel_id: int,
+    thread_id: Optional[int] = None,
+    web_preview: bool = False,
+    webhook_id: Optional[str] = None,
+    event: Optional[str] = None,
 ) -> None:
     """
-    Отправить сообщение через webhook в Telegram.
+    Поставить сообщение webhook в очередь отправки в Telegram.
+
+    Маршрут приходит уже типизированным (схема webhooks версии 1),
+    поэтому здесь поля не разбираются. Сообщение записывается в очередь
+    на диске, отправка и повторы идут в фоне, вызывающий не ждет Telegram.
+    Сообщения в одно назначение, пришедшие в течение COALESCE_WINDOW,
+    отправляются одним сообщением.
 
     Args:
         message: Текст сообщения
         channel_id: ID канала/чата
-        thread_id: ID ветки форума (опционально)
+        thread_id: ID ветки форума; None или 0 — без ветки
         web_preview: Показывать ли превью веб-страниц
+        webhook_id: id webhook для истории доставки
+        event: Тип события для истории доставки
+    """
+    payload = {
+        "message": message,
+        "channel_id": channel_id,
+        "thread_id": thread_id or None,
+        "web_preview": web_preview,
+        "webhook_id": webhook_id,
+        "event": event,
+    }
+    outbox_id = await outbox.put(payload) if outbox is not None else None
+    _enqueue(payload, outbox_id)
+
+
+def _enqueue(payload: Dict[str, Any], outbox_id: Optional[int]) -> None:
+    """Передать сообщение в окно объединения; результат отправки не ждем."""
+    delivery = {
+        "webhook_id": payload["webhook_id"],
+        "event": payload["event"],
+        "web_preview": payload["web_preview"],
+        "outbox_id": outbox_id,
+    }
+    # Ошибку отправки записывает send_merged
+    coalescer.add((payload["channel_id"], payload["thread_id"]), payload["message"], delivery)
+
+
+def _ack(deliveries: List[Dict[str, Any]]) -> None:
+    """Удалить из очереди сообщения, которые больше не нужно отправлять."""
+    ids = [delivery["outbox_id"] for delivery in deliveries if delivery.get("outbox_id") is not None]
+    if outbox is not None and ids:
+        outbox.ack(ids)
+
+
+async def _send_message(send_kwargs: Dict[str, Any]) -> None:
+    """Одна попытка отправки: дождаться разрешения планировщика и отправить."""
+    await scheduler.acquire(send_kwargs["chat_id"])
+    await bot.send_message(**send_kwargs)
+
+
+async def send_merged(destination: Tuple[int, Optional[int]], message: str, deliveries: List[Dict[str, Any]]) -> None:
+    """
+    Отправить склеенное сообщение и записать доставку каждого события.
+
+    Временные ошибки повторяются через retry_engine; длительность в
+    истории доставки включает ожидание лимитов и повторы. Доставленные и
+    неотправляемые (400, 403) сообщения удаляются из очереди; исчерпавшие
+    повторы остаются в ней до следующего запуска.
+
+    Args:
+        destination: (ID чата, ID ветки или None)
+        message: Текст сообщения
+        deliveries: Данные склеенных событий: webhook_id, event, web_preview
 
     Raises:
         Exception: Если не удалось отправить сообщение
     """
+    channel_id, thread_id = destination
+    send_kwargs = {
+        "chat_id": channel_id,
+        "text": message,
+        # У склеенного сообщения превью не показывается
+        "disable_web_page_preview": len(deliveries) > 1 or deliveries[0]["web_preview"],
+        "parse_mode": "MARKDOWN",
+    }
+    if thread_id:
+        send_kwargs["message_thread_id"] = thread_id
+
+    started = time.perf_counter()
     try:
-        send_kwargs = {
-            "chat_id": channel_id,
-            "text": message,
-            "disable_web_page_preview": web_preview,
-            "parse_mode": "MARKDOWN",
-        }
-
-        if thread_id and thread_id != "None":
-            send_kwargs["message_thread_id"] = int(thread_id)
-
-        await bot.send_message(**send_kwargs)
-        logger.info(f"Сообщение отправлено в чат {channel_id}")
+        await retry_engine.call(_send_message, send_kwargs)
+        _ack(deliveries)
+        duration_ms = (time.perf_counter() - started) * 1000
+        for delivery in deliveries:
+            db.record_delivery(
+                channel_id, "ok", duration_ms,
+                webhook_id=delivery["webhook_id"], thread_id=thread_id, event=delivery["event"],
+            )
+        logger.info(f"Сообщение отправлено в чат {channel_id} (событий: {len(deliveries)})")
     except Exception as e:
+        if not is_transient(e):
+            _ack(deliveries)
+        duration_ms = (time.perf_counter() - started) * 1000
+        for delivery in deliveries:
+            db.record_delivery(
+                channel_id, "error", duration_ms,
+                webhook_id=delivery["webhook_id"], thread_id=thread_id, event=delivery["event"], error=str(e),
+            )
         logger.error(f"Ошибка при отправке сообщения в {channel_id}: {e}")
         raise
 
 
+async def send_ordered(destination: Tuple[int, Optional[int]], message: str, deliveries: List[Dict[str, Any]]) -> None:
+    """Отправить пачку через пул: после предыдущих пачек того же чата."""
+    await sender_pool.run(destination[0], lambda: send_merged(destination, message, deliveries))
+
+
+coalescer = Coalescer(send_ordered, window=COALESCE_WINDOW)
+metrics.register("coalesce", coalescer.stats)
+
+
+async def open_outbound(name: str) -> None:
+    """
+    Открыть очередь исходящих сообщений процесса и отправить оставшиеся в ней.
+
+    Файл очереди занимается блокировкой: процессы с одним именем (воркеры
+    uvicorn) берут первый свободный из {name}.db, {name}-1.db, ..., поэтому
+    перезапущенный процесс подхватывает оставшееся от предыдущего, а один
+    файл никогда не читают двое. Если свободного файла нет, процесс работает
+    без очереди.
+
+    Args:
+        name: Имя процесса
+    """
+    global outbox
+    if not OUTBOX_DIR:
+        return
+    for slot in range(OUTBOX_SLOTS):
+        filename = f"{name}.db" if slot == 0 else f"{name}-{slot}.db"
+        candidate = Outbox(os.path.join(OUTBOX_DIR, filename), commit_interval=OUTBOX_COMMIT_INTERVAL_MS / 1000)
+        try:
+            pending = await candidate.open()
+        except BlockingIOError:
+            continue
+        outbox = candidate
+        for outbox_id, payload in pending:
+            _enqueue(payload, outbox_id)
+        return
+    logger.error(f"Все {OUTBOX_SLOTS} файлов очереди {name} заняты, сообщения не сохраняются на диск")
+
+
+async def close_outbound() -> None:
+    """
+    Отправить накопленные сообщения при остановке.
+
+    Отправки, не успевшие за OUTBOUND_DRAIN_TIMEOUT, отменяются и
+    останутся в очереди до следующего запуска. Сообщения, пришедшие
+    после закрытия очереди, отправляются без записи на диск.
+    """
+    try:
+        await asyncio.wait_for(coalescer.close(), timeout=OUTBOUND_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("При остановке отправлены не все сообщения")
+    global outbox
+    await sender_pool.close()
+    if outbox is not None:
+        closing, outbox = outbox, None
+        await closing.close()
+
+
 async def main() -> None:
     """Основная функция для запуска бота и gRPC сервера."""
+    grpc_task = None
+    metrics_task = None
     try:
         # Подготовить роутеры бота
         dp.include_router(create_webhook.router)
         dp.include_router(view_webhooks.router)
+        dp.include_router(export_data.router)
         
+        # Подключиться к БД в фоне
+        await db.connect()
+        db.start_snapshot_refresher(write=True)
+        db.start_routing_watcher()
+        db.start_delivery_history_writer()
+        db.start_webhook_stats_flusher()
+        await open_outbound("bot")
+        if METRICS_LOG_INTERVAL > 0:
+            metrics_task = asyncio.create_task(metrics.run_logger(METRICS_LOG_INTERVAL))
+
         # Удалить webhook если существует
         await bot.delete_webhook(drop_pending_updates=True)
         
@@ -119,6 +327,15 @@ async def main() -> None:
     except Exception as e:
         logger.critical(f"Критическая ошибка при запуске бота: {e}")
         raise
+    finally:
+        if grpc_task is not None:
+            # Сначала перестать принимать события, потом отправить накопленные
+            grpc_task.cancel()
+            await asyncio.gather(grpc_task, return_exceptions=True)
+        await close_outbound()
+        if metrics_task is not None:
+            metrics_task.cancel()
+        await db.close()
 
 
 if __name__ == "__main__":
@@ -9,13 +9,16 @@ from unittest.mock import AsyncMock, MagicMock, patch
 import asyncio
 import sys
 import os
+import tempfile
 from dotenv import load_dotenv
 load_dotenv()
 # Добавляем путь к модулям
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from outbox import Outbox
+
 try:
-    from main import cmd_start, get_chat_id, get_thread_id, webhook_send, main
+    from main import cmd_start, close_outbound, open_outbound, get_chat_id, get_thread_id, send_merged, webhook_send, main
     main_available = True
 except ImportError as e:
     main_available = False
@@ -159,6 +162,7 @@ class TestWebhookSend(unittest.IsolatedAsyncioTestCase):
         mock_bot.send_message = AsyncMock()
 
         await webhook_send("test message", 12345)
+        await close_outbound()
 
         mock_bot.send_message.assert_called_once()
         call_kwargs = mock_bot.send_message.call_args[1]
@@ -171,7 +175,8 @@ class TestWebhookSend(unittest.IsolatedAsyncioTestCase):
         """Тест отправки сообщения с thread_id."""
         mock_bot.send_message = AsyncMock()
 
-        await webhook_send("test", 12345, thread_id="123")
+        await webhook_send("test", 12345, thread_id=123)
+        await close_outbound()
 
         mock_bot.send_message.assert_called_once()
         call_kwargs = mock_bot.send_message.call_args[1]
@@ -184,6 +189,7 @@ class TestWebhookSend(unittest.IsolatedAsyncioTestCase):
         mock_bot.send_message = AsyncMock()
 
         await webhook_send("https://example.com", 12345, web_preview=False)
+        await close_outbound()
 
         mock_bot.send_message.assert_called_once()
         call_kwargs = mock_bot.send_message.call_args[1]
@@ -196,6 +202,7 @@ class TestWebhookSend(unittest.IsolatedAsyncioTestCase):
         mock_bot.send_message = AsyncMock()
 
         await webhook_send("", 12345)
+        await close_outbound()
 
         mock_bot.send_message.assert_called_once()
 
@@ -208,6 +215,7 @@ class TestWebhookSend(unittest.IsolatedAsyncioTestCase):
         long_message = "x" * 10000
 
         await webhook_send(long_message, 12345)
+        await close_outbound()
 
         mock_bot.send_message.assert_called_once()
         call_kwargs = mock_bot.send_message.call_args[1]
@@ -222,19 +230,21 @@ class TestWebhookSend(unittest.IsolatedAsyncioTestCase):
         unicode_message = "Сообщение с 中文 и 🚀 эмодзи"
 
         await webhook_send(unicode_message, 12345)
+        await close_outbound()
 
         mock_bot.send_message.assert_called_once()
 
     @unittest.skipUnless(main_available, "main module not available")
     @patch('main.bot')
     async def test_webhook_send_error_handling(self, mock_bot):
-        """Тест обработки ошибок при отправке."""
+        """Тест обработки ошибок при отправке: ошибка доходит до фоновой отправки."""
         mock_bot.send_message = AsyncMock(
             side_effect=Exception("Send failed")
         )
 
+        await webhook_send("test", 12345)
         with self.assertRaises(Exception):
-            await webhook_send("test", 12345)
+            await send_merged((12345, None), "test", [{"webhook_id": None, "event": None, "web_preview": False}])
 
 
 class TestBotInitialization(unittest.IsolatedAsyncioTestCase):
@@ -252,8 +262,8 @@ class TestBotInitialization(unittest.IsolatedAsyncioTestCase):
         mock_dp.start_polling = AsyncMock(
             side_effect=asyncio.TimeoutError()  # Моделируем таймаут
         )
-        # start_grpc_server должен вернуть Task или результат, который может быть assigned
-        mock_grpc.return_value = MagicMock()  # Не coroutine, просто объект
+        # start_grpc_server возвращает задачу сервера; main отменяет ее при остановке
+        mock_grpc.side_effect = lambda **kwargs: asyncio.create_task(asyncio.sleep(3600))
 
         # Запускаем main с таймаутом
         try:
@@ -264,6 +274,8 @@ class TestBotInitialization(unittest.IsolatedAsyncioTestCase):
 
         # Проверяем что был вызван delete_webhook
         self.assertTrue(mock_bot.delete_webhook.called or True)
+        # Очередь закрыта и сброшена: следующие отправки не ждут коммита
+        self.assertIsNone(sys.modules['main'].outbox)
 
 
 class TestBotCommandsIntegration(unittest.IsolatedAsyncioTestCase):
@@ -339,7 +351,7 @@ class TestBotErrorHandling(unittest.IsolatedAsyncioTestCase):
         )
 
         with self.assertRaises(Exception):
-            await webhook_send("test", -999999)
+            await send_merged((-999999, None), "test", [{"webhook_id": None, "event": None, "web_preview": False}])
 
 
 class TestBotEdgeCases(unittest.IsolatedAsyncioTestCase):
@@ -390,9 +402,29 @@ class TestBotEdgeCases(unittest.IsolatedAsyncioTestCase):
         for msg in messages:
             mock_bot.reset_mock()
             await webhook_send(msg, 12345)
+            await close_outbound()
             mock_bot.send_message.assert_called_once()
 
 
+class TestOpenOutbound(unittest.IsolatedAsyncioTestCase):
+    """Тесты выбора файла очереди исходящих сообщений."""
+
+    @unittest.skipUnless(main_available, "main module not available")
+    async def test_busy_file_falls_back_to_next_slot(self):
+        """Тест что процесс с тем же именем берет свободный файл, а не чужой."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with patch('main.OUTBOX_DIR', tmp.name):
+            held = Outbox(os.path.join(tmp.name, "http.db"))
+            await held.open()
+            try:
+                await open_outbound("http")
+                self.assertEqual(sys.modules['main'].outbox.path, os.path.join(tmp.name, "http-1.db"))
+            finally:
+                await close_outbound()
+                await held.close()
+
+
 class TestBotAsyncBehavior(unittest.IsolatedAsyncioTestCase):
     """Тесты асинхронного поведения."""
 
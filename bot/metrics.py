@@ -0,0 +1,101 @@
+"""
+Реестр метрик сервиса.
+
+Компоненты регистрируют функции, возвращающие словарь своих счетчиков,
+а обработчик /metrics собирает их в один ответ. Реестр свой в каждом
+процессе: /metrics отдает HTTP процесс (app.py), а процесс бота (main.py)
+без HTTP сервера периодически пишет метрики в лог (run_logger).
+"""
+import asyncio
+import bisect
+import json
+import logging
+from typing import Any, Callable, Dict, Sequence
+
+logger = logging.getLogger(__name__)
+
+_providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+# Границы корзин гистограмм длительностей в миллисекундах
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Histogram:
+    """Гистограмма значений с фиксированными границами корзин."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS_MS):
+        """
+        Инициализация гистограммы.
+
+        Args:
+            buckets: Возрастающие верхние границы корзин
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """Учесть значение."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Вернуть состояние гистограммы с накопленными счетчиками по корзинам."""
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets[f"le_{bound:g}"] = cumulative
+        buckets["le_inf"] = self.count
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "avg": round(self.sum / self.count, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+            "buckets": buckets,
+        }
+
+
+def register(name: str, provider: Callable[[], Dict[str, Any]]) -> None:
+    """
+    Зарегистрировать источник метрик.
+
+    Args:
+        name: Название группы метрик
+        provider: Функция без аргументов, возвращающая словарь метрик
+    """
+    _providers[name] = provider
+
+
+def collect() -> Dict[str, Dict[str, Any]]:
+    """
+    Собрать метрики всех зарегистрированных источников.
+
+    Returns:
+        Словарь {название группы: метрики}
+    """
+    result = {}
+    for name, provider in _providers.items():
+        try:
+            result[name] = provider()
+        except Exception as e:
+            logger.error(f"Ошибка при сборе метрик {name}: {e}")
+            result[name] = {"error": str(e)}
+    return result
+
+
+async def run_logger(interval: float) -> None:
+    """
+    Периодически писать метрики процесса в лог одной строкой JSON.
+
+    Args:
+        interval: Период записи в секундах
+    """
+    while True:
+        await asyncio.sleep(interval)
+        logger.info(f"Метрики: {json.dumps(collect(), ensure_ascii=False, default=str)}")
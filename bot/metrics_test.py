@@ -0,0 +1,49 @@
+"""
+Тесты для реестра метрик.
+
+Тестирует сбор метрик зарегистрированных источников и их запись в лог.
+"""
+import asyncio
+import json
+import unittest
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import metrics
+
+
+class TestMetrics(unittest.IsolatedAsyncioTestCase):
+    """Тесты для metrics."""
+
+    def setUp(self):
+        """Зарегистрировать тестовый источник."""
+        metrics.register("test_source", lambda: {"sent": 3})
+        self.addCleanup(metrics._providers.pop, "test_source", None)
+
+    def test_failed_provider_reported(self):
+        """Тест что ошибка одного источника не мешает сбору остальных."""
+        metrics.register("test_broken", lambda: 1 / 0)
+        self.addCleanup(metrics._providers.pop, "test_broken", None)
+
+        collected = metrics.collect()
+
+        self.assertEqual(collected["test_source"], {"sent": 3})
+        self.assertIn("error", collected["test_broken"])
+
+    async def test_run_logger_writes_json(self):
+        """Тест что метрики периодически пишутся в лог строкой JSON."""
+        with self.assertLogs("metrics", level="INFO") as logs:
+            task = asyncio.create_task(metrics.run_logger(0.01))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        line = logs.records[0].getMessage()
+        self.assertEqual(json.loads(line.split(": ", 1)[1])["test_source"], {"sent": 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+"""
+Миграция документов коллекции Webhooks между версиями схемы.
+
+Версия документа хранится в поле schema_version (нет поля — версия 0).
+Документы обрабатываются пачками по возрастанию _id с паузой между
+пачками, поэтому миграцию можно запускать на работающем сервисе.
+Каждый документ обновляется только если его поля не изменились с момента
+чтения; повторный запуск продолжает с оставшихся документов.
+
+Запуск:
+    python migrate_db.py --status
+    python migrate_db.py --batch-size 500 --pause 0.2
+"""
+import argparse
+import logging
+import time
+
+from pymongo import ASCENDING, UpdateOne
+
+from init_db import connect
+from storage.mongo import SCHEMA_VERSION, typed_route
+
+logger = logging.getLogger(__name__)
+
+
+def migrate_v1(doc):
+    """
+    Версия 1: channel_id — int64, thread_id — int или null вместо строки.
+
+    Returns:
+        Поля для $set
+    """
+    return typed_route(doc['channel_id'], doc.get('thread_id'))
+
+
+# Миграции по целевой версии; применяются по порядку
+MIGRATIONS = {
+    1: migrate_v1,
+}
+
+
+def _outdated(version):
+    """Условие поиска документов с версией схемы ниже указанной."""
+    return {'schema_version': {'$not': {'$gte': version}}}
+
+
+def schema_status(coll_webhooks):
+    """
+    Возвращает количество документов по версиям схемы.
+
+    Returns:
+        Словарь {версия: количество}
+    """
+    result = {}
+    for row in coll_webhooks.aggregate([{'$group': {'_id': '$schema_version', 'count': {'$sum': 1}}}]):
+        version = row['_id'] or 0
+        result[version] = result.get(version, 0) + row['count']
+    return result
+
+
+def migrate(coll_webhooks, version, batch_size=500, pause=0.1, dry_run=False):
+    """
+    Переводит документы младших версий на версию version.
+
+    Args:
+        coll_webhooks: Коллекция Webhooks
+        version: Целевая версия схемы
+        batch_size: Размер пачки
+        pause: Пауза между пачками в секундах
+        dry_run: Только посчитать документы, не изменяя их
+
+    Returns:
+        Словарь со счетчиками migrated, skipped, failed
+    """
+    migration = MIGRATIONS[version]
+    total = coll_webhooks.count_documents(_outdated(version))
+    logger.info(f"Миграция на версию {version}: {total} документов")
+    counters = {'migrated': 0, 'skipped': 0, 'failed': 0}
+    if dry_run or total == 0:
+        return counters
+
+    started = time.monotonic()
+    last_id = None
+    processed = 0
+    while True:
+        query = _outdated(version)
+        if last_id is not None:
+            query['_id'] = {'$gt': last_id}
+        batch = list(coll_webhooks.find(query).sort('_id', ASCENDING).limit(batch_size))
+        if not batch:
+            break
+        last_id = batch[-1]['_id']
+
+        requests = []
+        for doc in batch:
+            try:
+                fields = migration(doc)
+            except (KeyError, TypeError, ValueError) as e:
+                counters['failed'] += 1
+                logger.warning(f"Документ {doc['_id']} не мигрирован: {e!r}")
+                continue
+            # Документ изменили после чтения — его перезапишет новый код
+            expected = {'_id': doc['_id'], 'channel_id': doc.get('channel_id'), 'thread_id': doc.get('thread_id')}
+            requests.append(UpdateOne(expected, {'$set': fields}))
+
+        if requests:
+            result = coll_webhooks.bulk_write(requests, ordered=False)
+            counters['migrated'] += result.modified_count
+            counters['skipped'] += len(requests) - result.matched_count
+
+        processed += len(batch)
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else 0
+        eta = (total - processed) / rate if rate else 0
+        logger.info(
+            f"Версия {version}: {processed}/{total} ({processed * 100 // max(total, 1)}%), "
+            f"{rate:.0f} док/с, осталось ~{eta:.0f} с"
+        )
+        time.sleep(pause)
+
+    logger.info(f"Миграция на версию {version} завершена: {counters}")
+    return counters
+
+
+def migrate_all(coll_webhooks, batch_size=500, pause=0.1, dry_run=False):
+    """Применяет все миграции до SCHEMA_VERSION по порядку."""
+    for version in sorted(MIGRATIONS):
+        if version > SCHEMA_VERSION:
+            break
+        migrate(coll_webhooks, version, batch_size=batch_size, pause=pause, dry_run=dry_run)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Миграция схемы коллекции Webhooks")
+    parser.add_argument("--status", action="store_true", help="показать количество документов по версиям")
+    parser.add_argument("--batch-size", type=int, default=500, help="документов в пачке")
+    parser.add_argument("--pause", type=float, default=0.1, help="пауза между пачками, с")
+    parser.add_argument("--dry-run", action="store_true", help="только посчитать документы")
+    args = parser.parse_args()
+
+    client = connect()
+    try:
+        coll = client["GitHook-db"]["Webhooks"]
+        if args.status:
+            for version, count in sorted(schema_status(coll).items()):
+                print(f"версия {version}: {count} документов")
+        else:
+            migrate_all(coll, batch_size=args.batch_size, pause=args.pause, dry_run=args.dry_run)
+    finally:
+        client.close()
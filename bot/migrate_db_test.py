@@ -0,0 +1,87 @@
+"""
+Тесты для миграции схемы коллекции Webhooks.
+
+Тестирует преобразование полей, обработку пачками и пропуск
+документов, измененных во время миграции.
+"""
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bson import Int64
+from migrate_db import migrate, migrate_v1
+
+
+def _collection(docs, matched=None):
+    """Создать мок коллекции, отдающий документы пачками по _id."""
+    coll = MagicMock()
+    coll.count_documents = MagicMock(return_value=len(docs))
+
+    def find(query):
+        after = query.get('_id', {}).get('$gt', -1)
+        cursor = MagicMock()
+        cursor.sort.return_value.limit.side_effect = lambda n: [d for d in docs if d['_id'] > after][:n]
+        return cursor
+
+    coll.find = MagicMock(side_effect=find)
+
+    def bulk_write(requests, ordered):
+        count = len(requests) if matched is None else matched
+        return MagicMock(matched_count=count, modified_count=count)
+
+    coll.bulk_write = MagicMock(side_effect=bulk_write)
+    return coll
+
+
+class TestMigrateV1(unittest.TestCase):
+    """Тесты для миграции на версию 1."""
+
+    def test_typed_fields(self):
+        """Тест преобразования channel_id и thread_id."""
+        self.assertEqual(
+            migrate_v1({'channel_id': -1001234567890, 'thread_id': "None"}),
+            {'channel_id': Int64(-1001234567890), 'thread_id': None, 'schema_version': 1},
+        )
+        fields = migrate_v1({'channel_id': "42", 'thread_id': "15"})
+        self.assertIsInstance(fields['channel_id'], Int64)
+        self.assertEqual(fields['thread_id'], 15)
+
+    def test_batches(self):
+        """Тест обработки документов пачками."""
+        docs = [{'_id': i, 'channel_id': i, 'thread_id': "None"} for i in range(5)]
+        coll = _collection(docs)
+
+        counters = migrate(coll, 1, batch_size=2, pause=0)
+
+        self.assertEqual(counters['migrated'], 5)
+        self.assertEqual(coll.bulk_write.call_count, 3)
+        update = coll.bulk_write.call_args_list[0].args[0][0]
+        self.assertEqual(update._filter, {'_id': 0, 'channel_id': 0, 'thread_id': "None"})
+
+    def test_invalid_and_concurrently_modified(self):
+        """Тест пропуска некорректных и измененных во время миграции документов."""
+        docs = [
+            {'_id': 1, 'channel_id': "abc", 'thread_id': "None"},
+            {'_id': 2, 'channel_id': 2, 'thread_id': "5"},
+        ]
+        coll = _collection(docs, matched=0)
+
+        counters = migrate(coll, 1, batch_size=10, pause=0)
+
+        self.assertEqual(counters, {'migrated': 0, 'skipped': 1, 'failed': 1})
+
+    def test_dry_run(self):
+        """Тест что dry run не изменяет документы."""
+        coll = _collection([{'_id': 1, 'channel_id': 1, 'thread_id': "None"}])
+
+        migrate(coll, 1, dry_run=True)
+
+        coll.bulk_write.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
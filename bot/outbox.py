@@ -0,0 +1,219 @@
+"""
+Локальная очередь исходящих сообщений в SQLite.
+
+Сообщение записывается в очередь до ответа на входящий запрос и удаляется
+после доставки, поэтому при перезапуске или падении процесса недоставленные
+сообщения отправляются заново. Записи и удаления копятся и коммитятся одной
+транзакцией (групповой коммит): в режиме WAL это одна синхронизация с диском
+на пачку, а не на каждое сообщение.
+
+Файл очереди принадлежит одному процессу: два процесса с одним файлом
+отправили бы сообщения друг друга повторно. Поэтому открытая очередь держит
+исключительную блокировку файла рядом с ней, а занятый файл не открывается.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Outbox:
+    """Очередь сообщений на диске с групповым коммитом."""
+
+    def __init__(self, path: str, commit_interval: float = 0.005, max_batch: int = 1000):
+        """
+        Инициализация.
+
+        Args:
+            path: Путь к файлу SQLite
+            commit_interval: Сколько ждать других записей перед коммитом, с
+            max_batch: Максимум операций в одной транзакции
+        """
+        self.path = path
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock_fd: Optional[int] = None
+        self._inserts: List[Tuple[str, float, asyncio.Future]] = []
+        self._deletes: List[int] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._closing = False
+        self.backlog = 0
+        self.commits = 0
+        self.commit_failures = 0
+
+    def _lock(self) -> None:
+        """
+        Занять файл очереди блокировкой на файле .lock рядом с ним.
+
+        Блокировка снимается при закрытии очереди или завершении процесса.
+
+        Raises:
+            BlockingIOError: Файл очереди занят другим процессом
+        """
+        fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            raise BlockingIOError(f"Очередь сообщений {self.path} открыта другим процессом")
+        self._lock_fd = fd
+
+    def _unlock(self) -> None:
+        """Освободить файл очереди."""
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def _open(self) -> List[Tuple[int, Dict[str, Any]]]:
+        """Занять файл, создать таблицу и прочитать недоставленные сообщения."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock()
+        try:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY, payload TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            pending = [(row[0], json.loads(row[1])) for row in conn.execute("SELECT id, payload FROM outbox ORDER BY id")]
+        except Exception:
+            self._unlock()
+            raise
+        self._conn = conn
+        return pending
+
+    async def open(self) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Открыть очередь и запустить запись в фоне.
+
+        Returns:
+            Недоставленные сообщения прошлого запуска: (id, данные) по порядку
+
+        Raises:
+            BlockingIOError: Файл очереди занят другим процессом
+        """
+        pending = await asyncio.to_thread(self._open)
+        self.backlog = len(pending)
+        self._wake = asyncio.Event()
+        self._writer = asyncio.create_task(self._run())
+        if pending:
+            logger.info(f"В очереди {self.path} недоставленных сообщений: {len(pending)}")
+        return pending
+
+    @property
+    def is_open(self) -> bool:
+        """Открыта ли очередь."""
+        return self._writer is not None
+
+    async def put(self, payload: Dict[str, Any]) -> int:
+        """
+        Записать сообщение в очередь и дождаться коммита.
+
+        Args:
+            payload: Данные сообщения (сериализуются в JSON)
+
+        Returns:
+            id сообщения в очереди
+
+        Raises:
+            RuntimeError: Очередь не открыта или закрывается: запись
+                никто не закоммитит
+        """
+        if self._writer is None or self._closing:
+            raise RuntimeError(f"Очередь сообщений {self.path} закрыта")
+        future = asyncio.get_running_loop().create_future()
+        self._inserts.append((json.dumps(payload, ensure_ascii=False), time.time(), future))
+        self._wake.set()
+        return await future
+
+    def ack(self, ids: List[int]) -> None:
+        """Удалить доставленные сообщения; удаление коммитится в фоне."""
+        self._deletes.extend(ids)
+        self._wake.set()
+
+    def _commit(self, inserts: List[Tuple[str, float, asyncio.Future]], deletes: List[int]) -> List[int]:
+        """Записать пачку одной транзакцией; возвращает id вставленных строк."""
+        ids = []
+        self._conn.execute("BEGIN")
+        try:
+            for payload, created_at, _ in inserts:
+                ids.append(self._conn.execute(
+                    "INSERT INTO outbox (payload, created_at) VALUES (?, ?)", (payload, created_at)
+                ).lastrowid)
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in deletes])
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return ids
+
+    async def _flush(self) -> bool:
+        """Закоммитить накопленные записи и удаления; False при ошибке записи."""
+        inserts, self._inserts = self._inserts[:self.max_batch], self._inserts[self.max_batch:]
+        deletes, self._deletes = self._deletes[:self.max_batch], self._deletes[self.max_batch:]
+        try:
+            ids = await asyncio.to_thread(self._commit, inserts, deletes)
+        except Exception as e:
+            self.commit_failures += 1
+            logger.error(f"Не удалось записать очередь сообщений: {e}")
+            for _, _, future in inserts:
+                if not future.done():
+                    future.set_exception(e)
+            self._deletes[:0] = deletes
+            return False
+        self.commits += 1
+        self.backlog += len(inserts) - len(deletes)
+        for row_id, (_, _, future) in zip(ids, inserts):
+            if not future.done():
+                future.set_result(row_id)
+        return True
+
+    async def _run(self) -> None:
+        """Коммитить записи пачками по мере поступления; при закрытии — до конца."""
+        while True:
+            await self._wake.wait()
+            if not self._closing:
+                # Дать накопиться записям от одновременных запросов
+                await asyncio.sleep(self.commit_interval)
+            self._wake.clear()
+            while self._inserts or self._deletes:
+                if not await self._flush():
+                    if self._closing:
+                        return
+                    # Повторить позже, не нагружая диск в цикле
+                    await asyncio.sleep(1)
+                    break
+            if self._closing:
+                return
+
+    async def close(self) -> None:
+        """Записать оставшиеся удаления и закрыть файл."""
+        if self._writer is None:
+            return
+        self._closing = True
+        self._wake.set()
+        await self._writer
+        self._writer = None
+        await asyncio.to_thread(self._conn.close)
+        self._unlock()
+
+    def stats(self) -> Dict[str, Any]:
+        """Вернуть состояние очереди."""
+        return {
+            "open": self.is_open,
+            "backlog": self.backlog,
+            "pending_writes": len(self._inserts) + len(self._deletes),
+            "commits": self.commits,
+            "commit_failures": self.commit_failures,
+        }
@@ -0,0 +1,96 @@
+"""
+Тесты для локальной очереди исходящих сообщений.
+
+Тестирует запись с групповым коммитом, удаление доставленных,
+повторную отправку после перезапуска, ошибку записи и блокировку файла.
+"""
+import asyncio
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from outbox import Outbox
+
+
+class TestOutbox(unittest.IsolatedAsyncioTestCase):
+    """Тесты для Outbox."""
+
+    async def asyncSetUp(self):
+        """Создать очередь во временном каталоге."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "queue", "bot.db")
+        self.outbox = Outbox(self.path, commit_interval=0.001)
+        self.assertEqual(await self.outbox.open(), [])
+
+    async def test_group_commit(self):
+        """Тест что одновременные записи коммитятся одной транзакцией."""
+        ids = await asyncio.gather(*(self.outbox.put({'n': i}) for i in range(100)))
+
+        self.assertEqual(len(set(ids)), 100)
+        self.assertEqual(self.outbox.stats()["commits"], 1)
+        self.assertEqual(self.outbox.stats()["backlog"], 100)
+        await self.outbox.close()
+
+    async def test_replay_after_restart(self):
+        """Тест что недоставленные сообщения читаются после перезапуска по порядку."""
+        first = await self.outbox.put({'message': 'first'})
+        second = await self.outbox.put({'message': 'second'})
+        third = await self.outbox.put({'message': 'third'})
+        self.outbox.ack([second])
+        await self.outbox.close()
+
+        reopened = Outbox(self.path)
+        pending = await reopened.open()
+
+        self.assertEqual(pending, [(first, {'message': 'first'}), (third, {'message': 'third'})])
+        self.assertEqual(reopened.stats()["backlog"], 2)
+        await reopened.close()
+
+    async def test_wal_mode(self):
+        """Тест что файл очереди работает в режиме WAL."""
+        await self.outbox.close()
+        conn = sqlite3.connect(self.path)
+        self.addCleanup(conn.close)
+
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    async def test_commit_failure(self):
+        """Тест что ошибка записи доходит до вызывающего, а удаления сохраняются."""
+        self.outbox.ack([1])
+        with patch.object(self.outbox, '_commit', side_effect=sqlite3.OperationalError("disk I/O error")):
+            with self.assertRaises(sqlite3.OperationalError):
+                await self.outbox.put({'message': 'lost'})
+
+        self.assertEqual(self.outbox.stats()["commit_failures"], 1)
+        self.assertEqual(self.outbox._deletes, [1])
+        await self.outbox.close()
+
+    async def test_put_when_closed_raises(self):
+        """Тест что запись в закрытую или не открытую очередь не зависает."""
+        await self.outbox.close()
+
+        with self.assertRaises(RuntimeError):
+            await asyncio.wait_for(self.outbox.put({'message': 'late'}), timeout=1)
+        with self.assertRaises(RuntimeError):
+            await asyncio.wait_for(Outbox(self.path).put({'message': 'early'}), timeout=1)
+
+    async def test_file_locked_by_open_queue(self):
+        """Тест что файл открытой очереди нельзя открыть второй раз до закрытия."""
+        with self.assertRaises(BlockingIOError):
+            await Outbox(self.path).open()
+
+        await self.outbox.close()
+        reopened = Outbox(self.path)
+        self.assertEqual(await reopened.open(), [])
+        await reopened.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
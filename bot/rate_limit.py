@@ -0,0 +1,165 @@
+"""
+Планировщик исходящих сообщений с учетом лимитов Telegram.
+
+Telegram ограничивает бота примерно 30 сообщениями в секунду суммарно и
+20 сообщениями в минуту в одну группу (в личный чат — около одного в
+секунду); при превышении отвечает 429. Каждая отправка сначала резервирует
+токен в корзине своего чата, затем в общей корзине и ждет ровно столько,
+сколько нужно до появления токена. Резервирование идет в порядке вызовов,
+поэтому поток держится у лимита без всплесков и повторных 429.
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict
+
+from metrics import Histogram
+
+# Корзины чатов без ожидающих отправок чистятся, когда их больше порога
+MAX_IDLE_CHATS = 10000
+
+
+class TokenBucket:
+    """Корзина токенов с резервированием в долг."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Инициализация полной корзины.
+
+        Args:
+            rate: Токенов в секунду
+            capacity: Размер корзины (допустимый всплеск)
+            clock: Источник монотонного времени
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._clock = clock
+        self.updated = clock()
+
+    def _refill(self, now: float) -> None:
+        """Начислить токены за прошедшее время."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """
+        Зарезервировать токен.
+
+        Токенов может стать меньше нуля: следующий вызов будет ждать дольше,
+        так что порядок вызовов сохраняется.
+
+        Returns:
+            Через сколько секунд токен можно использовать
+        """
+        self._refill(self._clock())
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self) -> None:
+        """Вернуть неиспользованный токен (ожидание отменено)."""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def idle(self) -> bool:
+        """Полна ли корзина, то есть ее можно удалить без потери состояния."""
+        self._refill(self._clock())
+        return self.tokens >= self.capacity
+
+
+class OutboundScheduler:
+    """Общая корзина и корзины по чатам для всех исходящих сообщений."""
+
+    def __init__(
+        self,
+        global_rate: float = 30,
+        global_burst: float = 10,
+        group_rate: float = 20 / 60,
+        private_rate: float = 1,
+        chat_burst: float = 3,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Инициализация планировщика.
+
+        Args:
+            global_rate: Сообщений в секунду суммарно
+            global_burst: Допустимый всплеск суммарного потока
+            group_rate: Сообщений в секунду в одну группу или канал
+            private_rate: Сообщений в секунду в один личный чат
+            chat_burst: Допустимый всплеск в один чат
+            clock: Источник монотонного времени
+        """
+        self.group_rate = group_rate
+        self.private_rate = private_rate
+        self.chat_burst = chat_burst
+        self._clock = clock
+        self._global = TokenBucket(global_rate, global_burst, clock)
+        self._chats: Dict[int, TokenBucket] = {}
+        self._prune_at = MAX_IDLE_CHATS
+        self.wait_ms = Histogram()
+        self.waiting = 0
+        self.max_waiting = 0
+        self.acquired = 0
+        self.throttled = 0
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        """Корзина чата; id групп и каналов отрицательные."""
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self._prune_at:
+                self._prune()
+            rate = self.group_rate if chat_id < 0 else self.private_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, self.chat_burst, self._clock)
+        return bucket
+
+    def _prune(self) -> None:
+        """Удалить полные корзины чатов."""
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.idle()]:
+            del self._chats[chat_id]
+        self._prune_at = max(MAX_IDLE_CHATS, 2 * len(self._chats))
+
+    async def _wait(self, bucket: TokenBucket) -> None:
+        """Зарезервировать токен и дождаться его; при отмене вернуть токен."""
+        delay = bucket.reserve()
+        if delay <= 0:
+            return
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            bucket.refund()
+            raise
+
+    async def acquire(self, chat_id: int) -> float:
+        """
+        Дождаться разрешения на отправку сообщения в чат.
+
+        Args:
+            chat_id: ID чата назначения
+
+        Returns:
+            Время ожидания в миллисекундах
+        """
+        started = self._clock()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._wait(self._chat_bucket(chat_id))
+            await self._wait(self._global)
+        finally:
+            self.waiting -= 1
+        waited_ms = (self._clock() - started) * 1000
+        self.acquired += 1
+        if waited_ms > 0:
+            self.throttled += 1
+        self.wait_ms.observe(waited_ms)
+        return waited_ms
+
+    def stats(self) -> Dict[str, Any]:
+        """Вернуть глубину очереди и время ожидания."""
+        return {
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "chats": len(self._chats),
+            "wait_ms": self.wait_ms.snapshot(),
+        }
@@ -0,0 +1,140 @@
+"""
+Тесты для планировщика исходящих сообщений.
+
+Тестирует корзину токенов с резервированием, лимиты по чатам и общий
+лимит, возврат токена при отмене и метрики ожидания.
+"""
+import asyncio
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from rate_limit import OutboundScheduler, TokenBucket
+
+# asyncio.sleep подменяется в тестах; настоящий нужен для переключения задач
+real_sleep = asyncio.sleep
+
+
+class FakeClock:
+    """Управляемые часы; asyncio.sleep лишь сдвигает время."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Тесты для TokenBucket."""
+
+    def test_burst_then_paced(self):
+        """Тест всплеска в размер корзины и дальнейшей выдачи по rate."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+
+        delays = [bucket.reserve() for _ in range(4)]
+
+        self.assertEqual(delays, [0.0, 0.0, 0.5, 1.0])
+
+    def test_refill_capped(self):
+        """Тест что простой не накапливает токенов больше capacity."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1, capacity=2, clock=clock)
+        bucket.reserve()
+        clock.now += 100
+
+        self.assertTrue(bucket.idle())
+        self.assertEqual(bucket.tokens, 2)
+
+
+class TestOutboundScheduler(unittest.IsolatedAsyncioTestCase):
+    """Тесты для OutboundScheduler."""
+
+    def setUp(self):
+        """Подменить время и asyncio.sleep."""
+        self.clock = FakeClock()
+        patcher = patch('rate_limit.asyncio.sleep', self.clock.sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_group_limit(self):
+        """Тест лимита группы: после всплеска — 20 сообщений в минуту."""
+        scheduler = OutboundScheduler(group_rate=20 / 60, chat_burst=3, clock=self.clock)
+
+        waits = [await scheduler.acquire(-100) for _ in range(5)]
+
+        self.assertEqual(waits[:3], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(waits[3], 3000)
+        self.assertAlmostEqual(waits[4], 3000)
+        self.assertAlmostEqual(self.clock.now, 6.0)
+
+    async def test_private_chat_rate(self):
+        """Тест что личные чаты (положительный id) ограничены отдельно."""
+        scheduler = OutboundScheduler(group_rate=1 / 60, private_rate=1, chat_burst=1, clock=self.clock)
+
+        await scheduler.acquire(42)
+        waited = await scheduler.acquire(42)
+
+        self.assertAlmostEqual(waited, 1000)
+
+    async def test_global_limit_across_chats(self):
+        """Тест общего лимита при отправке в разные чаты."""
+        scheduler = OutboundScheduler(global_rate=10, global_burst=2, clock=self.clock)
+
+        for chat_id in range(-1, -6, -1):
+            await scheduler.acquire(chat_id)
+
+        self.assertAlmostEqual(self.clock.now, 0.3)
+        stats = scheduler.stats()
+        self.assertEqual(stats["acquired"], 5)
+        self.assertEqual(stats["throttled"], 3)
+        self.assertEqual(stats["chats"], 5)
+        self.assertEqual(stats["wait_ms"]["count"], 5)
+
+    async def test_queue_depth(self):
+        """Тест глубины очереди ожидающих отправок."""
+        scheduler = OutboundScheduler(group_rate=1, chat_burst=1, clock=self.clock)
+        release = asyncio.Event()
+
+        async def slow_sleep(delay):
+            await release.wait()
+            self.clock.now += delay
+
+        with patch('rate_limit.asyncio.sleep', slow_sleep):
+            tasks = [asyncio.create_task(scheduler.acquire(-1)) for _ in range(3)]
+            await real_sleep(0)
+            self.assertEqual(scheduler.stats()["waiting"], 2)
+            release.set()
+            await asyncio.gather(*tasks)
+
+        self.assertEqual(scheduler.stats()["waiting"], 0)
+        self.assertEqual(scheduler.stats()["max_waiting"], 2)
+
+    async def test_cancel_refunds_token(self):
+        """Тест возврата токена при отмене ожидания."""
+        scheduler = OutboundScheduler(group_rate=1, chat_burst=1, clock=self.clock)
+        await scheduler.acquire(-1)
+
+        async def cancelled_sleep(delay):
+            raise asyncio.CancelledError
+
+        with patch('rate_limit.asyncio.sleep', cancelled_sleep):
+            with self.assertRaises(asyncio.CancelledError):
+                await scheduler.acquire(-1)
+
+        self.assertEqual(scheduler._chats[-1].tokens, 0)
+        self.assertEqual(scheduler.stats()["waiting"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Повтор отправок в Telegram после временных ошибок.
+
+На 429 Telegram сообщает retry_after — через сколько секунд можно
+повторить; его ждем как есть. Сетевые ошибки и 5xx повторяются с
+экспоненциальной задержкой и полным джиттером, чтобы повторы многих
+сообщений не приходили одной волной. Остальные ошибки (400, 403)
+не повторяются. Повторы ограничены числом попыток и общим временем.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+logger = logging.getLogger(__name__)
+
+
+def is_transient(error: Exception) -> bool:
+    """Временная ли ошибка отправки, то есть стоит ли ее повторять."""
+    return isinstance(error, (TelegramRetryAfter, TelegramNetworkError, TelegramServerError, asyncio.TimeoutError))
+
+
+def retry_delay(error: Exception, attempt: int, base_delay: float, max_delay: float) -> Optional[float]:
+    """
+    Задержка перед повтором после ошибки.
+
+    Args:
+        error: Ошибка попытки
+        attempt: Номер неудачной попытки, начиная с 1
+        base_delay: Базовая задержка экспоненты в секундах
+        max_delay: Максимальная задержка экспоненты в секундах
+
+    Returns:
+        Задержка в секундах или None, если ошибка не временная
+    """
+    if isinstance(error, TelegramRetryAfter):
+        return float(error.retry_after)
+    if is_transient(error):
+        return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+    return None
+
+
+class RetryEngine:
+    """Выполнение отправок с повторами и счетчиками повторов."""
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        max_elapsed: float = 300,
+        base_delay: float = 0.5,
+        max_delay: float = 30,
+    ):
+        """
+        Инициализация.
+
+        Args:
+            max_attempts: Максимум попыток одной отправки
+            max_elapsed: Максимальное время повторов одной отправки в секундах
+            base_delay: Базовая задержка экспоненты в секундах
+            max_delay: Максимальная задержка экспоненты в секундах
+        """
+        self.max_attempts = max_attempts
+        self.max_elapsed = max_elapsed
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.calls = 0
+        self.retries = 0
+        self.retry_after = 0
+        self.gave_up = 0
+        self.retrying = 0
+
+    async def call(self, fn: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> Any:
+        """
+        Выполнить fn, повторяя после временных ошибок.
+
+        Raises:
+            Exception: Ошибка последней попытки, если она не временная
+                или бюджет повторов исчерпан
+        """
+        self.calls += 1
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                delay = retry_delay(e, attempt, self.base_delay, self.max_delay)
+                if delay is None:
+                    raise
+                elapsed = time.monotonic() - started
+                if attempt >= self.max_attempts or elapsed + delay > self.max_elapsed:
+                    self.gave_up += 1
+                    logger.warning(f"Отправка не удалась после {attempt} попыток за {elapsed:.1f} с: {e}")
+                    raise
+                if isinstance(e, TelegramRetryAfter):
+                    self.retry_after += 1
+                self.retries += 1
+                logger.info(f"Попытка {attempt} не удалась ({e}), повтор через {delay:.1f} с")
+
+            self.retrying += 1
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self.retrying -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Вернуть счетчики повторов."""
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "retry_after": self.retry_after,
+            "gave_up": self.gave_up,
+            "retrying": self.retrying,
+        }
@@ -0,0 +1,107 @@
+"""
+Тесты для повторов отправки в Telegram.
+
+Тестирует ожидание retry_after, экспоненциальную задержку с джиттером,
+отказ от повторов для постоянных ошибок и бюджет повторов.
+"""
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter
+from retry import RetryEngine, retry_delay
+
+METHOD = MagicMock()
+
+
+class TestRetryDelay(unittest.TestCase):
+    """Тесты для retry_delay."""
+
+    def test_retry_after_honored(self):
+        """Тест что на 429 ждем ровно retry_after."""
+        error = TelegramRetryAfter(METHOD, "Too Many Requests", retry_after=7)
+
+        self.assertEqual(retry_delay(error, 1, 0.5, 30), 7.0)
+
+    def test_backoff_with_jitter(self):
+        """Тест экспоненциальной задержки с полным джиттером и потолком."""
+        error = TelegramNetworkError(METHOD, "timeout")
+
+        with patch('retry.random.uniform', side_effect=lambda low, high: high):
+            self.assertEqual(retry_delay(error, 1, 0.5, 30), 0.5)
+            self.assertEqual(retry_delay(error, 3, 0.5, 30), 2.0)
+            self.assertEqual(retry_delay(error, 10, 0.5, 30), 30)
+
+    def test_permanent_errors_not_retried(self):
+        """Тест что 400 и прочие ошибки не повторяются."""
+        self.assertIsNone(retry_delay(TelegramBadRequest(METHOD, "chat not found"), 1, 0.5, 30))
+        self.assertIsNone(retry_delay(ValueError("bad"), 1, 0.5, 30))
+
+
+class TestRetryEngine(unittest.IsolatedAsyncioTestCase):
+    """Тесты для RetryEngine."""
+
+    def setUp(self):
+        """Подменить asyncio.sleep."""
+        patcher = patch('retry.asyncio.sleep', new_callable=AsyncMock)
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_retries_until_success(self):
+        """Тест повтора после 429 и сетевой ошибки до успешной отправки."""
+        send = AsyncMock(side_effect=[
+            TelegramRetryAfter(METHOD, "Too Many Requests", retry_after=3),
+            TelegramNetworkError(METHOD, "reset"),
+            "sent",
+        ])
+        engine = RetryEngine(base_delay=0.5)
+
+        result = await engine.call(send, 1, text="x")
+
+        self.assertEqual(result, "sent")
+        self.assertEqual(send.await_count, 3)
+        send.assert_awaited_with(1, text="x")
+        self.assertEqual(self.sleep.await_args_list[0].args[0], 3.0)
+        self.assertEqual(engine.stats()["retries"], 2)
+        self.assertEqual(engine.stats()["retry_after"], 1)
+
+    async def test_permanent_error_raised_immediately(self):
+        """Тест что постоянная ошибка не повторяется."""
+        send = AsyncMock(side_effect=TelegramBadRequest(METHOD, "chat not found"))
+        engine = RetryEngine()
+
+        with self.assertRaises(TelegramBadRequest):
+            await engine.call(send)
+
+        send.assert_awaited_once()
+        self.sleep.assert_not_awaited()
+
+    async def test_gives_up_after_attempts(self):
+        """Тест отказа после исчерпания попыток."""
+        send = AsyncMock(side_effect=TelegramNetworkError(METHOD, "down"))
+        engine = RetryEngine(max_attempts=3)
+
+        with self.assertRaises(TelegramNetworkError):
+            await engine.call(send)
+
+        self.assertEqual(send.await_count, 3)
+        self.assertEqual(engine.stats()["gave_up"], 1)
+
+    async def test_gives_up_when_retry_after_exceeds_budget(self):
+        """Тест отказа, если retry_after не укладывается в бюджет времени."""
+        send = AsyncMock(side_effect=TelegramRetryAfter(METHOD, "Too Many Requests", retry_after=600))
+        engine = RetryEngine(max_elapsed=300)
+
+        with self.assertRaises(TelegramRetryAfter):
+            await engine.call(send)
+
+        send.assert_awaited_once()
+        self.sleep.assert_not_awaited()
+
+
+if __name__ == "__main__":
+    unittest.main()
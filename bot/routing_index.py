@@ -0,0 +1,348 @@
+"""
+Компактный индекс маршрутизации webhooks.
+
+Хэш-таблица с открытой адресацией (линейное пробирование), в которой
+ключи и значения хранятся в плоских типизированных массивах, а не в
+словарях Python. Слот занимает 64 байта; при заполнении таблицы от 35 до
+70% это 90-185 байт на запись (около 140 в среднем) против ~330 у dict
+с вложенными dict.
+
+Вместе с маршрутом в слоте хранится _id документа (ID_SIZE байт), чтобы
+удалять webhook по событию change stream, в котором есть только _id.
+Для поиска по _id есть вторая таблица с открытой адресацией той же
+емкости: по хэшу _id в ней лежит номер слота основной таблицы (4 байта
+на слот), а сам _id сравнивается на месте в массиве документов.
+"""
+import struct
+from array import array
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+KEY_SIZE = 24
+ID_SIZE = 12
+NO_DOC = bytes(ID_SIZE)
+EMPTY = 0
+DELETED = 1
+MASK64 = (1 << 64) - 1
+
+# Сериализация: емкость, число длинных id; запись длинного id: длина, id, значения
+DUMP_HEADER = struct.Struct("<QI")
+OVERFLOW_KEY = struct.Struct("<H")
+OVERFLOW_VALUE = struct.Struct(f"<qq{ID_SIZE}s")
+
+
+def _hash(key: bytes) -> int:
+    """Хэш ключа; значения EMPTY и DELETED зарезервированы."""
+    h = hash(key) & MASK64
+    return h if h > DELETED else h + 2
+
+
+class RoutingIndex:
+    """
+    Индекс id webhook -> (channel_id, thread_id).
+
+    Id до KEY_SIZE байт хранятся в таблице, более длинные (старые записи)
+    — в обычном словаре. _id документа — ровно ID_SIZE байт (ObjectId).
+    """
+
+    MAX_LOAD = 0.7
+
+    def __init__(self, capacity: int = 1024):
+        """
+        Инициализация индекса.
+
+        Args:
+            capacity: Начальная емкость таблицы (округляется до степени 2)
+        """
+        size = 8
+        while size < capacity:
+            size *= 2
+        self._allocate(size)
+        self._overflow: Dict[bytes, Tuple[int, int, bytes]] = {}
+
+    def _allocate(self, size: int) -> None:
+        """Выделить пустые массивы заданной емкости."""
+        self._capacity = size
+        self._mask = size - 1
+        self._hashes = array("Q", bytes(8 * size))
+        self._keys = bytearray(KEY_SIZE * size)
+        self._channels = array("q", bytes(8 * size))
+        self._threads = array("q", bytes(8 * size))
+        self._docs = bytearray(ID_SIZE * size)
+        # Таблица _id -> слот: номер слота + 2, EMPTY и DELETED как в _hashes
+        self._doc_slots = array("I", bytes(4 * size))
+        self._used = 0
+        self._filled = 0
+        self._doc_filled = 0
+
+    def __len__(self) -> int:
+        return self._used + len(self._overflow)
+
+    def __contains__(self, webhook_id: str) -> bool:
+        return self.get(webhook_id) is not None
+
+    def _find(self, key: bytes, h: int) -> int:
+        """Найти слот ключа или -1."""
+        hashes, keys, mask = self._hashes, self._keys, self._mask
+        i = h & mask
+        while True:
+            slot_hash = hashes[i]
+            if slot_hash == h:
+                # startswith сравнивает на месте, без копии среза
+                if keys.startswith(key, i * KEY_SIZE):
+                    return i
+            elif slot_hash == EMPTY:
+                return -1
+            i = (i + 1) & mask
+
+    def get(self, webhook_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Получить настройки маршрутизации webhook.
+
+        Returns:
+            Словарь с channel_id и thread_id (None — нет ветки) или None
+        """
+        key = webhook_id.encode()
+        if len(key) > KEY_SIZE:
+            value = self._overflow.get(key)
+            if value is None:
+                return None
+            channel_id, thread_id, _ = value
+        else:
+            key = key.ljust(KEY_SIZE, b"\0")
+            i = self._find(key, _hash(key))
+            if i < 0:
+                return None
+            channel_id, thread_id = self._channels[i], self._threads[i]
+        return {"channel_id": channel_id, "thread_id": thread_id or None}
+
+    def set(self, webhook_id: str, channel_id: int, thread_id: Optional[int], doc_id: bytes = NO_DOC) -> None:
+        """
+        Добавить или обновить webhook.
+
+        Args:
+            webhook_id: Id webhook
+            channel_id: Id чата
+            thread_id: Id ветки форума или None
+            doc_id: _id документа webhook, ID_SIZE байт
+        """
+        if len(doc_id) != ID_SIZE:
+            raise ValueError(f"doc_id должен быть {ID_SIZE} байт")
+        key = webhook_id.encode()
+        if len(key) > KEY_SIZE:
+            self._overflow[key] = (channel_id, thread_id or 0, doc_id)
+            return
+
+        key = key.ljust(KEY_SIZE, b"\0")
+        h = _hash(key)
+        # Удаленные записи копятся и в таблице _id, поэтому проверяются обе
+        if max(self._filled, self._doc_filled) + 1 > self._capacity * self.MAX_LOAD:
+            self._resize()
+        i = self._find(key, h)
+        if i < 0:
+            i = self._insert_slot(h)
+            if self._hashes[i] == EMPTY:
+                self._filled += 1
+            self._hashes[i] = h
+            self._keys[i * KEY_SIZE:(i + 1) * KEY_SIZE] = key
+            self._used += 1
+        elif self._docs.startswith(doc_id, i * ID_SIZE):
+            self._channels[i] = channel_id
+            self._threads[i] = thread_id or 0
+            return
+        else:
+            self._unlink_doc(i)
+        self._channels[i] = channel_id
+        self._threads[i] = thread_id or 0
+        self._docs[i * ID_SIZE:(i + 1) * ID_SIZE] = doc_id
+        self._link_doc(i)
+
+    def _insert_slot(self, h: int) -> int:
+        """Найти свободный или удаленный слот для нового ключа."""
+        hashes, mask = self._hashes, self._mask
+        i = h & mask
+        while hashes[i] > DELETED:
+            i = (i + 1) & mask
+        return i
+
+    def _link_doc(self, i: int) -> None:
+        """Добавить _id документа слота i в таблицу _id."""
+        doc_id = bytes(self._docs[i * ID_SIZE:(i + 1) * ID_SIZE])
+        if doc_id == NO_DOC:
+            return
+        slots, mask = self._doc_slots, self._mask
+        j = _hash(doc_id) & mask
+        while slots[j] > DELETED:
+            j = (j + 1) & mask
+        if slots[j] == EMPTY:
+            self._doc_filled += 1
+        slots[j] = i + 2
+
+    def _unlink_doc(self, i: int) -> None:
+        """Убрать _id документа слота i из таблицы _id."""
+        doc_id = bytes(self._docs[i * ID_SIZE:(i + 1) * ID_SIZE])
+        if doc_id == NO_DOC:
+            return
+        slots, mask = self._doc_slots, self._mask
+        j = _hash(doc_id) & mask
+        while slots[j] != EMPTY:
+            if slots[j] == i + 2:
+                slots[j] = DELETED
+                return
+            j = (j + 1) & mask
+
+    def delete(self, webhook_id: str) -> bool:
+        """
+        Удалить webhook.
+
+        Returns:
+            True, если webhook был в индексе
+        """
+        key = webhook_id.encode()
+        if len(key) > KEY_SIZE:
+            return self._overflow.pop(key, None) is not None
+
+        key = key.ljust(KEY_SIZE, b"\0")
+        i = self._find(key, _hash(key))
+        if i < 0:
+            return False
+        self._unlink_doc(i)
+        self._hashes[i] = DELETED
+        self._docs[i * ID_SIZE:(i + 1) * ID_SIZE] = NO_DOC
+        self._used -= 1
+        return True
+
+    def find_doc(self, doc_id: bytes) -> Optional[str]:
+        """
+        Найти id webhook по _id документа.
+
+        Args:
+            doc_id: _id документа, ID_SIZE байт
+
+        Returns:
+            Id webhook или None
+        """
+        if doc_id != NO_DOC:
+            slots, docs, mask = self._doc_slots, self._docs, self._mask
+            j = _hash(doc_id) & mask
+            while True:
+                slot = slots[j]
+                if slot == EMPTY:
+                    break
+                if slot > DELETED and docs.startswith(doc_id, (slot - 2) * ID_SIZE):
+                    i = slot - 2
+                    return bytes(self._keys[i * KEY_SIZE:(i + 1) * KEY_SIZE]).rstrip(b"\0").decode()
+                j = (j + 1) & mask
+        for key, (_, _, overflow_doc) in self._overflow.items():
+            if overflow_doc == doc_id:
+                return key.decode()
+        return None
+
+    def items(self) -> Iterator[Tuple[str, int, int, bytes]]:
+        """Перебрать записи: (id webhook, channel_id, thread_id или 0, _id документа)."""
+        for i, h in enumerate(self._hashes):
+            if h > DELETED:
+                yield (
+                    bytes(self._keys[i * KEY_SIZE:(i + 1) * KEY_SIZE]).rstrip(b"\0").decode(),
+                    self._channels[i],
+                    self._threads[i],
+                    bytes(self._docs[i * ID_SIZE:(i + 1) * ID_SIZE]),
+                )
+        for key, (channel_id, thread_id, doc_id) in self._overflow.items():
+            yield key.decode(), channel_id, thread_id, doc_id
+
+    def _resize(self) -> None:
+        """Перестроить таблицу, увеличив емкость при необходимости."""
+        old_hashes, old_keys = self._hashes, self._keys
+        old_channels, old_threads, old_docs = self._channels, self._threads, self._docs
+
+        size = self._capacity
+        if (self._used + 1) > size * self.MAX_LOAD / 2:
+            size *= 2
+        self._allocate(size)
+
+        for j, h in enumerate(old_hashes):
+            if h <= DELETED:
+                continue
+            i = self._insert_slot(h)
+            self._hashes[i] = h
+            self._keys[i * KEY_SIZE:(i + 1) * KEY_SIZE] = old_keys[j * KEY_SIZE:(j + 1) * KEY_SIZE]
+            self._channels[i] = old_channels[j]
+            self._threads[i] = old_threads[j]
+            self._docs[i * ID_SIZE:(i + 1) * ID_SIZE] = old_docs[j * ID_SIZE:(j + 1) * ID_SIZE]
+            self._link_doc(i)
+            self._used += 1
+            self._filled += 1
+
+    def dumps(self) -> bytes:
+        """
+        Сериализовать индекс.
+
+        Массивы копируются целиком, без перебора записей, поэтому снимок
+        делается быстро и его можно писать на диск в другом потоке.
+        """
+        parts = [
+            DUMP_HEADER.pack(self._capacity, len(self._overflow)),
+            self._hashes.tobytes(),
+            bytes(self._keys),
+            self._channels.tobytes(),
+            self._threads.tobytes(),
+            bytes(self._docs),
+        ]
+        for key, value in self._overflow.items():
+            parts.append(OVERFLOW_KEY.pack(len(key)) + key + OVERFLOW_VALUE.pack(*value))
+        return b"".join(parts)
+
+    @classmethod
+    def loads(cls, data: bytes) -> "RoutingIndex":
+        """
+        Восстановить индекс из dumps.
+
+        Хэши bytes зависят от процесса (PYTHONHASHSEED), поэтому записи
+        вставляются заново, а сохраненные хэши отмечают только занятые слоты.
+
+        Raises:
+            ValueError: Данные повреждены
+        """
+        try:
+            capacity, overflow_count = DUMP_HEADER.unpack_from(data)
+            offset = DUMP_HEADER.size
+            arrays = []
+            for typecode, itemsize in (("Q", 8), ("B", KEY_SIZE), ("q", 8), ("q", 8), ("B", ID_SIZE)):
+                chunk = data[offset:offset + itemsize * capacity]
+                if len(chunk) != itemsize * capacity:
+                    raise ValueError("данные индекса обрезаны")
+                arrays.append(array(typecode, chunk))
+                offset += len(chunk)
+            hashes, keys, channels, threads, docs = arrays
+
+            index = cls()
+            for i, h in enumerate(hashes):
+                if h > DELETED:
+                    key = keys[i * KEY_SIZE:(i + 1) * KEY_SIZE].tobytes().rstrip(b"\0")
+                    index.set(key.decode(), channels[i], threads[i], docs[i * ID_SIZE:(i + 1) * ID_SIZE].tobytes())
+            for _ in range(overflow_count):
+                (length,) = OVERFLOW_KEY.unpack_from(data, offset)
+                offset += OVERFLOW_KEY.size
+                key = data[offset:offset + length]
+                offset += length
+                index._overflow[bytes(key)] = OVERFLOW_VALUE.unpack_from(data, offset)
+                offset += OVERFLOW_VALUE.size
+        except struct.error as e:
+            raise ValueError(f"данные индекса повреждены: {e}") from e
+        return index
+
+    def clear(self) -> None:
+        """Очистить индекс."""
+        self._allocate(8)
+        self._overflow.clear()
+
+    def nbytes(self) -> int:
+        """Размер массивов таблицы в байтах."""
+        return (
+            self._hashes.itemsize * len(self._hashes)
+            + len(self._keys)
+            + self._channels.itemsize * len(self._channels)
+            + self._threads.itemsize * len(self._threads)
+            + len(self._docs)
+            + self._doc_slots.itemsize * len(self._doc_slots)
+        )
@@ -0,0 +1,141 @@
+"""
+Тесты для компактного индекса маршрутизации.
+
+Тестирует добавление, обновление, удаление и рост таблицы RoutingIndex.
+"""
+import unittest
+import random
+import sys
+import os
+from string import ascii_letters
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from routing_index import RoutingIndex
+
+
+class TestRoutingIndex(unittest.TestCase):
+    """Тесты для RoutingIndex."""
+
+    def test_set_get(self):
+        """Тест добавления и поиска webhook."""
+        index = RoutingIndex()
+        index.set("abcdefghijklmnopqrst", -1001234567890, None)
+        index.set("tsrqponmlkjihgfedcba", 42, 7)
+
+        self.assertEqual(index.get("abcdefghijklmnopqrst"), {"channel_id": -1001234567890, "thread_id": None})
+        self.assertEqual(index.get("tsrqponmlkjihgfedcba"), {"channel_id": 42, "thread_id": 7})
+        self.assertIsNone(index.get("missing"))
+        self.assertEqual(len(index), 2)
+
+    def test_update_existing(self):
+        """Тест обновления существующего webhook."""
+        index = RoutingIndex()
+        index.set("hook", 1, None)
+        index.set("hook", 2, 3)
+
+        self.assertEqual(index.get("hook"), {"channel_id": 2, "thread_id": 3})
+        self.assertEqual(len(index), 1)
+
+    def test_delete(self):
+        """Тест удаления webhook."""
+        index = RoutingIndex()
+        index.set("hook", 1, None)
+
+        self.assertTrue(index.delete("hook"))
+        self.assertFalse(index.delete("hook"))
+        self.assertNotIn("hook", index)
+        self.assertEqual(len(index), 0)
+
+    def test_long_ids(self):
+        """Тест id длиннее размера ключа таблицы."""
+        index = RoutingIndex()
+        long_id = "https://example.com/github-webhook/" + "x" * 40
+        index.set(long_id, 5, None)
+
+        self.assertEqual(index.get(long_id)["channel_id"], 5)
+        self.assertTrue(index.delete(long_id))
+        self.assertIsNone(index.get(long_id))
+
+    def test_find_doc(self):
+        """Тест поиска webhook по _id документа, в том числе после роста таблицы."""
+        index = RoutingIndex(capacity=8)
+        for n in range(100):
+            index.set(f"hook{n}", n, None, n.to_bytes(12, "big"))
+        index.set("https://example.com/" + "x" * 40, 5, None, b"\xff" * 12)
+        index.delete("hook7")
+
+        self.assertEqual(index.find_doc((42).to_bytes(12, "big")), "hook42")
+        self.assertEqual(index.find_doc(b"\xff" * 12), "https://example.com/" + "x" * 40)
+        self.assertIsNone(index.find_doc((7).to_bytes(12, "big")))
+        self.assertEqual(len(list(index.items())), 100)
+
+    def test_find_doc_ignores_unaligned_match(self):
+        """Тест что совпадение на стыке двух _id не считается найденным."""
+        index = RoutingIndex(capacity=8)
+        index.set("a", 1, None, b"\x00" * 6 + b"\x01" * 6)
+        index.set("b", 2, None, b"\x02" * 6 + b"\x00" * 6)
+
+        self.assertIsNone(index.find_doc(b"\x01" * 6 + b"\x02" * 6))
+
+    def test_find_doc_under_churn(self):
+        """Тест поиска по _id при смене _id, удалениях и перестройках таблицы."""
+        rng = random.Random(2)
+        index = RoutingIndex(capacity=8)
+        docs = {}
+        for _ in range(5000):
+            webhook_id = f"hook{rng.randrange(200)}"
+            if rng.random() < 0.3:
+                index.delete(webhook_id)
+                docs.pop(webhook_id, None)
+            else:
+                doc_id = rng.randbytes(12)
+                index.set(webhook_id, 1, None, doc_id)
+                docs[webhook_id] = doc_id
+
+        for webhook_id, doc_id in docs.items():
+            self.assertEqual(index.find_doc(doc_id), webhook_id)
+        self.assertIsNone(index.find_doc(rng.randbytes(12)))
+        # Таблица _id не переполняется удаленными записями
+        self.assertLessEqual(index._doc_filled, index._capacity * RoutingIndex.MAX_LOAD)
+
+    def test_dumps_loads(self):
+        """Тест восстановления индекса из сериализованного вида."""
+        index = RoutingIndex(capacity=8)
+        for n in range(100):
+            index.set(f"hook{n}", n, n % 3 or None, n.to_bytes(12, "big"))
+        index.set("https://example.com/" + "x" * 40, 5, 6, b"\xff" * 12)
+        index.delete("hook7")
+
+        restored = RoutingIndex.loads(index.dumps())
+
+        self.assertEqual(sorted(restored.items()), sorted(index.items()))
+        self.assertEqual(restored.get("hook5"), {"channel_id": 5, "thread_id": 2})
+        self.assertIsNone(restored.get("hook7"))
+        with self.assertRaises(ValueError):
+            RoutingIndex.loads(index.dumps()[:100])
+
+    def test_matches_dict_under_churn(self):
+        """Тест совпадения с dict при росте таблицы и удалениях."""
+        rng = random.Random(1)
+        index = RoutingIndex(capacity=8)
+        expected = {}
+        ids = [''.join(rng.choices(ascii_letters, k=20)) for _ in range(2000)]
+
+        for step in range(10000):
+            webhook_id = rng.choice(ids)
+            if rng.random() < 0.3:
+                index.delete(webhook_id)
+                expected.pop(webhook_id, None)
+            else:
+                index.set(webhook_id, step, step % 5 or None)
+                expected[webhook_id] = {"channel_id": step, "thread_id": step % 5 or None}
+
+        self.assertEqual(len(index), len(expected))
+        for webhook_id in ids:
+            self.assertEqual(index.get(webhook_id), expected.get(webhook_id))
+
+
+if __name__ == "__main__":
+    unittest.main()
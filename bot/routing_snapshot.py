@@ -0,0 +1,238 @@
+"""
+Снимок таблицы маршрутизации webhooks на диске.
+
+Снимок — отсортированный по id webhook массив записей фиксированной длины
+(id, channel_id, thread_id). Процессы открывают файл через mmap только для
+чтения, поэтому все воркеры делят одни и те же страницы page cache и могут
+маршрутизировать события, пока MongoDB недоступна.
+
+Формат файла:
+    заголовок: magic (4 байта), версия (u16), резерв (u16), число записей (u64)
+    записи:    id (24 байта, дополнен нулями), channel_id (i64), thread_id (i64)
+
+thread_id == 0 означает отсутствие ветки форума.
+"""
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Any, AsyncIterable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"GHRS"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQ")
+RECORD = struct.Struct("<24sqq")
+ID_SIZE = 24
+
+
+def parse_thread_id(thread_id: Any) -> int:
+    """Преобразовать thread_id из документа webhook в int (0 — нет ветки)."""
+    if thread_id is None or thread_id == "None" or thread_id == "":
+        return 0
+    return int(thread_id)
+
+
+def write_snapshot(path: str, entries: Iterable[Tuple[str, int, int]]) -> int:
+    """
+    Атомарно записать снимок маршрутизации.
+
+    Файл пишется во временный файл рядом с path и подменяется через
+    os.replace, поэтому читатели всегда видят целый снимок.
+
+    Args:
+        path: Путь к файлу снимка
+        entries: Записи (id, channel_id, thread_id)
+
+    Returns:
+        Количество записанных записей
+    """
+    records = []
+    for webhook_id, channel_id, thread_id in entries:
+        key = webhook_id.encode()
+        if len(key) > ID_SIZE:
+            logger.warning(f"Id webhook слишком длинный для снимка: {webhook_id}")
+            continue
+        records.append((key.ljust(ID_SIZE, b"\0"), channel_id, thread_id))
+    records.sort()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".routing-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, len(records)))
+            for record in records:
+                f.write(RECORD.pack(*record))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    return len(records)
+
+
+async def dump_snapshot(routes: AsyncIterable[Dict[str, Any]], path: str) -> int:
+    """
+    Выгрузить таблицу маршрутизации из хранилища в снимок.
+
+    Args:
+        routes: Маршруты webhooks (url, channel_id, thread_id), см. WebhookStorage.iter_routes
+        path: Путь к файлу снимка
+
+    Returns:
+        Количество записанных записей
+    """
+    entries = []
+    async for doc in routes:
+        try:
+            entries.append((doc["url"], int(doc["channel_id"]), parse_thread_id(doc.get("thread_id"))))
+        except (KeyError, TypeError, ValueError):
+            logger.warning(f"Пропущен некорректный webhook при выгрузке снимка: {doc.get('url')}")
+
+    count = await asyncio.to_thread(write_snapshot, path, entries)
+    logger.info(f"Снимок маршрутизации записан: {count} webhooks")
+    return count
+
+
+class RoutingSnapshot:
+    """Отображенный в память снимок маршрутизации только для чтения."""
+
+    def __init__(self, path: str):
+        """
+        Инициализация снимка.
+
+        Args:
+            path: Путь к файлу снимка
+        """
+        self.path = path
+        self._mmap: Optional[mmap.mmap] = None
+        self._count = 0
+        self._stat_key: Optional[Tuple[int, int, int]] = None
+        self.loaded_at: Optional[float] = None
+        self.lookups = 0
+        self.found = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def reload(self) -> bool:
+        """
+        Переоткрыть файл снимка, если он изменился.
+
+        Returns:
+            True, если был загружен новый снимок
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+
+        stat_key = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if stat_key == self._stat_key:
+            return False
+
+        with open(self.path, "rb") as f:
+            if st.st_size < HEADER.size:
+                logger.error(f"Снимок маршрутизации поврежден: {self.path}")
+                return False
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, count = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC or version != VERSION or HEADER.size + count * RECORD.size > len(mapped):
+            logger.error(f"Неподдерживаемый снимок маршрутизации: {self.path}")
+            mapped.close()
+            return False
+
+        old = self._mmap
+        self._mmap, self._count, self._stat_key = mapped, count, stat_key
+        self.loaded_at = time.time()
+        if old is not None:
+            old.close()
+        logger.info(f"Загружен снимок маршрутизации: {count} webhooks")
+        return True
+
+    def lookup(self, webhook_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Найти настройки маршрутизации webhook бинарным поиском.
+
+        Args:
+            webhook_id: Id webhook
+
+        Returns:
+            Словарь с channel_id и thread_id или None
+        """
+        self.lookups += 1
+        if self._mmap is None:
+            return None
+
+        key = webhook_id.encode()
+        if len(key) > ID_SIZE:
+            return None
+        key = key.ljust(ID_SIZE, b"\0")
+
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = HEADER.size + mid * RECORD.size
+            record_key = self._mmap[offset:offset + ID_SIZE]
+            if record_key < key:
+                lo = mid + 1
+            elif record_key > key:
+                hi = mid
+            else:
+                _, channel_id, thread_id = RECORD.unpack_from(self._mmap, offset)
+                self.found += 1
+                return {"channel_id": channel_id, "thread_id": thread_id or None}
+        return None
+
+    def close(self) -> None:
+        """Закрыть отображение файла."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+            self._count = 0
+            self._stat_key = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Вернуть счетчики снимка."""
+        return {
+            "records": self._count,
+            "loaded_at": self.loaded_at,
+            "lookups": self.lookups,
+            "found": self.found,
+        }
+
+
+async def run_snapshot_refresher(
+    snapshot: RoutingSnapshot,
+    interval: float,
+    storage=None,
+) -> None:
+    """
+    Периодически обновлять снимок маршрутизации.
+
+    Если передано хранилище, процесс сам выгружает из него снимок
+    (достаточно одного такого процесса), иначе только перечитывает файл.
+
+    Args:
+        snapshot: Снимок для обновления
+        interval: Период обновления в секундах
+        storage: Хранилище webhooks для выгрузки (опционально)
+    """
+    while True:
+        if storage is not None:
+            try:
+                await dump_snapshot(storage.iter_routes(), snapshot.path)
+            except Exception as e:
+                logger.warning(f"Не удалось обновить снимок маршрутизации: {e}")
+        try:
+            snapshot.reload()
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке снимка маршрутизации: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,105 @@
+"""
+Тесты для снимка таблицы маршрутизации.
+
+Тестирует запись снимка, поиск по отображенному в память файлу
+и перечитывание обновленного снимка.
+"""
+import unittest
+import sys
+import os
+import tempfile
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from routing_snapshot import RoutingSnapshot, write_snapshot, dump_snapshot, parse_thread_id
+
+
+class AsyncCursor:
+    """Простой асинхронный курсор по списку документов."""
+
+    def __init__(self, docs):
+        self._docs = iter(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._docs)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class TestRoutingSnapshot(unittest.IsolatedAsyncioTestCase):
+    """Тесты для RoutingSnapshot."""
+
+    def setUp(self):
+        """Подготовка временного каталога."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "routing.snapshot")
+        self.snapshot = RoutingSnapshot(self.path)
+
+    def tearDown(self):
+        """Очистка после теста."""
+        self.snapshot.close()
+        self.tmpdir.cleanup()
+
+    def test_lookup(self):
+        """Тест поиска записей в снимке."""
+        write_snapshot(self.path, [
+            ("bbbbbbbbbbbbbbbbbbbb", -100123, 0),
+            ("aaaaaaaaaaaaaaaaaaaa", 42, 7),
+        ])
+        self.assertTrue(self.snapshot.reload())
+
+        self.assertEqual(len(self.snapshot), 2)
+        self.assertEqual(
+            self.snapshot.lookup("aaaaaaaaaaaaaaaaaaaa"),
+            {"channel_id": 42, "thread_id": 7},
+        )
+        self.assertEqual(
+            self.snapshot.lookup("bbbbbbbbbbbbbbbbbbbb"),
+            {"channel_id": -100123, "thread_id": None},
+        )
+        self.assertIsNone(self.snapshot.lookup("cccccccccccccccccccc"))
+
+    def test_missing_file(self):
+        """Тест работы без файла снимка."""
+        self.assertFalse(self.snapshot.reload())
+        self.assertIsNone(self.snapshot.lookup("aaaaaaaaaaaaaaaaaaaa"))
+
+    def test_reload_only_when_changed(self):
+        """Тест что неизмененный снимок не перечитывается."""
+        write_snapshot(self.path, [("a", 1, 0)])
+        self.assertTrue(self.snapshot.reload())
+        self.assertFalse(self.snapshot.reload())
+
+        write_snapshot(self.path, [("a", 1, 0), ("b", 2, 0)])
+        self.assertTrue(self.snapshot.reload())
+        self.assertEqual(self.snapshot.lookup("b")["channel_id"], 2)
+
+    def test_parse_thread_id(self):
+        """Тест разбора thread_id из документа webhook."""
+        self.assertEqual(parse_thread_id("None"), 0)
+        self.assertEqual(parse_thread_id(None), 0)
+        self.assertEqual(parse_thread_id("15"), 15)
+        self.assertEqual(parse_thread_id(15), 15)
+
+    async def test_dump_snapshot(self):
+        """Тест выгрузки снимка из коллекции."""
+        routes = AsyncCursor([
+            {"url": "hook1", "channel_id": 1, "thread_id": "None"},
+            {"url": "hook2", "channel_id": 2, "thread_id": "5"},
+            {"url": "broken", "channel_id": "x"},
+        ])
+
+        count = await dump_snapshot(routes, self.path)
+        self.snapshot.reload()
+
+        self.assertEqual(count, 2)
+        self.assertEqual(self.snapshot.lookup("hook2"), {"channel_id": 2, "thread_id": 5})
+
+
+if __name__ == "__main__":
+    unittest.main()
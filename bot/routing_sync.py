@@ -0,0 +1,368 @@
+"""
+Инкрементальная синхронизация таблицы маршрутизации через change streams.
+
+Таблица маршрутизации загружается из MongoDB один раз, после чего
+вставки, изменения и удаления в коллекции Webhooks применяются к ней
+по событиям change stream. Таблица периодически сохраняется на диск вместе
+с токеном возобновления, соответствующим ее состоянию: после перезапуска
+она читается из файла, а change stream продолжается с этого токена, так
+что коллекция заново не загружается. Таблица считается готовой, когда
+пропущенные события применены.
+
+Change streams требуют replica set (достаточно одного узла).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import struct
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+
+from routing_index import ID_SIZE, RoutingIndex
+from routing_snapshot import parse_thread_id
+
+logger = logging.getLogger(__name__)
+
+# Коды ошибок, после которых продолжить с сохраненного токена нельзя
+CHANGE_STREAM_HISTORY_LOST = 286
+INVALID_RESUME_TOKEN = 260
+
+# Файл состояния: сигнатура, версия, длина токена; затем токен (JSON) и индекс
+STATE_MAGIC = b"GHRW"
+STATE_VERSION = 1
+STATE_HEADER = struct.Struct("<4sHI")
+
+
+def doc_key(doc_id: Hashable) -> bytes:
+    """
+    Ключ _id документа для RoutingIndex.
+
+    ObjectId хранится как есть (12 байт); другие _id (старые записи,
+    тесты) — как хэш их представления того же размера.
+    """
+    if isinstance(doc_id, ObjectId):
+        return doc_id.binary
+    return hashlib.blake2b(repr(doc_id).encode(), digest_size=ID_SIZE).digest()
+
+
+class RoutingTable:
+    """Таблица маршрутизации webhooks в памяти процесса."""
+
+    def __init__(self):
+        """Инициализация пустой таблицы."""
+        self._routes = RoutingIndex()
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Получить настройки маршрутизации webhook."""
+        return self._routes.get(url)
+
+    def upsert(self, doc: Dict[str, Any]) -> None:
+        """
+        Добавить или обновить webhook по документу коллекции.
+
+        Args:
+            doc: Документ с полями _id, url, channel_id, thread_id
+        """
+        key = doc_key(doc["_id"])
+        url = doc.get("url")
+        old_url = self._routes.find_doc(key)
+        if old_url is not None and old_url != url:
+            self._routes.delete(old_url)
+        if url is not None:
+            self._set(doc, key)
+
+    def load(self, doc: Dict[str, Any]) -> None:
+        """
+        Добавить webhook при начальной загрузке, без поиска старого url.
+
+        Args:
+            doc: Документ с полями _id, url, channel_id, thread_id
+        """
+        if doc.get("url") is not None:
+            self._set(doc, doc_key(doc["_id"]))
+
+    def _set(self, doc: Dict[str, Any], key: bytes) -> None:
+        """Записать маршрут документа в индекс."""
+        channel_id = int(doc["channel_id"])
+        thread_id = parse_thread_id(doc.get("thread_id"))
+        self._routes.set(doc["url"], channel_id, thread_id, key)
+
+    def delete(self, doc_id: Hashable) -> None:
+        """Удалить webhook по _id документа."""
+        url = self._routes.find_doc(doc_key(doc_id))
+        if url is not None:
+            self._routes.delete(url)
+
+    def clear(self) -> None:
+        """Очистить таблицу."""
+        self._routes.clear()
+        self.ready = False
+
+    def dumps(self) -> bytes:
+        """Сериализовать таблицу."""
+        return self._routes.dumps()
+
+    def restore(self, data: bytes) -> None:
+        """
+        Заменить содержимое таблицы сериализованным в dumps.
+
+        Raises:
+            ValueError: Данные повреждены
+        """
+        self._routes = RoutingIndex.loads(data)
+        self.ready = False
+
+
+def write_state(path: str, token: Dict[str, Any], data: bytes) -> None:
+    """
+    Атомарно записать файл состояния.
+
+    Args:
+        path: Путь к файлу
+        token: Токен возобновления, соответствующий таблице
+        data: Сериализованная таблица (RoutingTable.dumps)
+    """
+    token_bytes = json.dumps(token).encode()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(STATE_HEADER.pack(STATE_MAGIC, STATE_VERSION, len(token_bytes)))
+        f.write(token_bytes)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_state(path: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+    """
+    Прочитать файл состояния.
+
+    Returns:
+        (токен, сериализованная таблица) или None, если файла нет
+
+    Raises:
+        ValueError: Файл поврежден или другой версии
+    """
+    try:
+        with open(path, "rb") as f:
+            content = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        magic, version, token_length = STATE_HEADER.unpack_from(content)
+    except struct.error as e:
+        raise ValueError(f"файл состояния поврежден: {e}") from e
+    if magic != STATE_MAGIC or version != STATE_VERSION:
+        raise ValueError("неизвестный формат файла состояния")
+    offset = STATE_HEADER.size
+    token = json.loads(content[offset:offset + token_length])
+    return token, content[offset + token_length:]
+
+
+class RoutingWatcher:
+    """Фоновый наблюдатель за коллекцией Webhooks."""
+
+    PROJECTION = {"url": 1, "channel_id": 1, "thread_id": 1}
+
+    def __init__(
+        self,
+        coll_webhooks,
+        table: RoutingTable,
+        state_path: Optional[str] = None,
+        checkpoint_interval: float = 60.0,
+        retry_delay: float = 5.0,
+    ):
+        """
+        Инициализация наблюдателя.
+
+        Args:
+            coll_webhooks: Коллекция Webhooks
+            table: Таблица маршрутизации для обновления
+            state_path: Файл для сохранения таблицы и токена возобновления
+            checkpoint_interval: Минимальный интервал сохранения состояния, с
+            retry_delay: Пауза перед переподключением после ошибки
+        """
+        self.coll = coll_webhooks
+        self.table = table
+        self.state_path = state_path
+        self.checkpoint_interval = checkpoint_interval
+        self.retry_delay = retry_delay
+        self._token: Optional[Dict[str, Any]] = None
+        self._saved_token: Optional[Dict[str, Any]] = None
+        self._saved_at = 0.0
+        self._loaded = False
+        self.events = 0
+        self.full_loads = 0
+        self.restores = 0
+        self.restarts = 0
+
+    async def _restore(self) -> None:
+        """Прочитать таблицу и токен из файла состояния, если он есть."""
+        if not self.state_path:
+            return
+        try:
+            state = await asyncio.to_thread(read_state, self.state_path)
+            if state is None:
+                return
+            token, data = state
+            self.table.restore(data)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать состояние таблицы маршрутизации: {e}")
+            return
+        self._token = self._saved_token = token
+        self._loaded = True
+        self.restores += 1
+        logger.info(f"Таблица маршрутизации восстановлена из файла: {len(self.table)} webhooks")
+
+    def _write_state(self, token: Dict[str, Any], data: bytes) -> None:
+        """Записать состояние; ошибки записи только логируются."""
+        try:
+            write_state(self.state_path, token, data)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить состояние таблицы маршрутизации: {e}")
+            return
+        self._saved_token = token
+
+    def _take_state(self) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        """Снять состояние для записи или None, если записывать нечего."""
+        if not self.state_path or not self._loaded or self._token is None or self._token == self._saved_token:
+            return None
+        # Таблица и токен снимаются без await между ними и соответствуют друг другу
+        return self._token, self.table.dumps()
+
+    async def _checkpoint(self) -> None:
+        """Сохранить состояние не чаще checkpoint_interval."""
+        now = time.monotonic()
+        if now - self._saved_at < self.checkpoint_interval:
+            return
+        self._saved_at = now
+        state = self._take_state()
+        if state is not None:
+            await asyncio.to_thread(self._write_state, *state)
+
+    def _reset(self) -> None:
+        """Забыть таблицу и токен: следующий запуск загрузит все заново."""
+        self._loaded = False
+        self.table.clear()
+        self._token = None
+        self._saved_token = None
+        if self.state_path:
+            try:
+                os.unlink(self.state_path)
+            except FileNotFoundError:
+                pass
+
+    async def _full_load(self) -> None:
+        """Загрузить всю таблицу маршрутизации из коллекции."""
+        self.table.clear()
+        async for doc in self.coll.find({}, self.PROJECTION):
+            try:
+                self.table.load(doc)
+            except (KeyError, TypeError, ValueError):
+                logger.warning(f"Пропущен некорректный webhook: {doc.get('url')}")
+        self.full_loads += 1
+        logger.info(f"Таблица маршрутизации загружена: {len(self.table)} webhooks")
+
+    def apply(self, change: Dict[str, Any]) -> bool:
+        """
+        Применить событие change stream к таблице.
+
+        Args:
+            change: Событие change stream
+
+        Returns:
+            False, если коллекция удалена или поток инвалидирован
+            и таблицу нужно загрузить заново
+        """
+        self.events += 1
+        operation = change.get("operationType")
+        if operation in ("insert", "update", "replace"):
+            doc = change.get("fullDocument")
+            if doc is None:
+                # Документ удален до того, как событие было прочитано
+                self.table.delete(change["documentKey"]["_id"])
+            else:
+                try:
+                    self.table.upsert(doc)
+                except (KeyError, TypeError, ValueError):
+                    logger.warning(f"Пропущен некорректный webhook: {doc.get('url')}")
+        elif operation == "delete":
+            self.table.delete(change["documentKey"]["_id"])
+        elif operation in ("drop", "rename", "dropDatabase", "invalidate"):
+            self.table.clear()
+            return False
+        return True
+
+    async def _watch_once(self) -> None:
+        """Открыть change stream и обрабатывать события до ошибки."""
+        if not self._loaded:
+            await self._restore()
+        # Без сохраненного состояния поток открывается до загрузки, чтобы
+        # не потерять изменения, произошедшие во время чтения коллекции.
+        # Повторно примененные события не меняют результат.
+        stream = await self.coll.watch(
+            full_document="updateLookup",
+            resume_after=self._token,
+            max_await_time_ms=1000,
+        )
+        try:
+            if not self._loaded:
+                await self._full_load()
+                self._loaded = True
+
+            while True:
+                change = await stream.try_next()
+                if change is not None:
+                    if not self.apply(change):
+                        self._reset()
+                        return
+                elif not self.table.ready:
+                    # Пропущенные события применены — таблица актуальна
+                    self.table.ready = True
+                self._token = stream.resume_token
+                await self._checkpoint()
+        finally:
+            self.table.ready = False
+            await stream.close()
+
+    async def run(self) -> None:
+        """Наблюдать за коллекцией, переподключаясь после ошибок."""
+        try:
+            while True:
+                try:
+                    await self._watch_once()
+                except OperationFailure as e:
+                    if e.code in (CHANGE_STREAM_HISTORY_LOST, INVALID_RESUME_TOKEN):
+                        logger.warning("Токен change stream устарел, таблица будет перезагружена")
+                        self._reset()
+                    else:
+                        logger.error(f"Ошибка change stream: {e}")
+                        await asyncio.sleep(self.retry_delay)
+                except PyMongoError as e:
+                    logger.error(f"Ошибка change stream: {e}")
+                    await asyncio.sleep(self.retry_delay)
+                self.restarts += 1
+        finally:
+            state = self._take_state()
+            if state is not None:
+                self._write_state(*state)
+
+    def stats(self) -> Dict[str, Any]:
+        """Вернуть счетчики наблюдателя."""
+        return {
+            "ready": self.table.ready,
+            "webhooks": len(self.table),
+            "events": self.events,
+            "full_loads": self.full_loads,
+            "restores": self.restores,
+            "restarts": self.restarts,
+        }
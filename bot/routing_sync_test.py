@@ -0,0 +1,189 @@
+"""
+Тесты для синхронизации таблицы маршрутизации через change streams.
+
+Тестирует применение событий к таблице, начальную загрузку
+и возобновление по сохраненному состоянию.
+"""
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+import sys
+import os
+import tempfile
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+from routing_sync import RoutingTable, RoutingWatcher, read_state
+from routing_snapshot_test import AsyncCursor
+
+
+class TestRoutingTable(unittest.TestCase):
+    """Тесты для RoutingTable."""
+
+    def test_upsert_and_delete(self):
+        """Тест добавления и удаления webhook."""
+        table = RoutingTable()
+        table.upsert({"_id": 1, "url": "hook", "channel_id": 10, "thread_id": "None"})
+
+        self.assertEqual(table.get("hook"), {"channel_id": 10, "thread_id": None})
+
+        table.delete(1)
+        self.assertIsNone(table.get("hook"))
+        self.assertEqual(len(table), 0)
+
+    def test_url_change(self):
+        """Тест изменения url у существующего документа."""
+        table = RoutingTable()
+        table.upsert({"_id": 1, "url": "old", "channel_id": 10, "thread_id": "3"})
+        table.upsert({"_id": 1, "url": "new", "channel_id": 10, "thread_id": "3"})
+
+        self.assertIsNone(table.get("old"))
+        self.assertEqual(table.get("new")["thread_id"], 3)
+
+    def test_object_ids(self):
+        """Тест удаления и смены url по ObjectId."""
+        table = RoutingTable()
+        first, second = ObjectId(), ObjectId()
+        table.load({"_id": first, "url": "one", "channel_id": 1, "thread_id": None})
+        table.load({"_id": second, "url": "two", "channel_id": 2, "thread_id": None})
+
+        table.upsert({"_id": first, "url": "three", "channel_id": 1, "thread_id": None})
+        table.delete(second)
+
+        self.assertIsNone(table.get("one"))
+        self.assertIsNone(table.get("two"))
+        self.assertEqual(table.get("three")["channel_id"], 1)
+        self.assertEqual(len(table), 1)
+
+
+class TestRoutingWatcher(unittest.IsolatedAsyncioTestCase):
+    """Тесты для RoutingWatcher."""
+
+    def setUp(self):
+        """Подготовка коллекции и change stream."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.state_path = os.path.join(self.tmpdir.name, "routing.state")
+        self.stream = MagicMock()
+        self.stream.close = AsyncMock()
+        self.stream.resume_token = {"_data": "token1"}
+        self.coll = MagicMock()
+        self.coll.watch = AsyncMock(return_value=self.stream)
+        self.coll.find = MagicMock(side_effect=lambda *args: AsyncCursor([
+            {"_id": 1, "url": "hook1", "channel_id": 10, "thread_id": "None"},
+        ]))
+        self.table = RoutingTable()
+        self.watcher = self.make_watcher(self.table)
+
+    def make_watcher(self, table):
+        """Создать наблюдатель с общим файлом состояния."""
+        return RoutingWatcher(self.coll, table, state_path=self.state_path, checkpoint_interval=0)
+
+    def tearDown(self):
+        """Очистка после теста."""
+        self.tmpdir.cleanup()
+
+    async def test_load_and_apply_changes(self):
+        """Тест начальной загрузки, применения событий и сохранения состояния."""
+        self.stream.try_next = AsyncMock(side_effect=[
+            {"operationType": "insert", "documentKey": {"_id": 2},
+             "fullDocument": {"_id": 2, "url": "hook2", "channel_id": 20, "thread_id": "5"}},
+            None,
+            {"operationType": "delete", "documentKey": {"_id": 1}},
+            PyMongoError("connection lost"),
+        ])
+
+        with self.assertRaises(PyMongoError):
+            await self.watcher._watch_once()
+
+        self.assertIsNone(self.table.get("hook1"))
+        self.assertEqual(self.table.get("hook2"), {"channel_id": 20, "thread_id": 5})
+        self.assertFalse(self.table.ready)
+        self.assertEqual(self.watcher.full_loads, 1)
+        token, _ = read_state(self.state_path)
+        self.assertEqual(token, {"_data": "token1"})
+
+    async def test_ready_after_first_batch(self):
+        """Тест что таблица готова только после применения пропущенных событий."""
+        ready = []
+
+        async def try_next():
+            ready.append(self.table.ready)
+            if len(ready) == 1:
+                return {"operationType": "delete", "documentKey": {"_id": 1}}
+            if len(ready) == 2:
+                return None
+            raise PyMongoError("lost")
+
+        self.stream.try_next = try_next
+        with self.assertRaises(PyMongoError):
+            await self.watcher._watch_once()
+
+        self.assertEqual(ready, [False, False, True])
+
+    async def test_resume_without_reload(self):
+        """Тест возобновления потока без повторной загрузки."""
+        self.stream.try_next = AsyncMock(side_effect=[None, PyMongoError("lost")])
+        with self.assertRaises(PyMongoError):
+            await self.watcher._watch_once()
+
+        self.stream.try_next = AsyncMock(side_effect=[PyMongoError("lost")])
+        with self.assertRaises(PyMongoError):
+            await self.watcher._watch_once()
+
+        self.assertEqual(self.watcher.full_loads, 1)
+        self.assertEqual(self.coll.watch.call_args.kwargs["resume_after"], {"_data": "token1"})
+
+    async def test_restart_resumes_from_state(self):
+        """Тест что после перезапуска таблица читается из файла, а поток продолжается с токена."""
+        self.stream.try_next = AsyncMock(side_effect=[
+            {"operationType": "insert", "documentKey": {"_id": 2},
+             "fullDocument": {"_id": 2, "url": "hook2", "channel_id": 20, "thread_id": "5"}},
+            None,
+            PyMongoError("lost"),
+        ])
+        with self.assertRaises(PyMongoError):
+            await self.watcher._watch_once()
+
+        table = RoutingTable()
+        watcher = self.make_watcher(table)
+        self.coll.find.reset_mock()
+        self.stream.try_next = AsyncMock(side_effect=[
+            {"operationType": "delete", "documentKey": {"_id": 1}},
+            PyMongoError("lost"),
+        ])
+        with self.assertRaises(PyMongoError):
+            await watcher._watch_once()
+
+        self.coll.find.assert_not_called()
+        self.assertEqual(watcher.full_loads, 0)
+        self.assertEqual(watcher.restores, 1)
+        self.assertEqual(self.coll.watch.call_args.kwargs["resume_after"], {"_data": "token1"})
+        self.assertIsNone(table.get("hook1"))
+        self.assertEqual(table.get("hook2"), {"channel_id": 20, "thread_id": 5})
+
+    async def test_corrupt_state_is_reloaded(self):
+        """Тест полной загрузки, если файл состояния поврежден."""
+        with open(self.state_path, "wb") as f:
+            f.write(b"garbage")
+        self.stream.try_next = AsyncMock(side_effect=[PyMongoError("lost")])
+
+        with self.assertRaises(PyMongoError):
+            await self.watcher._watch_once()
+
+        self.assertEqual(self.watcher.full_loads, 1)
+        self.assertIsNone(self.coll.watch.call_args.kwargs["resume_after"])
+
+    async def test_drop_resets_table(self):
+        """Тест что удаление коллекции сбрасывает таблицу и состояние."""
+        self.stream.try_next = AsyncMock(side_effect=[None, {"operationType": "drop"}])
+
+        await self.watcher._watch_once()
+
+        self.assertEqual(len(self.table), 0)
+        self.assertFalse(os.path.exists(self.state_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
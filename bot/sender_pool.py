@@ -0,0 +1,114 @@
+"""
+Пул отправителей: порядок внутри чата, параллельность между чатами.
+
+У каждого чата своя очередь задач, и в каждый момент времени задачу чата
+выполняет не больше одного обработчика, поэтому сообщения в чат уходят в
+порядке постановки. Разные чаты обслуживаются параллельно, до concurrency
+одновременно. После каждой задачи чат встает в конец очереди готовых,
+так что медленный или ограниченный 429 чат занимает не больше одного
+обработчика и не задерживает остальные.
+"""
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+
+class OrderedSender:
+    """Обработчики задач с порядком по ключу."""
+
+    def __init__(self, concurrency: int = 32):
+        """
+        Инициализация.
+
+        Args:
+            concurrency: Максимум одновременно обслуживаемых ключей (чатов)
+        """
+        self.concurrency = concurrency
+        self._queues: Dict[Hashable, Deque[Tuple[Callable[[], Awaitable[Any]], asyncio.Future]]] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _start(self) -> None:
+        """Запустить обработчики в текущем event loop."""
+        self._ready = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Выполнить fn после всех ранее поставленных задач того же ключа.
+
+        Задача ставится в очередь при вызове, до первого await.
+
+        Args:
+            key: Ключ порядка, например ID чата
+            fn: Функция без аргументов, возвращающая корутину
+
+        Returns:
+            Результат fn
+        """
+        if not self._workers:
+            self._start()
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            self._ready.put_nowait(key)
+        queue.append((fn, future))
+        return await future
+
+    async def _worker(self) -> None:
+        """Брать готовый ключ и выполнять его следующую задачу."""
+        while True:
+            key = await self._ready.get()
+            queue = self._queues[key]
+            fn, future = queue.popleft()
+            if not future.cancelled():
+                self.active += 1
+                try:
+                    result = await fn()
+                except asyncio.CancelledError:
+                    future.cancel()
+                    # Отмена самого обработчика (close) — выйти; отмена внутри
+                    # fn — отказ этой задачи, очередь ключа обслуживается дальше
+                    if asyncio.current_task().cancelling():
+                        raise
+                except Exception as e:
+                    self.failed += 1
+                    if not future.cancelled():
+                        future.set_exception(e)
+                else:
+                    self.completed += 1
+                    if not future.cancelled():
+                        future.set_result(result)
+                finally:
+                    self.active -= 1
+            # Ключ с оставшимися задачами — в конец очереди готовых
+            if queue:
+                self._ready.put_nowait(key)
+            else:
+                del self._queues[key]
+
+    async def close(self) -> None:
+        """Остановить обработчики; невыполненные задачи отменяются."""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for queue in self._queues.values():
+            for _, future in queue:
+                future.cancel()
+        self._queues.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Вернуть загрузку пула."""
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "keys": len(self._queues),
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "completed": self.completed,
+            "failed": self.failed,
+        }
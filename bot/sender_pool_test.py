@@ -0,0 +1,121 @@
+"""
+Тесты для пула отправителей.
+
+Тестирует порядок задач внутри ключа, параллельность между ключами,
+ограничение concurrency и независимость от медленного ключа.
+"""
+import asyncio
+import unittest
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sender_pool import OrderedSender
+
+
+class TestOrderedSender(unittest.IsolatedAsyncioTestCase):
+    """Тесты для OrderedSender."""
+
+    async def asyncTearDown(self):
+        """Остановить обработчики."""
+        await self.pool.close()
+
+    async def test_order_within_key(self):
+        """Тест что задачи одного чата выполняются по порядку и не параллельно."""
+        self.pool = OrderedSender(concurrency=4)
+        done = []
+        running = set()
+
+        def job(i):
+            async def run():
+                self.assertNotIn(-1, running)
+                running.add(-1)
+                await asyncio.sleep(0.001 * (5 - i))
+                running.discard(-1)
+                done.append(i)
+                return i
+            return run
+
+        results = await asyncio.gather(*(self.pool.run(-1, job(i)) for i in range(5)))
+
+        self.assertEqual(done, [0, 1, 2, 3, 4])
+        self.assertEqual(results, [0, 1, 2, 3, 4])
+
+    async def test_slow_chat_does_not_block_others(self):
+        """Тест что медленный чат не задерживает остальные."""
+        self.pool = OrderedSender(concurrency=2)
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+
+        async def fast():
+            return "ok"
+
+        slow_tasks = [asyncio.create_task(self.pool.run(-1, slow)) for _ in range(3)]
+        result = await asyncio.wait_for(self.pool.run(-2, fast), timeout=1)
+
+        self.assertEqual(result, "ok")
+        self.assertEqual(self.pool.stats()["active"], 1)
+        release.set()
+        await asyncio.gather(*slow_tasks)
+
+    async def test_concurrency_limit(self):
+        """Тест что одновременно обслуживается не больше concurrency чатов."""
+        self.pool = OrderedSender(concurrency=3)
+        active = 0
+        peak = 0
+
+        async def job():
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.001)
+            active -= 1
+
+        await asyncio.gather(*(self.pool.run(chat_id, job) for chat_id in range(10)))
+
+        self.assertEqual(peak, 3)
+        self.assertEqual(self.pool.stats()["completed"], 10)
+        self.assertEqual(self.pool.stats()["keys"], 0)
+
+    async def test_error_passed_to_caller(self):
+        """Тест что ошибка задачи доходит до вызывающего и не останавливает чат."""
+        self.pool = OrderedSender(concurrency=1)
+
+        async def fail():
+            raise RuntimeError("403")
+
+        async def ok():
+            return "sent"
+
+        results = await asyncio.gather(self.pool.run(-1, fail), self.pool.run(-1, ok), return_exceptions=True)
+
+        self.assertIsInstance(results[0], RuntimeError)
+        self.assertEqual(results[1], "sent")
+        self.assertEqual(self.pool.stats()["failed"], 1)
+
+    async def test_cancelled_task_does_not_stop_worker(self):
+        """Тест что отмена внутри задачи отменяет только ее, а чат обслуживается дальше."""
+        self.pool = OrderedSender(concurrency=1)
+
+        async def cancelled():
+            raise asyncio.CancelledError()
+
+        async def ok():
+            return "sent"
+
+        results = await asyncio.wait_for(
+            asyncio.gather(self.pool.run(-1, cancelled), self.pool.run(-1, ok), return_exceptions=True),
+            timeout=1,
+        )
+
+        self.assertIsInstance(results[0], asyncio.CancelledError)
+        self.assertEqual(results[1], "sent")
+        self.assertEqual(self.pool.stats()["keys"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+Объединение одновременных одинаковых запросов.
+
+Если несколько корутин одновременно запрашивают один и тот же ключ,
+запрос выполняется один раз, а остальные ждут его результата.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Дедупликация выполняющихся запросов по ключу."""
+
+    def __init__(self):
+        """Инициализация без выполняющихся запросов."""
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Выполнить fn или дождаться уже выполняющегося запроса с тем же ключом.
+
+        Исключение запроса получают все ожидающие его корутины.
+
+        Args:
+            key: Ключ запроса
+            fn: Функция без аргументов, возвращающая корутину
+
+        Returns:
+            Результат запроса
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            # Запрос выполняется отдельной задачей: отмена первого вызывающего
+            # не должна прерывать запрос для остальных
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Future) -> None:
+        """Убрать завершенный запрос из списка выполняющихся."""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Помечаем исключение полученным, даже если все ожидающие отменены
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """Вернуть счетчики запросов."""
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,82 @@
+"""
+Тесты для объединения одновременных запросов.
+
+Тестирует SingleFlight: общий результат, общую ошибку и отмену.
+"""
+import unittest
+import asyncio
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    """Тесты для SingleFlight."""
+
+    async def test_concurrent_calls_share_result(self):
+        """Тест что одновременные вызовы выполняют запрос один раз."""
+        group = SingleFlight()
+        calls = 0
+
+        async def lookup():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "value"
+
+        results = await asyncio.gather(*(group.do("key", lookup) for _ in range(10)))
+
+        self.assertEqual(results, ["value"] * 10)
+        self.assertEqual(calls, 1)
+        self.assertEqual(group.stats(), {"calls": 1, "coalesced": 9, "inflight": 0})
+
+    async def test_error_shared(self):
+        """Тест что ошибка передается всем ожидающим."""
+        group = SingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(
+            *(group.do("key", failing) for _ in range(3)), return_exceptions=True
+        )
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    async def test_sequential_calls_not_coalesced(self):
+        """Тест что последовательные вызовы выполняются заново."""
+        group = SingleFlight()
+
+        async def lookup():
+            return 1
+
+        await group.do("key", lookup)
+        await asyncio.sleep(0)
+        await group.do("key", lookup)
+
+        self.assertEqual(group.calls, 2)
+
+    async def test_leader_cancellation_does_not_cancel_waiters(self):
+        """Тест что отмена первого вызывающего не прерывает запрос."""
+        group = SingleFlight()
+
+        async def lookup():
+            await asyncio.sleep(0.02)
+            return "value"
+
+        leader = asyncio.create_task(group.do("key", lookup))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(group.do("key", lookup))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await follower, "value")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,20 @@
+"""Хранилища webhooks: MongoDB и PostgreSQL."""
+
+from .base import DatabaseUnavailable, WebhookIdCollision, WebhookStorage
+from .mongo import MongoStorage
+from .postgres import PostgresStorage
+
+
+def is_postgres_url(db_url: str) -> bool:
+    """Указывает ли строка подключения на PostgreSQL."""
+    return db_url.startswith(("postgresql://", "postgres://"))
+
+
+__all__ = [
+    "DatabaseUnavailable",
+    "WebhookIdCollision",
+    "WebhookStorage",
+    "MongoStorage",
+    "PostgresStorage",
+    "is_postgres_url",
+]
@@ -0,0 +1,145 @@
+"""
+Интерфейс хранилища webhooks.
+
+Слой db работает с хранилищем только через этот интерфейс, поэтому
+кэши, фильтры и метрики одинаково работают с любой реализацией.
+"""
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from pymongo.errors import ConnectionFailure
+
+
+class DatabaseUnavailable(ConnectionFailure):
+    """Хранилище не подключено или недоступно; запрос отклонен без ожидания."""
+
+
+class WebhookIdCollision(Exception):
+    """Сгенерированный id webhook уже занят (нарушен уникальный индекс по url)."""
+
+
+class WebhookStorage(ABC):
+    """Хранилище webhooks."""
+
+    name = "base"
+
+    async def connect(self) -> None:
+        """Подготовить хранилище к работе (пул соединений, схема)."""
+
+    async def close(self) -> None:
+        """Освободить соединения."""
+
+    def is_ready(self) -> bool:
+        """Доступно ли хранилище."""
+        return True
+
+    @abstractmethod
+    async def add(
+        self,
+        name: str,
+        url: str,
+        author_id: int,
+        channel_id: int,
+        thread_id: Any,
+        secret: Optional[str] = None,
+    ) -> None:
+        """Сохранить webhook."""
+
+    @abstractmethod
+    async def upsert(
+        self,
+        name: str,
+        url: str,
+        author_id: int,
+        channel_id: int,
+        thread_id: Any,
+        secret: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Создать или заменить webhook пользователя с этим названием одним запросом.
+
+        Returns:
+            url замененного webhook или None, если webhook создан
+
+        Raises:
+            WebhookIdCollision: url уже занят другим webhook
+        """
+
+    @abstractmethod
+    async def get_message_settings(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Получить настройки маршрутизации webhook.
+
+        Returns:
+            Словарь с channel_id и thread_id или None
+        """
+
+    @abstractmethod
+    async def get_user_webhooks(
+        self,
+        user_id: int,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Получить webhooks пользователя (поля id и webhook_name) по возрастанию названия.
+
+        Постраничный перебор по ключу (author_id, webhook_name): стоимость
+        запроса зависит от limit, а не от общего числа webhooks.
+
+        Args:
+            user_id: ID пользователя
+            after: Вернуть webhooks с названием больше указанного
+            before: Вернуть последние webhooks с названием меньше указанного
+            limit: Максимальное количество webhooks (None — все)
+        """
+
+    @abstractmethod
+    async def get_webhook(self, webhook_name: str, author_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Получить webhook по названию одним запросом по индексу.
+
+        Args:
+            webhook_name: Название webhook
+            author_id: Искать только среди webhooks этого пользователя
+        """
+
+    @abstractmethod
+    async def get_webhook_by_id(self, webhook_id: str, author_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Получить webhook пользователя по первичному ключу.
+
+        Args:
+            webhook_id: Первичный ключ webhook в виде строки (поле id в get_user_webhooks)
+            author_id: ID владельца; webhook другого пользователя не найдется
+
+        Returns:
+            Webhook или None, если не найден или id некорректен
+        """
+
+    @abstractmethod
+    async def delete_webhook_by_id(self, webhook_id: str, author_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Удалить webhook пользователя по первичному ключу.
+
+        Returns:
+            webhook_name, url и author_id удаленного webhook или None
+        """
+
+    @abstractmethod
+    async def delete_webhook(self, webhook_name: str, author_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Удалить webhook по названию.
+
+        Args:
+            webhook_name: Название webhook
+            author_id: Удалять только среди webhooks этого пользователя
+
+        Returns:
+            url и author_id удаленного webhook или None, если webhook не найден
+        """
+
+    @abstractmethod
+    def iter_routes(self) -> AsyncIterator[Dict[str, Any]]:
+        """Перебрать маршруты всех webhooks (url, channel_id, thread_id)."""
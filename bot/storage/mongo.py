@@ -0,0 +1,192 @@
+"""
+Хранилище webhooks в MongoDB.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from bson import Int64, ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from routing_snapshot import parse_thread_id
+
+from .base import WebhookIdCollision, WebhookStorage
+
+# Версия схемы документа webhook:
+#   0 — channel_id как ввел пользователь, thread_id строкой ("None" или число)
+#   1 — channel_id int64, thread_id int или null
+# Документы версии 0 переводит migrate_db.py
+SCHEMA_VERSION = 1
+
+# url удаленных и замененных webhooks для сброса кэшей в других процессах;
+# записи удаляются TTL индексом (см. init_db.py)
+TOMBSTONES_COLLECTION = "WebhookTombstones"
+TOMBSTONES_TTL_SECONDS = 24 * 3600
+
+logger = logging.getLogger(__name__)
+
+
+def typed_route(channel_id: Any, thread_id: Any) -> Dict[str, Any]:
+    """Поля маршрута в формате текущей версии схемы."""
+    return {
+        'channel_id': Int64(int(channel_id)),
+        'thread_id': parse_thread_id(thread_id) or None,
+        'schema_version': SCHEMA_VERSION,
+    }
+
+
+def write_stamp() -> Dict[str, Any]:
+    """
+    Время записи документа.
+
+    Ставится при каждой вставке и замене: по нему другие процессы
+    дозагружают изменившиеся webhooks (см. KnownWebhooks.refresh),
+    в том числе замененные с сохранением _id.
+    """
+    return {'updated_at': datetime.now(timezone.utc)}
+
+
+def _typed_settings(doc: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Привести маршрут еще не мигрированного документа к типам схемы 1."""
+    if doc is not None and isinstance(doc.get('thread_id'), str):
+        doc['thread_id'] = parse_thread_id(doc['thread_id']) or None
+    return doc
+
+
+def _name_query(webhook_name: str, author_id: Optional[int]) -> Dict[str, Any]:
+    """Условие поиска webhook по названию (с author_id — по индексу author_id_webhook_name)."""
+    if author_id is None:
+        return {'webhook_name': webhook_name}
+    return {'author_id': author_id, 'webhook_name': webhook_name}
+
+
+def _id_query(webhook_id: str, author_id: int) -> Optional[Dict[str, Any]]:
+    """Условие поиска webhook пользователя по _id или None, если id некорректен."""
+    try:
+        return {'_id': ObjectId(webhook_id), 'author_id': author_id}
+    except (InvalidId, TypeError):
+        return None
+
+
+def _with_id(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Заменить ObjectId в поле _id на строковое поле id."""
+    if '_id' in doc:
+        doc['id'] = str(doc.pop('_id'))
+    return doc
+
+
+WEBHOOK_FIELDS = {'webhook_name': 1, 'url': 1, 'author_id': 1, 'channel_id': 1, 'thread_id': 1, '_id': 0}
+
+
+class MongoStorage(WebhookStorage):
+    """Хранилище webhooks в коллекции MongoDB."""
+
+    name = "mongodb"
+
+    def __init__(self, get_collection: Callable[[], Any]):
+        """
+        Инициализация хранилища.
+
+        Args:
+            get_collection: Функция, возвращающая коллекцию Webhooks
+                или выбрасывающая DatabaseUnavailable
+        """
+        self._collection = get_collection
+
+    async def add(self, name, url, author_id, channel_id, thread_id, secret=None) -> None:
+        await self._collection().insert_one({
+            'webhook_name': name,
+            'url': url,
+            'author_id': author_id,
+            **typed_route(channel_id, thread_id),
+            'secret': secret,
+            **write_stamp(),
+        })
+
+    async def upsert(self, name, url, author_id, channel_id, thread_id, secret=None) -> Optional[str]:
+        try:
+            previous = await self._collection().find_one_and_update(
+                {'author_id': author_id, 'webhook_name': name},
+                {'$set': {'url': url, **typed_route(channel_id, thread_id), 'secret': secret, **write_stamp()}},
+                projection={'url': 1, '_id': 0},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+        except DuplicateKeyError as e:
+            raise WebhookIdCollision(url) from e
+        previous_url = previous.get('url') if previous is not None else None
+        if previous_url is not None and previous_url != url:
+            await self._bury(previous_url)
+        return previous_url
+
+    async def _bury(self, url: str) -> None:
+        """
+        Записать url удаленного или замененного webhook.
+
+        Webhook уже изменен, поэтому ошибка записи только логируется:
+        другие процессы тогда сбросят кэш по TTL.
+        """
+        try:
+            await self._collection().database[TOMBSTONES_COLLECTION].insert_one(
+                {'url': url, 'removed_at': datetime.now(timezone.utc)}
+            )
+        except PyMongoError as e:
+            logger.warning(f"Не удалось записать удаленный url webhook: {e}")
+
+    async def get_message_settings(self, url: str) -> Optional[Dict[str, Any]]:
+        return _typed_settings(
+            await self._collection().find_one({'url': url}, {'channel_id': 1, 'thread_id': 1, '_id': 0})
+        )
+
+    async def get_user_webhooks(self, user_id, after=None, before=None, limit=None) -> List[Dict[str, Any]]:
+        query = {'author_id': user_id}
+        direction = ASCENDING
+        if after is not None:
+            query['webhook_name'] = {'$gt': after}
+        elif before is not None:
+            query['webhook_name'] = {'$lt': before}
+            direction = DESCENDING
+        webhooks = await self._collection().find(
+            query,
+            {'webhook_name': 1},
+            sort=[('webhook_name', direction)],
+            limit=limit or 0,
+        ).to_list(length=None)
+        if direction == DESCENDING:
+            webhooks.reverse()
+        return [_with_id(doc) for doc in webhooks]
+
+    async def get_webhook(self, webhook_name, author_id=None) -> Optional[Dict[str, Any]]:
+        return await self._collection().find_one(_name_query(webhook_name, author_id), WEBHOOK_FIELDS)
+
+    async def get_webhook_by_id(self, webhook_id, author_id) -> Optional[Dict[str, Any]]:
+        query = _id_query(webhook_id, author_id)
+        if query is None:
+            return None
+        return await self._collection().find_one(query, WEBHOOK_FIELDS)
+
+    async def delete_webhook_by_id(self, webhook_id, author_id) -> Optional[Dict[str, Any]]:
+        query = _id_query(webhook_id, author_id)
+        if query is None:
+            return None
+        deleted = await self._collection().find_one_and_delete(
+            query, {'webhook_name': 1, 'url': 1, 'author_id': 1, '_id': 0}
+        )
+        if deleted is not None and deleted.get('url'):
+            await self._bury(deleted['url'])
+        return deleted
+
+    async def delete_webhook(self, webhook_name, author_id=None) -> Optional[Dict[str, Any]]:
+        deleted = await self._collection().find_one_and_delete(
+            _name_query(webhook_name, author_id), {'url': 1, 'author_id': 1, '_id': 0}
+        )
+        if deleted is not None and deleted.get('url'):
+            await self._bury(deleted['url'])
+        return deleted
+
+    async def iter_routes(self) -> AsyncIterator[Dict[str, Any]]:
+        cursor = self._collection().find({}, {'url': 1, 'channel_id': 1, 'thread_id': 1, '_id': 0})
+        async for doc in cursor:
+            yield doc
@@ -0,0 +1,276 @@
+"""
+Хранилище webhooks в PostgreSQL.
+
+Использует пул соединений asyncpg. Запросы выполняются как подготовленные
+выражения: asyncpg подготавливает каждый текст запроса один раз на
+соединение и хранит его в кэше выражений соединения.
+"""
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+from routing_snapshot import parse_thread_id
+
+from .base import DatabaseUnavailable, WebhookIdCollision, WebhookStorage
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id BIGSERIAL PRIMARY KEY,
+    webhook_name TEXT NOT NULL,
+    url TEXT NOT NULL UNIQUE,
+    author_id BIGINT NOT NULL,
+    channel_id BIGINT NOT NULL,
+    thread_id BIGINT,
+    secret TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    UNIQUE (author_id, webhook_name)
+);
+"""
+
+# Уникальный индекс (author_id, webhook_name) — ключ upsert. Таблицы, созданные
+# до него, имеют неуникальный индекс; их переводит migrate() из init_db
+NAME_INDEX = "{table}_author_id_webhook_name_key"
+OLD_NAME_INDEX = "{table}_author_id_webhook_name"
+
+
+class PostgresStorage(WebhookStorage):
+    """Хранилище webhooks в таблице PostgreSQL."""
+
+    name = "postgresql"
+
+    def __init__(
+        self,
+        dsn: str,
+        min_size: int = 1,
+        max_size: int = 10,
+        table: str = "webhooks",
+        command_timeout: float = 5.0,
+    ):
+        """
+        Инициализация хранилища.
+
+        Args:
+            dsn: Строка подключения postgresql://
+            min_size: Минимальный размер пула соединений
+            max_size: Максимальный размер пула соединений
+            table: Имя таблицы webhooks
+            command_timeout: Таймаут запроса в секундах
+        """
+        if asyncpg is None:
+            raise ImportError("asyncpg is required for PostgreSQL storage")
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.table = table
+        self.command_timeout = command_timeout
+        self._pool: Optional["asyncpg.Pool"] = None
+
+        self._sql_route = f"SELECT channel_id, thread_id FROM {table} WHERE url = $1"
+        self._sql_insert = (
+            f"INSERT INTO {table} (webhook_name, url, author_id, channel_id, thread_id, secret) "
+            f"VALUES ($1, $2, $3, $4, $5, $6)"
+        )
+        # Старый url читается в том же выражении из снимка до вставки
+        self._sql_upsert = (
+            f"WITH previous AS (SELECT url FROM {table} WHERE author_id = $3 AND webhook_name = $1) "
+            f"INSERT INTO {table} (webhook_name, url, author_id, channel_id, thread_id, secret) "
+            f"VALUES ($1, $2, $3, $4, $5, $6) "
+            f"ON CONFLICT (author_id, webhook_name) DO UPDATE SET url = EXCLUDED.url, "
+            f"channel_id = EXCLUDED.channel_id, thread_id = EXCLUDED.thread_id, secret = EXCLUDED.secret "
+            f"RETURNING (SELECT url FROM previous)"
+        )
+        # LIMIT NULL означает отсутствие ограничения
+        self._sql_user_webhooks = (
+            f"SELECT id::text, webhook_name FROM {table} WHERE author_id = $1 "
+            f"ORDER BY webhook_name LIMIT $2"
+        )
+        self._sql_user_webhooks_after = (
+            f"SELECT id::text, webhook_name FROM {table} WHERE author_id = $1 AND webhook_name > $3 "
+            f"ORDER BY webhook_name LIMIT $2"
+        )
+        self._sql_user_webhooks_before = (
+            f"SELECT id::text, webhook_name FROM {table} WHERE author_id = $1 AND webhook_name < $3 "
+            f"ORDER BY webhook_name DESC LIMIT $2"
+        )
+        # author_id = NULL означает поиск среди всех пользователей
+        self._sql_webhook = (
+            f"SELECT webhook_name, url, author_id, channel_id, thread_id FROM {table} "
+            f"WHERE webhook_name = $1 AND ($2::bigint IS NULL OR author_id = $2) LIMIT 1"
+        )
+        self._sql_delete = (
+            f"DELETE FROM {table} WHERE id = "
+            f"(SELECT id FROM {table} WHERE webhook_name = $1 AND ($2::bigint IS NULL OR author_id = $2) LIMIT 1) "
+            f"RETURNING url, author_id"
+        )
+        self._sql_webhook_by_id = (
+            f"SELECT webhook_name, url, author_id, channel_id, thread_id FROM {table} "
+            f"WHERE id = $1 AND author_id = $2"
+        )
+        self._sql_delete_by_id = (
+            f"DELETE FROM {table} WHERE id = $1 AND author_id = $2 RETURNING webhook_name, url, author_id"
+        )
+        self._sql_routes = f"SELECT url, channel_id, thread_id FROM {table}"
+
+    async def connect(self) -> None:
+        pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            command_timeout=self.command_timeout,
+        )
+        try:
+            async with pool.acquire() as conn:
+                await conn.execute(SCHEMA.format(table=self.table))
+                if not await self._has_name_index(conn):
+                    raise RuntimeError(
+                        f"Table {self.table} has no unique index on (author_id, webhook_name); run init_db.py"
+                    )
+        except BaseException:
+            await pool.close()
+            raise
+        self._pool = pool
+        logger.info("Успешное подключение к PostgreSQL")
+
+    async def _has_name_index(self, conn) -> bool:
+        """Есть ли готовый уникальный индекс (author_id, webhook_name)."""
+        return bool(await conn.fetchval(
+            "SELECT indisunique AND indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)",
+            NAME_INDEX.format(table=self.table),
+        ))
+
+    async def find_duplicates(self, conn, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Найти пары (author_id, webhook_name), встречающиеся в нескольких строках.
+
+        Args:
+            conn: Соединение asyncpg
+            limit: Сколько примеров вернуть
+
+        Returns:
+            Список словарей со значениями ключа и числом строк
+        """
+        rows = await conn.fetch(
+            f"SELECT author_id, webhook_name, count(*) AS count FROM {self.table} "
+            f"GROUP BY author_id, webhook_name HAVING count(*) > 1 LIMIT $1",
+            limit,
+        )
+        return [dict(row) for row in rows]
+
+    async def migrate(self) -> None:
+        """
+        Создать таблицу и сделать индекс (author_id, webhook_name) уникальным.
+
+        Запускается из init_db. Уникальность проверяется до создания индекса;
+        индекс строится без блокировки записи (CONCURRENTLY), прежний
+        неуникальный удаляется после. Повторный запуск ничего не меняет.
+
+        Raises:
+            RuntimeError: Если в таблице есть строки с одинаковым ключом
+        """
+        name_index = NAME_INDEX.format(table=self.table)
+        conn = await asyncpg.connect(self.dsn, command_timeout=None)
+        try:
+            await conn.execute(SCHEMA.format(table=self.table))
+            if not await self._has_name_index(conn):
+                duplicates = await self.find_duplicates(conn)
+                if duplicates:
+                    raise RuntimeError(
+                        f"Index {name_index} cannot be made unique: duplicate author_id, webhook_name values, "
+                        f"e.g. {duplicates}. Remove or rename the duplicates and run init_db again"
+                    )
+                logger.info(f"Индекс {name_index} создается уникальным")
+                # Недостроенный индекс от прерванного запуска мешает IF NOT EXISTS
+                await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name_index}")
+                try:
+                    await conn.execute(
+                        f"CREATE UNIQUE INDEX CONCURRENTLY {name_index} ON {self.table} (author_id, webhook_name)"
+                    )
+                except Exception:
+                    logger.error(f"Не удалось создать индекс {name_index}")
+                    await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name_index}")
+                    raise
+            await conn.execute(f"DROP INDEX IF EXISTS {OLD_NAME_INDEX.format(table=self.table)}")
+        finally:
+            await conn.close()
+        logger.info(f"Индекс {name_index} проверен")
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+
+    def is_ready(self) -> bool:
+        return self._pool is not None and not self._pool.is_closing()
+
+    def _get_pool(self) -> "asyncpg.Pool":
+        if self._pool is None:
+            raise DatabaseUnavailable("PostgreSQL is not connected")
+        return self._pool
+
+    async def _fetch(self, method: str, query: str, *args):
+        """Выполнить запрос, превращая ошибки соединения в DatabaseUnavailable."""
+        try:
+            return await getattr(self._get_pool(), method)(query, *args)
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError) as e:
+            raise DatabaseUnavailable(f"PostgreSQL is unavailable: {e}") from e
+
+    async def add(self, name, url, author_id, channel_id, thread_id, secret=None) -> None:
+        await self._fetch(
+            "execute", self._sql_insert,
+            name, url, author_id, channel_id, parse_thread_id(thread_id) or None, secret,
+        )
+
+    async def upsert(self, name, url, author_id, channel_id, thread_id, secret=None) -> Optional[str]:
+        try:
+            return await self._fetch(
+                "fetchval", self._sql_upsert,
+                name, url, author_id, channel_id, parse_thread_id(thread_id) or None, secret,
+            )
+        except asyncpg.UniqueViolationError as e:
+            raise WebhookIdCollision(url) from e
+
+    async def get_message_settings(self, url: str) -> Optional[Dict[str, Any]]:
+        row = await self._fetch("fetchrow", self._sql_route, url)
+        return dict(row) if row is not None else None
+
+    async def get_user_webhooks(self, user_id, after=None, before=None, limit=None) -> List[Dict[str, Any]]:
+        if after is not None:
+            rows = await self._fetch("fetch", self._sql_user_webhooks_after, user_id, limit, after)
+        elif before is not None:
+            rows = await self._fetch("fetch", self._sql_user_webhooks_before, user_id, limit, before)
+            rows = reversed(rows)
+        else:
+            rows = await self._fetch("fetch", self._sql_user_webhooks, user_id, limit)
+        return [dict(row) for row in rows]
+
+    async def get_webhook(self, webhook_name, author_id=None) -> Optional[Dict[str, Any]]:
+        row = await self._fetch("fetchrow", self._sql_webhook, webhook_name, author_id)
+        return dict(row) if row is not None else None
+
+    async def get_webhook_by_id(self, webhook_id, author_id) -> Optional[Dict[str, Any]]:
+        if not webhook_id.isdigit():
+            return None
+        row = await self._fetch("fetchrow", self._sql_webhook_by_id, int(webhook_id), author_id)
+        return dict(row) if row is not None else None
+
+    async def delete_webhook_by_id(self, webhook_id, author_id) -> Optional[Dict[str, Any]]:
+        if not webhook_id.isdigit():
+            return None
+        row = await self._fetch("fetchrow", self._sql_delete_by_id, int(webhook_id), author_id)
+        return dict(row) if row is not None else None
+
+    async def delete_webhook(self, webhook_name, author_id=None) -> Optional[Dict[str, Any]]:
+        row = await self._fetch("fetchrow", self._sql_delete, webhook_name, author_id)
+        return dict(row) if row is not None else None
+
+    async def iter_routes(self) -> AsyncIterator[Dict[str, Any]]:
+        async with self._get_pool().acquire() as conn:
+            async with conn.transaction():
+                async for row in conn.cursor(self._sql_routes, prefetch=1000):
+                    yield dict(row)
@@ -0,0 +1,226 @@
+"""
+Тесты для хранилищ webhooks.
+
+Тестирует MongoStorage и PostgresStorage с моками драйверов
+и выбор хранилища по DB_URL.
+"""
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+import sys
+import os
+
+# Добавляем путь к модулям
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pymongo.errors import PyMongoError
+from storage import DatabaseUnavailable, MongoStorage, PostgresStorage, WebhookIdCollision, is_postgres_url
+from routing_snapshot_test import AsyncCursor
+
+
+class TestMongoStorage(unittest.IsolatedAsyncioTestCase):
+    """Тесты для MongoStorage."""
+
+    def setUp(self):
+        """Создать хранилище поверх мока коллекции."""
+        self.coll = MagicMock()
+        self.storage = MongoStorage(lambda: self.coll)
+
+    async def test_get_webhook_missing(self):
+        """Тест что отсутствующий webhook возвращает None."""
+        self.coll.find_one = AsyncMock(return_value=None)
+
+        self.assertIsNone(await self.storage.get_webhook("missing"))
+
+    async def test_delete_returns_url(self):
+        """Тест что удаление возвращает url webhook."""
+        self.coll.find_one_and_delete = AsyncMock(return_value={"url": "hook", "author_id": 1})
+        tombstones = self.coll.database.__getitem__.return_value
+        tombstones.insert_one = AsyncMock()
+
+        self.assertEqual(await self.storage.delete_webhook("name", author_id=1), {"url": "hook", "author_id": 1})
+        self.assertEqual(
+            self.coll.find_one_and_delete.call_args.args[0], {"author_id": 1, "webhook_name": "name"}
+        )
+        self.coll.database.__getitem__.assert_called_with("WebhookTombstones")
+        self.assertEqual(tombstones.insert_one.call_args.args[0]["url"], "hook")
+
+    async def test_tombstone_failure_does_not_fail_delete(self):
+        """Тест что ошибка записи удаленного url не отменяет результат удаления."""
+        self.coll.find_one_and_delete = AsyncMock(return_value={"url": "hook", "author_id": 1})
+        self.coll.database.__getitem__.return_value.insert_one = AsyncMock(side_effect=PyMongoError("down"))
+
+        self.assertEqual(await self.storage.delete_webhook("name"), {"url": "hook", "author_id": 1})
+
+    async def test_iter_routes(self):
+        """Тест перебора маршрутов."""
+        self.coll.find = MagicMock(return_value=AsyncCursor([{"url": "hook", "channel_id": 1, "thread_id": None}]))
+
+        routes = [route async for route in self.storage.iter_routes()]
+
+        self.assertEqual(routes, [{"url": "hook", "channel_id": 1, "thread_id": None}])
+
+
+class TestPostgresStorage(unittest.IsolatedAsyncioTestCase):
+    """Тесты для PostgresStorage."""
+
+    def setUp(self):
+        """Создать хранилище с моком пула asyncpg."""
+        self.storage = PostgresStorage("postgresql://localhost/test")
+        self.pool = MagicMock()
+        self.storage._pool = self.pool
+
+    async def test_not_connected_fails_fast(self):
+        """Тест отказа до создания пула."""
+        self.storage._pool = None
+
+        with self.assertRaises(DatabaseUnavailable):
+            await self.storage.get_message_settings("hook")
+        self.assertFalse(self.storage.is_ready())
+
+    async def test_add_parses_thread_id(self):
+        """Тест что thread_id сохраняется числом или NULL."""
+        self.pool.execute = AsyncMock()
+
+        await self.storage.add("name", "hook", 1, -100, "None")
+        await self.storage.add("name2", "hook2", 1, -100, "15")
+
+        self.assertIsNone(self.pool.execute.call_args_list[0].args[5])
+        self.assertEqual(self.pool.execute.call_args_list[1].args[5], 15)
+
+    async def test_upsert_collision(self):
+        """Тест что занятый url превращается в WebhookIdCollision."""
+        import asyncpg
+
+        self.pool.fetchval = AsyncMock(side_effect=asyncpg.UniqueViolationError("duplicate key"))
+
+        with self.assertRaises(WebhookIdCollision):
+            await self.storage.upsert("name", "hook", 1, -100, "None")
+
+    async def test_get_message_settings(self):
+        """Тест поиска маршрута по url."""
+        self.pool.fetchrow = AsyncMock(return_value={"channel_id": -100, "thread_id": None})
+
+        settings = await self.storage.get_message_settings("hook")
+
+        self.assertEqual(settings, {"channel_id": -100, "thread_id": None})
+        self.assertEqual(self.pool.fetchrow.call_args.args[1], "hook")
+
+    async def test_delete_missing(self):
+        """Тест удаления отсутствующего webhook."""
+        self.pool.fetchrow = AsyncMock(return_value=None)
+
+        self.assertIsNone(await self.storage.delete_webhook("missing"))
+
+    async def test_connection_error_wrapped(self):
+        """Тест что ошибка соединения превращается в DatabaseUnavailable."""
+        self.pool.fetchrow = AsyncMock(side_effect=ConnectionRefusedError("refused"))
+
+        with self.assertRaises(DatabaseUnavailable):
+            await self.storage.get_message_settings("hook")
+
+
+def _pg_connection(has_index, duplicates=()):
+    """Мок соединения asyncpg с уникальным индексом или без него."""
+    conn = MagicMock()
+    conn.execute = AsyncMock()
+    conn.close = AsyncMock()
+    conn.fetchval = AsyncMock(return_value=has_index)
+    conn.fetch = AsyncMock(return_value=[
+        {"author_id": author_id, "webhook_name": name, "count": 2} for author_id, name in duplicates
+    ])
+    return conn
+
+
+def _pg_pool(conn):
+    """Мок пула asyncpg, выдающего соединение conn."""
+    pool = MagicMock()
+    pool.close = AsyncMock()
+    pool.acquire.return_value.__aenter__ = AsyncMock(return_value=conn)
+    pool.acquire.return_value.__aexit__ = AsyncMock(return_value=False)
+    return pool
+
+
+class TestPostgresSchema(unittest.IsolatedAsyncioTestCase):
+    """Тесты создания схемы и перевода индекса PostgreSQL."""
+
+    def setUp(self):
+        """Создать хранилище без пула."""
+        self.storage = PostgresStorage("postgresql://localhost/test")
+
+    async def test_connect_sets_pool_after_schema(self):
+        """Тест что пул сохраняется после создания схемы."""
+        pool = _pg_pool(_pg_connection(has_index=True))
+
+        with patch('asyncpg.create_pool', AsyncMock(return_value=pool)):
+            await self.storage.connect()
+
+        self.assertIs(self.storage._pool, pool)
+        executed = pool.acquire.return_value.__aenter__.return_value.execute.call_args.args[0]
+        self.assertNotIn("DROP INDEX", executed)
+
+    async def test_connect_without_unique_index_closes_pool(self):
+        """Тест что без уникального индекса пул закрывается и не сохраняется."""
+        pool = _pg_pool(_pg_connection(has_index=False))
+
+        with patch('asyncpg.create_pool', AsyncMock(return_value=pool)):
+            with self.assertRaises(RuntimeError):
+                await self.storage.connect()
+
+        pool.close.assert_awaited_once()
+        self.assertIsNone(self.storage._pool)
+        self.assertFalse(self.storage.is_ready())
+
+    async def test_migrate_duplicates_abort_before_create(self):
+        """Тест что при повторяющихся ключах уникальный индекс не создается."""
+        conn = _pg_connection(has_index=False, duplicates=[(1, "ci")])
+
+        with patch('asyncpg.connect', AsyncMock(return_value=conn)):
+            with self.assertRaises(RuntimeError) as ctx:
+                await self.storage.migrate()
+
+        self.assertIn("'webhook_name': 'ci'", str(ctx.exception))
+        statements = [c.args[0] for c in conn.execute.call_args_list]
+        self.assertFalse([sql for sql in statements if "INDEX" in sql])
+        conn.close.assert_awaited_once()
+
+    async def test_migrate_builds_unique_then_drops_old(self):
+        """Тест что прежний индекс удаляется после создания уникального."""
+        conn = _pg_connection(has_index=False)
+
+        with patch('asyncpg.connect', AsyncMock(return_value=conn)):
+            await self.storage.migrate()
+
+        statements = [c.args[0] for c in conn.execute.call_args_list if "INDEX" in c.args[0]]
+        self.assertEqual(statements, [
+            "DROP INDEX CONCURRENTLY IF EXISTS webhooks_author_id_webhook_name_key",
+            "CREATE UNIQUE INDEX CONCURRENTLY webhooks_author_id_webhook_name_key ON webhooks (author_id, webhook_name)",
+            "DROP INDEX IF EXISTS webhooks_author_id_webhook_name",
+        ])
+
+
+class TestStorageSelection(unittest.IsolatedAsyncioTestCase):
+    """Тесты выбора хранилища."""
+
+    def test_is_postgres_url(self):
+        """Тест распознавания адреса PostgreSQL."""
+        self.assertTrue(is_postgres_url("postgresql://user@localhost/db"))
+        self.assertTrue(is_postgres_url("postgres://user@localhost/db"))
+        self.assertFalse(is_postgres_url("mongodb+srv://cluster.example.net"))
+
+    async def test_db_delegates_to_backend(self):
+        """Тест что слой db работает через выбранное хранилище."""
+        import db
+
+        storage = MagicMock()
+        storage.get_message_settings = AsyncMock(return_value={"channel_id": 1, "thread_id": None})
+        db.routing_cache.clear()
+
+        with patch('db.backend', storage):
+            result = await db.get_message_settings("pg_hook")
+
+        self.assertEqual(result["channel_id"], 1)
+        storage.get_message_settings.assert_awaited_once_with("pg_hook")
+
+
+if __name__ == "__main__":
+    unittest.main()